@@ -1,19 +1,299 @@
-
 import streamlit as st
-import pandas as pd
-from datetime import datetime
+from streamlit.errors import StreamlitAPIException
+import time
+import numpy as np
+from functools import wraps
+
+from calqtrade.cache import PROFIT_TARGETS, cached_break_even, cached_profit_targets, cached_trade
+from calqtrade.engine import FEE_PERCENTAGE, is_day_trade, pnl_surface, sell_side, target_sell_price
+from calqtrade.feed import PRICE_FEED_ENV, configured_price_feeds, open_price_feed
+from calqtrade.fees import FEE_SCHEDULES_ENV, STANDARD_SCHEDULE, available_fee_schedules
+from calqtrade.fixedpoint import exact_sell_side, exact_target_sell_price
+from calqtrade.history import PortfolioHistory
+from calqtrade.importer import import_purchases
+from calqtrade.metrics import METRICS_PORT_ENV, REGISTRY, serve_metrics_from_env, timed
+from calqtrade.matching import MATCHING_METHODS, SPECIFIC, LotMatcher, LotMatchingError
+from calqtrade.planner import TARGET_METRICS, PlanningError, plan_ladder, shares_to_target
+from calqtrade.portfolio import Portfolio, normalize_symbol
+from calqtrade.prices import (
+    PRICE_PATH_ENV,
+    cached_mark_to_market,
+    cached_price_source,
+    configured_price_paths,
+    mark_to_market,
+)
+from calqtrade.simulation import GAIN_PERCENTILES, MAX_DRAWS, SimulationError, simulate_outcomes
+from calqtrade.store import LedgerConflictError, default_ledger_store
+from calqtrade.symbols import SYMBOLS_ENV, symbol_label, symbol_metadata
+
+# Symbol used in the Multi Purchase tab until another one is picked
+DEFAULT_SYMBOL = "STOCK"
+# Rows per page offered for the purchases table
+LOT_PAGE_SIZES = (25, 100, 500)
+# Buy prices, from "Ladder From" down to "Ladder Down To", in the planner's single-buy table
+PLAN_PRICE_STEPS = 8
+TARGET_LABELS = dict(zip(TARGET_METRICS, ("Overall Avg Price", "B.E.S Price")))
+# Live panels redraw at most this often, however fast the feed ticks
+LIVE_REFRESH_SECONDS = 0.5
+
+MATCHING_LABELS = dict(zip(MATCHING_METHODS, (
+    "FIFO", "LIFO", "Highest Cost First", "Average Cost", "Specific Lot",
+)))
+
+
+def rerun_fragment():
+    # A fragment-scoped rerun is only allowed while the fragment itself is
+    # rerunning; fall back to a full rerun when called during a full-app run
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+
+def section(name):
+    # Time a block into the process-wide histograms and this session's timing panel
+    return timed(name, st.session_state.setdefault('rerun_timings', {}))
+
+
+def rupees(label, decimals=2):
+    # Tables keep numeric columns so they stay sortable; the browser adds "Rs." and separators
+    return st.column_config.NumberColumn(label, format=f"Rs. %,.{decimals}f")
+
+
+def percent(label, decimals=2, sign=""):
+    # ``sign="+"`` always shows the sign, as for price moves
+    return st.column_config.NumberColumn(label, format=f"%{sign}.{decimals}f%%")
+
+
+def timed_tab(name):
+    # Time every run of a tab, whether part of a full rerun or the fragment alone
+    def decorate(render):
+        @wraps(render)
+        def run():
+            with section(name):
+                render()
+        return run
+    return decorate
+
+
+def timing_panel():
+    # This session's latest time per section next to the process-wide percentiles
+    import pandas as pd
+
+    latest = st.session_state.get('rerun_timings', {})
+    aggregates = REGISTRY.snapshot()
+    names = sorted(set(latest) | set(aggregates))
+    st.dataframe(pd.DataFrame({
+        'Section': names,
+        'Last (ms)': [latest[name] * 1000 if name in latest else None for name in names],
+        'p50 (ms)': [aggregates[name]['p50'] * 1000 if name in aggregates else None for name in names],
+        'p95 (ms)': [aggregates[name]['p95'] * 1000 if name in aggregates else None for name in names],
+        'Runs': [aggregates[name]['count'] if name in aggregates else 0 for name in names]
+    }).round(2), use_container_width=True, hide_index=True)
+    st.caption("Percentiles cover every session in this process. Refreshed on full reruns; "
+               f"set ${METRICS_PORT_ENV} to export them for Prometheus.")
+
+
+def fee_schedules():
+    # (schedules by name, load error): a missing or malformed schedule file
+    # leaves the standard fees rather than breaking every tab
+    try:
+        return available_fee_schedules(), None
+    except (OSError, ValueError) as error:
+        return {STANDARD_SCHEDULE.name: STANDARD_SCHEDULE}, error
+
+
+def fee_settings():
+    # (exact, schedule) for the current run: the standard fees are passed as
+    # schedule=None so the published formulas apply, and exact arithmetic is
+    # only available for them
+    schedule = fee_schedules()[0].get(st.session_state.get("fee_schedule", STANDARD_SCHEDULE.name))
+    if schedule is None or schedule is STANDARD_SCHEDULE:
+        return st.session_state.get("exact_fees", False), None
+    return False, schedule
+
+
+def fee_schedule_caption(schedule):
+    if schedule is not None:
+        st.caption(f"Fees from the **{schedule.name}** schedule; the fee rates and formulas quoted "
+                   "in the notes on this tab describe the standard fees.")
 
-# Page configuration
-st.set_page_config(page_title="CalqTrade", page_icon="🪙", layout="wide")
 
-# Fee percentage
-FEE_PERCENTAGE = 1.12
+def change_book(change, *args):
+    # Run a history change and rerun; a clash with another session's edits
+    # is shown after the rerun, once the symbol has been reloaded
+    try:
+        change(*args)
+    except LedgerConflictError as error:
+        st.session_state.mp_conflict = str(error)
+    rerun_fragment()
+
+
+def normalize_active_symbol():
+    # Keep the symbol picker's value in the portfolio's canonical form
+    st.session_state.mp_symbol = normalize_symbol(st.session_state.mp_symbol or DEFAULT_SYMBOL)
+
+
+def lot_matcher(symbol, ledger, method, sell_orders):
+    # Reuse the session's matcher while the lots are unchanged; otherwise
+    # rebuild it and replay the recorded sells, dropping any that no longer fit
+    key = (symbol, method, id(ledger), ledger.version)
+    cached = st.session_state.get("mp_matcher")
+    if cached is not None and cached[0] == key and len(cached[1].sells) == len(sell_orders):
+        return cached[1]
+    matcher = LotMatcher.from_ledger(ledger, method)
+    for order in list(sell_orders):
+        quantity, sell_price, same_day, lot_ids = order
+        try:
+            # Specific sells name lots by id, so edits above them don't shift the match
+            lots = None if lot_ids is None else dict(zip(ledger.positions(list(lot_ids)).tolist(), lot_ids.values()))
+            matcher.sell(quantity, sell_price, same_day, lots)
+        except (KeyError, LotMatchingError):
+            sell_orders.remove(order)
+            st.warning(f"A recorded sell of {quantity:,} shares no longer fits the open lots and was dropped")
+    st.session_state.mp_matcher = (key, matcher)
+    return matcher
+
+
+def surface_heatmap(title, sell_grid, qty_grid, values, value_label):
+    # Plotly draws large heatmaps with hover natively; fall back to Altair
+    # (bundled with Streamlit) on a coarser grid when it isn't installed
+    try:
+        import plotly.graph_objects as go
+    except ImportError:
+        go = None
+    max_cells = 250 if go is not None else 60
+    qty_step = max(1, -(-len(qty_grid) // max_cells))
+    sell_step = max(1, -(-len(sell_grid) // max_cells))
+    sell_grid = sell_grid[::sell_step]
+    qty_grid = qty_grid[::qty_step]
+    values = values[::qty_step, ::sell_step]
+    
+    if go is not None:
+        figure = go.Figure(go.Heatmap(
+            x=sell_grid, y=qty_grid, z=values,
+            colorscale="RdYlGn", zmid=0,
+            colorbar=dict(title=value_label),
+            hovertemplate="Sell Price: Rs. %{x:.2f}<br>Stocks: %{y:,}<br>" + value_label + ": %{z:,.2f}<extra></extra>"
+        ))
+        figure.add_trace(go.Contour(
+            x=sell_grid, y=qty_grid, z=values,
+            contours=dict(start=0, end=0, coloring="none", showlabels=True),
+            line=dict(color="black", width=2), showscale=False, hoverinfo="skip", name="Break-even"
+        ))
+        figure.update_layout(title=title, xaxis_title="Sell Price (Rs.)", yaxis_title="No. of Stocks",
+                             margin=dict(l=0, r=0, t=40, b=0))
+        st.plotly_chart(figure, use_container_width=True)
+        return
+    
+    import altair as alt
+    import pandas as pd
+    sell_mesh, qty_mesh = np.meshgrid(sell_grid, qty_grid)
+    chart_data = pd.DataFrame({
+        "Sell Price": sell_mesh.ravel(),
+        "No. of Stocks": qty_mesh.ravel(),
+        value_label: values.ravel(),
+    })
+    chart = alt.Chart(chart_data, title=title).mark_rect().encode(
+        x=alt.X("Sell Price:O", axis=alt.Axis(format=".2f", labelOverlap=True)),
+        y=alt.Y("No. of Stocks:O", sort="descending", axis=alt.Axis(labelOverlap=True)),
+        color=alt.Color(f"{value_label}:Q", scale=alt.Scale(scheme="redyellowgreen", domainMid=0)),
+        tooltip=[alt.Tooltip("Sell Price:Q", format=".2f"), "No. of Stocks:Q",
+                 alt.Tooltip(f"{value_label}:Q", format=",.2f")],
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+
+def live_feed_source():
+    # The sidebar's pick among the operator's feeds; never a source the browser chose
+    sources = configured_price_feeds()
+    source = st.session_state.get("price_feed")
+    return source if source in sources else next(iter(sources), None)
+
+
+def live_quote(symbol):
+    # Latest feed price for ``symbol``, or None after explaining why there is none
+    source = live_feed_source()
+    if not source:
+        st.info(f"Set ${PRICE_FEED_ENV} to a live price feed to stream prices")
+        return None
+    feed = open_price_feed(source)
+    quote = feed.quote(symbol)
+    if quote is None:
+        st.caption(f"Waiting for a {symbol} price from {source}" + (f" ({feed.error})" if feed.error else ""))
+    else:
+        st.caption(f"{symbol} at Rs. {quote.price:,.2f}, updated {max(time.time() - quote.received, 0):.1f}s ago "
+                   f"· {feed.ticks:,} ticks received")
+    return quote
+
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_trade(symbol, buy_price, quantity, day_trade, exact, schedule):
+    # The Single Trade result at the feed's latest price; only this block reruns on each frame
+    quote = live_quote(symbol)
+    if quote is None:
+        return
+    trade = cached_trade(buy_price, quote.price, quantity, day_trade, exact, schedule)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Live Gain/Loss", f"Rs. {trade.gain_loss:,.2f}", delta=f"{trade.gain_loss:,.2f}")
+    with col2:
+        st.metric("Live Return %", f"{trade.return_pct:.2f}%", delta=f"{trade.return_pct:.2f}%")
+    with col3:
+        distance = quote.price - trade.bes_price
+        st.metric("Distance to B.E.S", f"Rs. {distance:,.4f}",
+                  delta=f"{distance / trade.bes_price * 100:.2f}%" if trade.bes_price else None)
+
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_position(symbol, version, quantity, total_cost, bes, day_trade, schedule, lots, first_lot):
+    # Unrealized P&L of the position and of each lot on the visible page at
+    # the feed's latest price. Frames between two ticks redraw the stored valuation
+    import pandas as pd
+
+    quote = live_quote(symbol)
+    if quote is None:
+        return
+    key = (symbol, version, quote.sequence, first_lot, day_trade, schedule)
+    cached = st.session_state.get("mp_live")
+    if cached is None or cached[0] != key:
+        position = mark_to_market(quote.price, quantity, total_cost, day_trade, schedule)
+        per_lot = mark_to_market(quote.price, lots['quantity'], lots['total_cost'], day_trade, schedule)
+        df_live = pd.DataFrame({
+            '#': np.arange(first_lot + 1, first_lot + len(lots['quantity']) + 1),
+            'Quantity': lots['quantity'],
+            'Total Cost': lots['total_cost'],
+            'Market Value': per_lot['market_value'],
+            'Unrealized P&L': per_lot['unrealized_gain'],
+            'Return %': per_lot['return_pct'],
+            'Distance to Lot B.E.S %': per_lot['distance_to_bes_pct']
+        })
+        cached = st.session_state.mp_live = (key, float(position['unrealized_gain']),
+                                             float(position['return_pct']), df_live)
+    _, unrealized_gain, return_pct, df_live = cached
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Unrealized P&L", f"Rs. {unrealized_gain:,.2f}", delta=f"{unrealized_gain:,.2f}")
+    with col2:
+        st.metric("Return %", f"{return_pct:.2f}%", delta=f"{return_pct:.2f}%")
+    with col3:
+        distance = quote.price - bes
+        st.metric("Distance to B.E.S", f"Rs. {distance:,.4f}", delta=f"{distance / bes * 100:.2f}%" if bes else None,
+                  help=f"Live price minus the position's B.E.S price of Rs. {bes:.4f}")
+    st.dataframe(df_live, use_container_width=True, hide_index=True, column_config={
+        'Total Cost': rupees('Total Cost'),
+        'Market Value': rupees('Market Value'),
+        'Unrealized P&L': rupees('Unrealized P&L'),
+        'Return %': percent('Return %'),
+        'Distance to Lot B.E.S %': percent('Distance to Lot B.E.S %', sign="+")
+    })
 
-# Create tabs
-tab1, tab2, tab3 = st.tabs(["💹 Single Trade", "⚖️ Break-Even", "📊 Multi Purchase"])
 
 # ==================== TAB 1: Original Calculator ====================
-with tab1:
+@st.fragment
+@timed_tab("single_trade")
+def render_single_trade():
     # Title and description
     st.title("🪙 CalqTrade")
     st.markdown("Calculate trading profits with transaction fees")
@@ -42,44 +322,35 @@ with tab1:
 
     st.divider()
 
-    # Calculations - New Logic
-    # Step 1: Calculate buy fee and average price
-    total_buy_value = buy_price * quantity
-    buy_fee = total_buy_value * (FEE_PERCENTAGE / 100)
+    # Calculations - shared with batch jobs via calqtrade.engine, memoized per process
+    exact, schedule = fee_settings()
+    fee_schedule_caption(schedule)
+    with section("single_trade.calculate"):
+        trade = cached_trade(buy_price, sell_price, quantity, is_day_trade(same_day), exact, schedule)
     
+    # Live sell price - redrawn by its own fragment, so ticks never rerun the tab
+    if st.toggle("📡 Live sell price", key="tab1_live",
+                 help="Value this trade at the latest price from the live feed set in the sidebar"):
+        live_symbol = st.text_input("Symbol", value=DEFAULT_SYMBOL, key="tab1_live_symbol")
+        live_trade(normalize_symbol(live_symbol or DEFAULT_SYMBOL), buy_price, quantity,
+                   bool(is_day_trade(same_day)), exact, schedule)
+    total_buy_value = trade.buy_value
+    buy_fee = trade.buy_fee
     # Average Price (Avg Price) = (Buy Value + Buy Fee) / Quantity
-    avg_price = (total_buy_value + buy_fee) / quantity
-    
+    avg_price = trade.avg_price
     # Total Cost = Avg Price × Quantity
-    total_cost = avg_price * quantity
-    
-    # STL Rate (Share Transaction Levy)
-    STL_RATE = 0.30 / 100
-    
-    # Step 2: Calculate B.E.S Price (Break-Even Sell Price)
-    if same_day == "Day Trading":
-        # For same day: Only STL (0.30%) on sell, no other transaction fees
-        # B.E.S Price needs to cover: Total Cost + STL on sell
-        # Total Cost = (B.E.S Price × Qty) - (B.E.S Price × Qty × 0.003)
-        # Total Cost = B.E.S Price × Qty × (1 - 0.003)
-        # B.E.S Price = Total Cost / (Qty × (1 - 0.003))
-        bes_price = total_cost / (quantity * (1 - STL_RATE))
-        # Calculate actual sell fee (only STL) based on sell price
-        sell_fee = sell_price * quantity * STL_RATE if sell_price > 0 else 0
-    else:
-        # For another day: B.E.S = Avg Price × 1.0112
-        bes_price = avg_price * (1 + FEE_PERCENTAGE / 100)
-        # Calculate sell fee based on sell price
-        sell_fee = sell_price * quantity * (FEE_PERCENTAGE / 100) if sell_price > 0 else 0
-    
-    # Step 3: Calculate proceeds from selling
-    total_sell_value = sell_price * quantity
-    proceeds = total_sell_value - sell_fee
+    total_cost = trade.total_cost
+    # B.E.S Price (Break-Even Sell Price)
+    bes_price = trade.bes_price
+    # Day trading: only STL on sell. Swing trading: full fee on sell
+    sell_fee = trade.sell_fee
+    total_sell_value = trade.sell_value
+    proceeds = trade.proceeds
     fee_count = "Buy: 1.12%, Sell: 0.30% (STL only)" if same_day == "Day Trading" else "2x (buy 1.12% + sell 1.12%)"
 
     # Calculate gain/loss
-    gain_loss = proceeds - total_cost
-    gain_loss_percentage = (gain_loss / total_cost) * 100 if total_cost > 0 else 0
+    gain_loss = trade.gain_loss
+    gain_loss_percentage = trade.return_pct
 
     # Display results
     st.subheader("📈 Calculation Results")
@@ -196,8 +467,13 @@ with tab1:
         - **Return on Investment: {gain_loss_percentage:.2f}%**
         """)
 
+
 # ==================== TAB 2: Break-Even Calculator ====================
-with tab2:
+@st.fragment
+@timed_tab("break_even")
+def render_break_even():
+    import pandas as pd
+
     st.title("🪙 CalqTrade")
     st.markdown("Calculate B.E.S Price (Break-Even Sell Price) from buy price")
     
@@ -220,30 +496,25 @@ with tab2:
     
     st.divider()
     
-    # Calculate with correct formula
-    # Step 1: Calculate Avg Price
-    be_total_buy_value = be_buy_price * be_quantity
-    be_buy_fee = be_total_buy_value * (FEE_PERCENTAGE / 100)
-    be_avg_price = (be_total_buy_value + be_buy_fee) / be_quantity
-    be_total_cost = be_avg_price * be_quantity
-    
-    # Step 2: Calculate B.E.S Price
-    # STL Rate (Share Transaction Levy)
-    STL_RATE = 0.30 / 100
-    
-    if be_same_day == "Day Trading":
-        # For same day: Only STL (0.30%) on sell
-        # B.E.S Price = Total Cost / (Qty × (1 - 0.003))
-        be_bes_price = be_total_cost / (be_quantity * (1 - STL_RATE))
-        be_sell_fee = be_bes_price * be_quantity * STL_RATE
-        be_price_increase_from_buy = be_bes_price - be_buy_price
-        be_percentage_move_from_buy = (be_price_increase_from_buy / be_buy_price) * 100
-    else:
-        # For another day: B.E.S = Avg Price × 1.0112
-        be_bes_price = be_avg_price * (1 + FEE_PERCENTAGE / 100)
-        be_sell_fee = be_bes_price * be_quantity * (FEE_PERCENTAGE / 100)
-        be_price_increase_from_buy = be_bes_price - be_buy_price
-        be_percentage_move_from_buy = (be_price_increase_from_buy / be_buy_price) * 100
+    # Calculate with correct formula (memoized per process)
+    be_day_trade = is_day_trade(be_same_day)
+    be_exact, be_schedule = fee_settings()
+    fee_schedule_caption(be_schedule)
+    with section("break_even.calculate"):
+        break_even = cached_break_even(be_buy_price, be_quantity, be_day_trade, be_exact, be_schedule)
+    
+    # Step 1: Avg Price = (Buy Value + Buy Fee) / Qty
+    be_total_buy_value = break_even.buy_value
+    be_buy_fee = break_even.buy_fee
+    be_avg_price = break_even.avg_price
+    be_total_cost = break_even.total_cost
+    
+    # Step 2: B.E.S Price
+    # Day trading: Total Cost / (Qty × (1 - 0.003)). Swing trading: Avg Price × 1.0112
+    be_bes_price = break_even.bes_price
+    be_sell_fee = break_even.sell_fee
+    be_price_increase_from_buy = break_even.price_move
+    be_percentage_move_from_buy = break_even.pct_move
     
     # Display results
     st.subheader("🎯 Break-Even Analysis")
@@ -303,37 +574,21 @@ with tab2:
     st.markdown("### 🎯 Profit Target Scenarios")
     st.markdown("Calculate sell prices for different profit targets:")
     
-    profit_targets = [0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 15.0, 20.0, 25.0, 30.0]
-    
-    target_data = []
-    
-    for target_pct in profit_targets:
-        # Target profit amount based on total cost
-        target_profit = be_total_cost * (target_pct / 100)
-        target_proceeds_needed = be_total_cost + target_profit
-        
-        if be_same_day == "Day Trading":
-            # No sell fee: Sell Price × Qty = target_proceeds_needed
-            target_sell_price = target_proceeds_needed / be_quantity
-        else:
-            # With sell fee: (Sell Price × Qty) - (Sell Price × Qty × 0.0112) = target_proceeds_needed
-            target_sell_price = target_proceeds_needed / (be_quantity * (1 - FEE_PERCENTAGE / 100))
-        
-        # Calculate moves from buy price
-        price_move = target_sell_price - be_buy_price
-        pct_move = (price_move / be_buy_price) * 100
-        
-        target_data.append({
-            'Target Profit %': f"{target_pct}%",
-            'Profit Amount': f"Rs. {target_profit:.2f}",
-            'Required Sell Price': f"Rs. {target_sell_price:.4f}",
-            'Price Increase': f"Rs. {price_move:.4f}",
-            'Move from Buy Price': f"+{pct_move:.2f}%"
+    # Day trading: Sell Price × Qty = proceeds needed (no sell fee)
+    # Swing trading: (Sell Price × Qty) - (Sell Price × Qty × 0.0112) = proceeds needed
+    with section("break_even.targets"):
+        targets = cached_profit_targets(be_buy_price, be_quantity, be_day_trade, PROFIT_TARGETS,
+                                        be_exact, be_schedule)
+        df = pd.DataFrame(targets, columns=['Target Profit %', 'Profit Amount', 'Required Sell Price',
+                                            'Price Increase', 'Move from Buy Price'])
+        st.dataframe(df, use_container_width=True, hide_index=True, column_config={
+            'Target Profit %': percent('Target Profit %', 1),
+            'Profit Amount': rupees('Profit Amount'),
+            'Required Sell Price': rupees('Required Sell Price', 4),
+            'Price Increase': rupees('Price Increase', 4),
+            'Move from Buy Price': percent('Move from Buy Price', sign="+")
         })
     
-    df = pd.DataFrame(target_data)
-    st.dataframe(df, use_container_width=True, hide_index=True)
-    
     st.divider()
     
     # Custom profit target
@@ -358,12 +613,11 @@ with tab2:
         st.metric("Target Profit Amount", f"Rs. {custom_profit_amount:.2f}")
     
     # Calculate custom target sell price
-    custom_proceeds_needed = be_total_cost + custom_profit_amount
-    
-    if be_same_day == "Day Trading":
-        custom_sell_price = custom_proceeds_needed / be_quantity
+    if be_exact:
+        _, custom_sell_price = exact_target_sell_price(be_total_cost, be_quantity, custom_target, be_day_trade)
     else:
-        custom_sell_price = custom_proceeds_needed / (be_quantity * (1 - FEE_PERCENTAGE / 100))
+        _, custom_sell_price = target_sell_price(be_total_cost, be_quantity, custom_target, be_day_trade,
+                                                 be_schedule)
     
     custom_move = custom_sell_price - be_buy_price
     custom_pct_move = (custom_move / be_buy_price) * 100
@@ -381,6 +635,165 @@ with tab2:
     
     st.divider()
     
+    # Full payoff surface, evaluated in one vectorized pass
+    st.markdown("### 🗺️ P&L Surface")
+    show_surface = st.toggle("Explore profit/loss across every sell price and quantity", key="be_surface")
+    
+    if show_surface:
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            surface_sell_range = st.slider(
+                "Sell Price Range (% from Buy Price)",
+                min_value=-90, max_value=200, value=(-20, 30), step=1,
+                key="be_surface_sell_range"
+            )
+        
+        with col2:
+            surface_max_qty = st.number_input(
+                "Max No. of Stocks", min_value=1, value=max(be_quantity, 1000), step=100,
+                key="be_surface_max_qty"
+            )
+        
+        with col3:
+            surface_points = st.select_slider(
+                "Grid Points per Axis", options=[100, 250, 500, 1000], value=1000,
+                key="be_surface_points"
+            )
+        
+        surface_metric = st.radio("Show", options=["Gain/Loss (Rs.)", "Return %"], horizontal=True,
+                                  key="be_surface_metric")
+        
+        sell_grid = np.linspace(be_buy_price * (1 + surface_sell_range[0] / 100),
+                                be_buy_price * (1 + surface_sell_range[1] / 100), surface_points)
+        qty_grid = np.unique(np.linspace(1, surface_max_qty, min(surface_points, surface_max_qty)).round().astype(np.int64))
+        # Index 0 = Day Trading, 1 = Swing Trading
+        with section("break_even.surface"):
+            surface = pnl_surface(be_buy_price, sell_grid, qty_grid, schedule=be_schedule)
+        surface_values = surface["gain_loss" if surface_metric == "Gain/Loss (Rs.)" else "return_pct"]
+        
+        st.caption(f"{len(sell_grid):,} sell prices × {len(qty_grid):,} quantities × 2 trading types "
+                   f"= {surface_values.size:,} scenarios. Break-even sits at the middle of the colour scale.")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            surface_heatmap("Day Trading", sell_grid, qty_grid, surface_values[0], surface_metric)
+        with col2:
+            surface_heatmap("Swing Trading", sell_grid, qty_grid, surface_values[1], surface_metric)
+        
+        # Exact lookup on the full-resolution grid, starting at the B.E.S price
+        lookup_default = float(np.clip(be_bes_price, sell_grid[0], sell_grid[-1]))
+        col1, col2 = st.columns(2)
+        with col1:
+            lookup_sell = st.number_input("Look up Sell Price", min_value=float(sell_grid[0]),
+                                          max_value=float(sell_grid[-1]), value=lookup_default,
+                                          step=0.25, format="%.2f", key="be_surface_lookup_sell")
+        with col2:
+            lookup_qty = st.number_input("Look up No. of Stocks", min_value=1, max_value=int(qty_grid[-1]),
+                                         value=min(be_quantity, int(qty_grid[-1])), step=1,
+                                         key="be_surface_lookup_qty")
+        
+        sell_index = int(np.abs(sell_grid - lookup_sell).argmin())
+        qty_index = int(np.abs(qty_grid - lookup_qty).argmin())
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric(f"Day Trading @ Rs. {sell_grid[sell_index]:.2f} × {qty_grid[qty_index]:,}",
+                      f"Rs. {surface['gain_loss'][0, qty_index, sell_index]:,.2f}",
+                      delta=f"{surface['return_pct'][0, qty_index, sell_index]:.2f}%")
+        with col2:
+            st.metric(f"Swing Trading @ Rs. {sell_grid[sell_index]:.2f} × {qty_grid[qty_index]:,}",
+                      f"Rs. {surface['gain_loss'][1, qty_index, sell_index]:,.2f}",
+                      delta=f"{surface['return_pct'][1, qty_index, sell_index]:.2f}%")
+    
+    st.divider()
+    
+    # Monte Carlo outcomes - vectorized over paths, fanned out across cores
+    st.markdown("### 🎰 Outcome Simulation")
+    show_simulation = st.toggle("Simulate price paths to estimate the odds of reaching each target",
+                                key="be_simulate")
+    
+    if show_simulation:
+        with st.form("be_simulation_form"):
+            col1, col2, col3, col4 = st.columns(4)
+            
+            with col1:
+                sim_volatility = st.number_input("Annual Volatility %", min_value=0.1, max_value=500.0, value=30.0,
+                                                 step=1.0, format="%.1f", key="be_sim_volatility")
+            
+            with col2:
+                sim_drift = st.number_input("Annual Drift %", min_value=-100.0, max_value=500.0, value=0.0,
+                                            step=1.0, format="%.1f", key="be_sim_drift")
+            
+            with col3:
+                sim_horizon = st.number_input("Horizon (Trading Days)", min_value=1, max_value=1000, value=20,
+                                              step=1, key="be_sim_horizon")
+            
+            with col4:
+                sim_steps = st.select_slider("Steps per Day", options=[1, 6, 26, 78], value=1,
+                                             key="be_sim_steps",
+                                             help="Finer steps catch intraday touches of a target")
+            
+            sim_paths = st.select_slider("Paths", options=[10_000, 100_000, 250_000, 1_000_000], value=100_000,
+                                         format_func="{:,}".format, key="be_sim_paths",
+                                         help=f"Paths × steps per day × days is capped at {MAX_DRAWS:,}")
+            run_simulation = st.form_submit_button("🎰 Run Simulation", use_container_width=True)
+        
+        targets = cached_profit_targets(be_buy_price, be_quantity, be_day_trade, PROFIT_TARGETS, be_exact,
+                                        be_schedule)
+        simulation_key = (be_buy_price, be_quantity, be_day_trade, be_exact, be_schedule, sim_volatility, sim_drift,
+                          sim_horizon, sim_steps, sim_paths)
+        if run_simulation:
+            try:
+                with st.spinner(f"Simulating {sim_paths:,} price paths..."), section("break_even.simulation"):
+                    # Fixed seed: the same inputs always give the same odds
+                    st.session_state.be_simulation = (simulation_key, simulate_outcomes(
+                        be_buy_price, be_quantity, be_day_trade,
+                        [be_bes_price] + [target.sell_price for target in targets],
+                        sim_volatility, sim_drift, sim_horizon, sim_steps, sim_paths, be_schedule, seed=0,
+                    ))
+            except SimulationError as error:
+                st.error(f"Could not run the simulation: {error}")
+        
+        saved = st.session_state.get('be_simulation')
+        if saved is None or saved[0] != simulation_key:
+            st.caption("Set the assumptions and run the simulation; the results follow the inputs above.")
+        else:
+            simulation = saved[1]
+            st.caption(f"{simulation.paths:,} geometric Brownian motion paths over {sim_horizon} trading days "
+                       f"at {sim_volatility:.1f}% volatility, sold at the horizon with {be_same_day.lower()} fees.")
+            
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                st.metric("Chance to Touch B.E.S", f"{simulation.touch_probability[0] * 100:.1f}%",
+                         help="Share of paths that reach the B.E.S price at some point")
+            
+            with col2:
+                st.metric("Chance of Profit at Horizon", f"{simulation.profit_probability * 100:.1f}%",
+                         help="Share of paths where selling at the horizon covers the total cost")
+            
+            with col3:
+                st.metric("Expected P&L at Horizon", f"Rs. {simulation.expected_gain:,.2f}",
+                         help="Average gain/loss selling everything at the horizon")
+            
+            st.markdown("**P&L at Horizon:** " + " · ".join(
+                f"{pct}th percentile Rs. {gain:,.2f}" for pct, gain in zip(GAIN_PERCENTILES, simulation.gain_percentiles)
+            ))
+            
+            df_simulation = pd.DataFrame({
+                'Target': ["B.E.S"] + [f"{target.target_pct}%" for target in targets],
+                'Required Sell Price': simulation.sell_prices,
+                'Chance to Touch': simulation.touch_probability * 100,
+                'Chance to Finish Above': simulation.finish_probability * 100
+            })
+            st.dataframe(df_simulation, use_container_width=True, hide_index=True, column_config={
+                'Required Sell Price': rupees('Required Sell Price', 4),
+                'Chance to Touch': percent('Chance to Touch', 1),
+                'Chance to Finish Above': percent('Chance to Finish Above', 1)
+            })
+    
+    st.divider()
+    
     # Info box
     st.info(f"""
     **How This Works:**
@@ -441,15 +854,61 @@ with tab2:
 
 
 # ==================== TAB 3: Multiple Purchase Calculator ====================
-with tab3:
+@st.fragment
+@timed_tab("multi_purchase")
+def render_multi_purchase():
+    import pandas as pd
+
     st.title("🪙 CalqTrade")
     st.markdown("Calculate average price and break-even for multiple purchases of the same stock")
     
     st.subheader("Multiple Purchase Details")
     
-    # Initialize session state for purchases if not exists
-    if 'purchases' not in st.session_state:
-        st.session_state.purchases = []
+    # Initialize session state for purchases if not exists - one ledger per
+    # symbol, reopened from the saved book so a refresh or restart keeps it
+    if 'portfolio' not in st.session_state:
+        store = default_ledger_store()
+        st.session_state.portfolio = Portfolio.load(store) if store is not None else Portfolio()
+    portfolio = st.session_state.portfolio
+    # A saved book is shared: pick up lots other sessions changed since the last run
+    changed_elsewhere = portfolio.refresh()
+    if changed_elsewhere:
+        st.toast(f"Updated {', '.join(changed_elsewhere)} with changes made in another session", icon="🔄")
+    if 'mp_conflict' in st.session_state:
+        st.warning(f"{st.session_state.pop('mp_conflict')}. The lots were reloaded; please try again.")
+    # Every change goes through the session's history so it can be undone
+    history = st.session_state.get('mp_history')
+    if history is None or history.portfolio is not portfolio:
+        history = st.session_state.mp_history = PortfolioHistory(portfolio)
+    if portfolio.store is not None:
+        st.caption(f"💾 Purchases are saved to `{portfolio.store.path}`, shared by every session using it")
+    
+    # Lot fees follow the selected fee schedule
+    mp_exact, mp_schedule = fee_settings()
+    fee_schedule_caption(mp_schedule)
+    portfolio.set_schedule(mp_schedule)
+    
+    # Active symbol - everything below works on its purchases only
+    if not st.session_state.get("mp_symbol"):
+        st.session_state.mp_symbol = DEFAULT_SYMBOL
+    symbol_options = portfolio.symbols()
+    if st.session_state.mp_symbol not in portfolio:
+        symbol_options = sorted([*symbol_options, st.session_state.mp_symbol])
+    try:
+        symbols_info = symbol_metadata()
+    except (OSError, ValueError) as error:
+        st.warning(f"Symbol names from ${SYMBOLS_ENV} not loaded: {error}")
+        symbols_info = {}
+    mp_symbol = st.selectbox(
+        "Symbol",
+        options=symbol_options,
+        format_func=lambda symbol: symbol_label(symbol, symbols_info),
+        accept_new_options=True,
+        on_change=normalize_active_symbol,
+        help="Pick a holding or type a new ticker to start one",
+        key="mp_symbol"
+    )
+    ledger = portfolio.ledger(mp_symbol)
     
     # Add purchase form
     with st.form("add_purchase_form"):
@@ -467,73 +926,160 @@ with tab3:
             add_button = st.form_submit_button("➕ Add Purchase", use_container_width=True)
     
     if add_button:
-        # Calculate fee for this purchase
-        buy_value = purchase_price * purchase_qty
-        buy_fee = buy_value * (FEE_PERCENTAGE / 100)
-        avg_price_single = (buy_value + buy_fee) / purchase_qty
-        total_cost_single = avg_price_single * purchase_qty
-        
-        st.session_state.purchases.append({
-            'price': purchase_price,
-            'quantity': purchase_qty,
-            'buy_value': buy_value,
-            'buy_fee': buy_fee,
-            'avg_price': avg_price_single,
-            'total_cost': total_cost_single
-        })
-        st.rerun()
-    
-    # Clear all button
-    if st.session_state.purchases:
-        if st.button("🗑️ Clear All Purchases"):
-            st.session_state.purchases = []
-            st.rerun()
+        # Ledger calculates the fee for this purchase and updates running totals
+        change_book(history.add, mp_symbol, purchase_price, purchase_qty)
+
+    # Bulk import from broker export
+    with st.expander("📂 Import Purchases from File"):
+        uploaded_file = st.file_uploader(
+            "Broker export (CSV or Parquet)",
+            type=["csv", "parquet"],
+            help="Needs a price column (Price / Buy Price / Rate) and a quantity column (Quantity / Qty / Shares). "
+                 "Rows go to the symbol in a Symbol / Ticker column, or to the selected symbol where there is none",
+            key="mp_import_file"
+        )
+        if uploaded_file is not None and st.button("📥 Import Purchases", key="mp_import"):
+            imported = 0
+            rejected = 0
+            symbols, prices, quantities = [], [], []
+            progress = st.progress(0.0, text="Reading purchases...")
+            try:
+                for columns, chunk_rejected in import_purchases(uploaded_file, default_symbol=mp_symbol):
+                    count = len(columns["price"])
+                    rejected += chunk_rejected
+                    if count:
+                        symbols.append(np.asarray(columns["symbol"]) if "symbol" in columns
+                                       else np.full(count, mp_symbol))
+                        prices.append(columns["price"])
+                        quantities.append(columns["quantity"])
+                        imported += count
+                    progress.progress(min(uploaded_file.tell() / max(uploaded_file.size, 1), 1.0),
+                                      text=f"Read {imported:,} purchases...")
+            except ValueError as error:
+                st.error(f"Could not import file: {error}")
+            else:
+                st.session_state.mp_import_summary = (imported, rejected)
+                if imported:
+                    # The whole file is one change, undone in one step
+                    change_book(history.extend, np.concatenate(symbols), np.concatenate(prices),
+                                np.concatenate(quantities))
+                rerun_fragment()
+        if 'mp_import_summary' in st.session_state:
+            imported, rejected = st.session_state.pop('mp_import_summary')
+            st.success(f"Imported {imported:,} purchases" + (f" ({rejected:,} invalid rows skipped)" if rejected else ""))
+
+    # Clear all, undo and redo - a cleared symbol comes back with Undo
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        if ledger and st.button(f"🗑️ Clear All {mp_symbol} Purchases"):
+            change_book(history.clear_symbol, mp_symbol)
+    with col2:
+        if st.button("↩️ Undo", disabled=not history.can_undo(), use_container_width=True, key="mp_undo"):
+            change_book(history.undo)
+    with col3:
+        if st.button("↪️ Redo", disabled=not history.can_redo(), use_container_width=True, key="mp_redo"):
+            change_book(history.redo)
+    if len(history):
+        with st.expander("🕘 History"):
+            states = history.states()
+            # Keyed on the current state so the picker always starts there
+            restore_state = st.selectbox(
+                "Book as it was after",
+                options=[state for state, _ in states],
+                index=history.head,
+                format_func=dict(states).get,
+                key=f"mp_history_state_{history.head}_{len(history)}"
+            )
+            st.caption(f"{len(history):,} changes this session; restoring rewrites only the lots "
+                       "changed since that point, leaving other sessions' purchases alone")
+            if st.button("⏪ Restore", disabled=restore_state == history.head, key="mp_restore"):
+                change_book(history.checkout, restore_state)
     
     st.divider()
     
     # Display purchases table
-    if st.session_state.purchases:
-        st.markdown("### 📋 Your Purchases")
-        
-        # Create DataFrame for display
-        purchase_data = []
-        for i, purchase in enumerate(st.session_state.purchases, 1):
-            purchase_data.append({
-                '#': i,
-                'Buy Price': f"Rs. {purchase['price']:.2f}",
-                'Quantity': purchase['quantity'],
-                'Buy Value': f"Rs. {purchase['buy_value']:.2f}",
-                'Buy Fee (1.12%)': f"Rs. {purchase['buy_fee']:.2f}",
-                'Avg Price': f"Rs. {purchase['avg_price']:.4f}",
-                'Total Cost': f"Rs. {purchase['total_cost']:.2f}"
-            })
+    if ledger:
+        st.markdown(f"### 📋 Your {mp_symbol} Purchases")
         
-        df_purchases = pd.DataFrame(purchase_data)
-        st.dataframe(df_purchases, use_container_width=True, hide_index=True)
+        # Only the visible page of lots is formatted and sent to the browser
+        with section("multi_purchase.purchases_table"):
+            page_col, size_col = st.columns([3, 1])
+            with size_col:
+                page_size = st.selectbox("Rows per page", LOT_PAGE_SIZES, key="mp_page_size")
+            pages = -(-len(ledger) // page_size)
+            if st.session_state.get('mp_page', 1) > pages:
+                st.session_state.mp_page = pages
+            with page_col:
+                page = st.number_input("Page", min_value=1, max_value=pages, step=1, key="mp_page")
+            start = (page - 1) * page_size
+            stop = min(start + page_size, len(ledger))
+            lots = {name: values[start:stop] for name, values in ledger.columns().items()}
+            df_purchases = pd.DataFrame({
+                '#': np.arange(start + 1, stop + 1),
+                'Buy Price': lots['price'],
+                'Quantity': lots['quantity'],
+                'Buy Value': lots['buy_value'],
+                'Buy Fee (1.12%)': lots['buy_fee'],
+                'Avg Price': lots['avg_price'],
+                'Total Cost': lots['total_cost']
+            })
+            # The key changes with the ledger and page so a stale selection never points at another lot
+            event = st.dataframe(df_purchases, use_container_width=True, hide_index=True,
+                                 on_select="rerun", selection_mode="single-row",
+                                 key=f"mp_lots_{mp_symbol}_{ledger.version}_{start}_{page_size}",
+                                 column_config={
+                                     'Buy Price': rupees('Buy Price'),
+                                     'Buy Value': rupees('Buy Value'),
+                                     'Buy Fee (1.12%)': rupees('Buy Fee (1.12%)'),
+                                     'Avg Price': rupees('Avg Price', 4),
+                                     'Total Cost': rupees('Total Cost')
+                                 })
+            st.caption(f"Lots {start + 1:,}–{stop:,} of {len(ledger):,}")
         
-        # Add delete buttons
-        st.markdown("#### Remove Purchase")
-        cols = st.columns(min(len(st.session_state.purchases), 5))
-        for i, col in enumerate(cols):
-            if i < len(st.session_state.purchases):
-                with col:
-                    if st.button(f"Delete #{i+1}", key=f"del_{i}"):
-                        st.session_state.purchases.pop(i)
-                        st.rerun()
+        # Edit or remove the selected purchase
+        selected_rows = event.selection.rows
+        selected_lot = start + selected_rows[0] if selected_rows else None
+        if selected_lot is None:
+            st.caption("Select a row to edit or delete that purchase and see its breakdown.")
+        else:
+            st.markdown(f"#### Edit Purchase #{selected_lot + 1}")
+            purchase = ledger[selected_lot]
+            with st.form(f"mp_edit_{mp_symbol}_{selected_lot}_{ledger.version}"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    edit_price = st.number_input("Buy Price (Rs.)", min_value=0.01,
+                                                 value=float(purchase['price']), step=0.01, format="%.2f")
+                with col2:
+                    edit_qty = st.number_input("Quantity", min_value=1,
+                                               value=int(purchase['quantity']), step=1)
+                save_col, delete_col = st.columns(2)
+                with save_col:
+                    save = st.form_submit_button("💾 Save Changes", use_container_width=True)
+                with delete_col:
+                    delete = st.form_submit_button("🗑️ Delete", use_container_width=True)
+            if save:
+                change_book(history.update, mp_symbol, selected_lot, edit_price, edit_qty)
+            if delete:
+                change_book(history.remove, mp_symbol, selected_lot)
         
         st.divider()
         
-        # Calculate overall statistics
-        total_quantity = sum(p['quantity'] for p in st.session_state.purchases)
-        total_buy_value = sum(p['buy_value'] for p in st.session_state.purchases)
-        total_buy_fees = sum(p['buy_fee'] for p in st.session_state.purchases)
-        total_cost_all = sum(p['total_cost'] for p in st.session_state.purchases)
-        
-        # Overall Average Price = Total Cost ÷ Total Quantity
-        overall_avg_price = total_cost_all / total_quantity if total_quantity > 0 else 0
-        
-        # Weighted average of buy prices (without fees, for reference)
-        simple_weighted_avg = total_buy_value / total_quantity if total_quantity > 0 else 0
+        # Overall statistics - running totals kept up to date by the ledger
+        with section("multi_purchase.aggregates"):
+            total_quantity = ledger.total_quantity
+            if mp_exact:
+                (total_buy_value, total_buy_fees, total_cost_all,
+                 overall_avg_price, simple_weighted_avg) = ledger.exact_totals()
+            else:
+                total_buy_value = ledger.total_buy_value
+                total_buy_fees = ledger.total_buy_fees
+                total_cost_all = ledger.total_cost
+                
+                # Overall Average Price = Total Cost ÷ Total Quantity
+                overall_avg_price = ledger.overall_avg_price
+                
+                # Weighted average of buy prices (without fees, for reference)
+                simple_weighted_avg = ledger.simple_weighted_avg
         
         st.markdown("### 📊 Overall Portfolio Summary")
         
@@ -586,16 +1132,9 @@ with tab3:
         )
         
         # Calculate B.E.S Price
-        STL_RATE = 0.30 / 100
-        
-        if mp_same_day == "Same Day Trading":
-            # For same day: Only STL (0.30%) on sell
-            mp_bes_price = total_cost_all / (total_quantity * (1 - STL_RATE))
-            mp_sell_fee = mp_bes_price * total_quantity * STL_RATE
-        else:
-            # For another day: B.E.S = Avg Price × 1.0112
-            mp_bes_price = overall_avg_price * (1 + FEE_PERCENTAGE / 100)
-            mp_sell_fee = mp_bes_price * total_quantity * (FEE_PERCENTAGE / 100)
+        # Same day: Total Cost ÷ (Qty × 0.997). Another day: Avg Price × 1.0112
+        mp_day_trade = is_day_trade(mp_same_day)
+        mp_bes_price = ledger.exact_bes_price(mp_same_day) if mp_exact else ledger.bes_price(mp_same_day)
         
         mp_price_increase = mp_bes_price - simple_weighted_avg
         mp_percentage_move = (mp_price_increase / simple_weighted_avg) * 100 if simple_weighted_avg > 0 else 0
@@ -621,44 +1160,298 @@ with tab3:
         st.markdown("### 💰 Profit Scenarios at Different Sell Prices")
         
         # Generate sell price scenarios
-        scenarios = []
-        
-        # Calculate range around average price
-        price_steps = [
-            simple_weighted_avg * 0.95,
-            simple_weighted_avg * 0.98,
-            overall_avg_price,
-            mp_bes_price,
-            simple_weighted_avg * 1.02,
-            simple_weighted_avg * 1.05,
-            simple_weighted_avg * 1.10,
-            simple_weighted_avg * 1.15,
-            simple_weighted_avg * 1.20
-        ]
-        
-        for sell_price in price_steps:
-            total_sell_value = sell_price * total_quantity
+        with section("multi_purchase.scenarios"):
+            # Calculate range around average price
+            price_steps = np.array([
+                simple_weighted_avg * 0.95,
+                simple_weighted_avg * 0.98,
+                overall_avg_price,
+                mp_bes_price,
+                simple_weighted_avg * 1.02,
+                simple_weighted_avg * 1.05,
+                simple_weighted_avg * 1.10,
+                simple_weighted_avg * 1.15,
+                simple_weighted_avg * 1.20
+            ])
             
-            if mp_same_day == "Same Day Trading":
-                sell_fee = total_sell_value * STL_RATE
+            # Same day: STL only on sell. Another day: full fee on sell - every step in one call
+            if mp_exact:
+                total_sell_value, sell_fee, proceeds = exact_sell_side(price_steps, total_quantity, mp_day_trade)
             else:
-                sell_fee = total_sell_value * (FEE_PERCENTAGE / 100)
-            
-            proceeds = total_sell_value - sell_fee
+                total_sell_value, sell_fee, proceeds = sell_side(price_steps, total_quantity, mp_day_trade,
+                                                                 mp_schedule)
             gain_loss = proceeds - total_cost_all
-            gain_loss_pct = (gain_loss / total_cost_all) * 100 if total_cost_all > 0 else 0
+            gain_loss_pct = (gain_loss / total_cost_all) * 100 if total_cost_all > 0 else np.zeros_like(gain_loss)
+            
+            df_scenarios = pd.DataFrame({
+                'Sell Price': price_steps,
+                'Sell Value': total_sell_value,
+                'Sell Fee': sell_fee,
+                'Proceeds': proceeds,
+                'Profit/Loss': gain_loss,
+                'Return %': gain_loss_pct
+            })
+            st.dataframe(df_scenarios, use_container_width=True, hide_index=True, column_config={
+                'Sell Price': rupees('Sell Price'),
+                'Sell Value': rupees('Sell Value'),
+                'Sell Fee': rupees('Sell Fee'),
+                'Proceeds': rupees('Proceeds'),
+                'Profit/Loss': rupees('Profit/Loss'),
+                'Return %': percent('Return %')
+            })
+        
+        st.divider()
+        
+        # Averaging down - the buys that bring the average or B.E.S down to a target
+        st.markdown("### 🧮 Average Down Planner")
+        with st.form("mp_planner_form"):
+            col1, col2 = st.columns(2)
+            with col1:
+                plan_metric = st.radio("Target", options=TARGET_METRICS, format_func=TARGET_LABELS.get,
+                                       horizontal=True, key="mp_plan_metric")
+            with col2:
+                plan_target = st.number_input("Target Price", min_value=0.01,
+                                              value=round(overall_avg_price * 0.98, 2), step=0.01, format="%.2f",
+                                              key="mp_plan_target")
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                plan_high = st.number_input("Ladder From", min_value=0.01, value=round(simple_weighted_avg * 0.97, 2),
+                                            step=0.01, format="%.2f", key="mp_plan_high",
+                                            help="Highest buy order; also the price of a single buy")
+            with col2:
+                plan_low = st.number_input("Ladder Down To", min_value=0.01,
+                                           value=round(simple_weighted_avg * 0.90, 2), step=0.01, format="%.2f",
+                                           key="mp_plan_low")
+            with col3:
+                plan_max_order = st.number_input("Max Shares per Order", min_value=0, value=0, step=1,
+                                                 key="mp_plan_max_order", help="0 for no limit")
+            with col4:
+                plan_budget = st.number_input("Budget (Rs.)", min_value=0.0, value=0.0, step=1000.0,
+                                              key="mp_plan_budget", help="0 for no limit")
+            plan_submitted = st.form_submit_button("🧮 Plan Buys", use_container_width=True)
+        
+        # Planned only on submit; the result is shown until the inputs or the position change
+        plan_position = (total_quantity, total_cost_all)
+        plan_key = (mp_symbol, plan_position, plan_metric, plan_target, plan_high, plan_low, plan_max_order,
+                    plan_budget, mp_day_trade, mp_schedule)
+        if plan_submitted:
+            with section("multi_purchase.planner"):
+                try:
+                    single_buys = shares_to_target(*plan_position, np.linspace(plan_high, plan_low, PLAN_PRICE_STEPS),
+                                                   plan_target, plan_metric, mp_day_trade, mp_schedule)
+                    ladder = plan_ladder(*plan_position, plan_target, max(plan_high, plan_low),
+                                         min(plan_high, plan_low), plan_metric, mp_day_trade, mp_schedule,
+                                         max_order_quantity=plan_max_order, budget=plan_budget)
+                except PlanningError as error:
+                    st.session_state.mp_plan = (plan_key, error)
+                else:
+                    st.session_state.mp_plan = (plan_key, (single_buys, ladder))
+        saved_key, plan = st.session_state.get('mp_plan', (None, None))
+        if saved_key != plan_key:
+            st.caption("Set a target and press Plan Buys" if saved_key is None else
+                       "The position or settings changed since the last plan; press Plan Buys to plan again")
+        elif isinstance(plan, PlanningError):
+            st.info(str(plan))
+        else:
+            single_buys, ladder = plan
+            if single_buys['reachable'][0]:
+                st.success(f"Buy **{single_buys['quantity'][0]:,}** shares at Rs. {plan_high:.2f} "
+                           f"(Rs. {single_buys['cost'][0]:,.2f} with fees) to bring the "
+                           f"{TARGET_LABELS[plan_metric]} to Rs. {plan_target:.2f}")
+            else:
+                st.warning(f"Buying at Rs. {plan_high:.2f} cannot bring the {TARGET_LABELS[plan_metric]} "
+                           f"down to Rs. {plan_target:.2f}")
+            
+            st.markdown("**Single buy at each price**")
+            df_single = pd.DataFrame({
+                'Buy Price': single_buys['buy_price'],
+                'Shares Needed': np.where(single_buys['reachable'], single_buys['quantity'], np.nan),
+                'Cost': np.where(single_buys['reachable'], single_buys['cost'], np.nan),
+                'New Avg Price': np.where(single_buys['reachable'], single_buys['new_avg_price'], np.nan),
+                'New B.E.S Price': np.where(single_buys['reachable'], single_buys['new_bes_price'], np.nan)
+            })
+            st.dataframe(df_single, use_container_width=True, hide_index=True, column_config={
+                'Buy Price': rupees('Buy Price'),
+                'Shares Needed': st.column_config.NumberColumn('Shares Needed', format="%,d"),
+                'Cost': rupees('Cost'),
+                'New Avg Price': rupees('New Avg Price', 4),
+                'New B.E.S Price': rupees('New B.E.S Price', 4)
+            })
+            
+            st.markdown("**Cheapest ladder of buy orders**")
+            if ladder is None:
+                st.warning("No ladder in this range reaches the target within the order size and budget limits")
+            else:
+                st.caption(f"{ladder.rungs} orders sized ×{ladder.skew:g} per step down, the cheapest of "
+                           f"{ladder.feasible:,} workable ladders out of {ladder.candidates:,} evaluated; "
+                           f"Rs. {ladder.cash:,.2f} in total once every order fills")
+                df_ladder = pd.DataFrame({
+                    'Order': np.arange(1, ladder.rungs + 1),
+                    'Buy Price': ladder.prices,
+                    'Shares': ladder.quantities,
+                    'Cost': ladder.costs,
+                    'Avg Price After Fill': ladder.avg_after,
+                    'B.E.S After Fill': ladder.bes_after
+                })
+                st.dataframe(df_ladder, use_container_width=True, hide_index=True, column_config={
+                    'Buy Price': rupees('Buy Price'),
+                    'Cost': rupees('Cost'),
+                    'Avg Price After Fill': rupees('Avg Price After Fill', 4),
+                    'B.E.S After Fill': rupees('B.E.S After Fill', 4)
+                })
+        
+        st.divider()
+        
+        # Record sells - matched against the open lots for realized P&L
+        st.markdown("### 🧾 Record a Sell")
+        st.markdown("Match a sell against your open lots to book realized profit/loss:")
+        
+        sell_orders = st.session_state.setdefault('mp_sells', {}).setdefault(mp_symbol, [])
+        # Replay before drawing the method picker, which locks while sells exist
+        matcher = lot_matcher(mp_symbol, ledger, st.session_state.get('mp_match_method', MATCHING_METHODS[0]),
+                              sell_orders)
+        match_method = st.radio(
+            "Matching Method",
+            options=list(MATCHING_METHODS),
+            format_func=MATCHING_LABELS.get,
+            horizontal=True,
+            disabled=bool(sell_orders),
+            help="Which lots a sell consumes. Fixed once a sell is recorded - clear the sells to change it",
+            key="mp_match_method"
+        )
+        
+        if matcher.open_quantity > 0:
+            with st.form("record_sell_form"):
+                col1, col2, col3 = st.columns(3)
+                
+                with col1:
+                    mp_sell_price = st.number_input("Sell Price", min_value=0.0, value=round(mp_bes_price, 2),
+                                                    step=1.0, format="%.2f", key="mp_sell_price")
+                
+                with col2:
+                    if match_method == SPECIFIC:
+                        mp_sell_lot = st.number_input("Lot #", min_value=1, max_value=len(ledger), value=1, step=1,
+                                                      key="mp_sell_lot")
+                    mp_sell_qty = st.number_input("Quantity", min_value=1, max_value=matcher.open_quantity,
+                                                  value=min(1000, matcher.open_quantity), step=1, key="mp_sell_qty")
+                
+                with col3:
+                    st.markdown("<br>", unsafe_allow_html=True)
+                    sell_button = st.form_submit_button("🧾 Record Sell", use_container_width=True)
+            
+            if sell_button:
+                lots = {mp_sell_lot - 1: mp_sell_qty} if match_method == SPECIFIC else None
+                try:
+                    matcher.sell(mp_sell_qty, mp_sell_price, mp_same_day, lots)
+                except LotMatchingError as error:
+                    st.error(f"Could not record sell: {error}")
+                else:
+                    lot_ids = None if lots is None else {int(ledger.ids[mp_sell_lot - 1]): mp_sell_qty}
+                    sell_orders.append((mp_sell_qty, mp_sell_price, mp_same_day, lot_ids))
+                    rerun_fragment()
+        
+        if matcher.sells:
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                st.metric("Open Quantity", f"{matcher.open_quantity:,}", help="Shares left after recorded sells")
             
-            scenarios.append({
-                'Sell Price': f"Rs. {sell_price:.2f}",
-                'Sell Value': f"Rs. {total_sell_value:,.2f}",
-                'Sell Fee': f"Rs. {sell_fee:.2f}",
-                'Proceeds': f"Rs. {proceeds:,.2f}",
-                'Profit/Loss': f"Rs. {gain_loss:,.2f}",
-                'Return %': f"{gain_loss_pct:.2f}%"
+            with col2:
+                st.metric("Open Avg Price", f"Rs. {matcher.open_avg_price:.4f}",
+                         help="Remaining cost per open share, including buy fees")
+            
+            with col3:
+                st.metric("Realized P&L", f"Rs. {matcher.realized_gain:,.2f}",
+                         delta=f"{matcher.realized_gain:,.2f}", help="Proceeds minus matched cost over all sells")
+            
+            df_sells = pd.DataFrame({
+                'Sell #': range(1, len(matcher.sells) + 1),
+                'Quantity': [sell.quantity for sell in matcher.sells],
+                'Sell Price': [sell.sell_price for sell in matcher.sells],
+                'Proceeds': [sell.proceeds for sell in matcher.sells],
+                'Cost Basis': [sell.cost_basis for sell in matcher.sells],
+                'Realized P&L': [sell.realized_gain for sell in matcher.sells],
+                'Lots Used': [", ".join(f"#{lot + 1}×{quantity:,}" for lot, quantity, _ in sell.lots) or "Average"
+                              for sell in matcher.sells]
+            })
+            st.dataframe(df_sells, use_container_width=True, hide_index=True, column_config={
+                'Sell Price': rupees('Sell Price'),
+                'Proceeds': rupees('Proceeds'),
+                'Cost Basis': rupees('Cost Basis'),
+                'Realized P&L': rupees('Realized P&L')
             })
+            
+            if st.button("↩️ Clear Recorded Sells", key="mp_clear_sells"):
+                sell_orders.clear()
+                rerun_fragment()
+        
+        # Mark-to-market history - read from a memory-mapped price file
+        with st.expander("📈 Mark-to-Market History"):
+            # Only files the operator listed can be opened, never a path typed in the browser
+            price_paths = configured_price_paths()
+            price_path = st.selectbox(
+                "Price data",
+                options=price_paths,
+                help="Price directories built with `python -m calqtrade.prices prices.csv prices_dir`, "
+                     f"or Parquet files with Symbol, Date and Close columns, listed in ${PRICE_PATH_ENV}",
+                key="mp_price_path"
+            ) if len(price_paths) > 1 else next(iter(price_paths), None)
+            if not price_path:
+                st.info(f"Set ${PRICE_PATH_ENV} to the price data to chart your position against")
+            elif matcher.open_quantity > 0:
+                try:
+                    price_source = cached_price_source(price_path)
+                except ValueError as error:
+                    st.error(str(error))
+                else:
+                    price_symbols = price_source.symbols()
+                    if price_symbols and mp_symbol not in price_symbols:
+                        st.warning(f"No prices for {mp_symbol} in {price_path}")
+                    else:
+                        date_range = st.date_input("Date Range", value=(), key="mp_price_dates",
+                                                   help="Leave empty for the whole history")
+                        date_start, date_end = (date_range + (None, None))[:2]
+                        if date_end is not None:
+                            date_end = pd.Timestamp(date_end) + pd.Timedelta(days=1) - pd.Timedelta(1)
+                        # The open position after recorded sells
+                        mtm, timestamps, curve = cached_mark_to_market(
+                            price_path, mp_symbol, matcher.open_quantity, matcher.open_cost, mp_day_trade,
+                            mp_schedule, date_start, date_end)
+                        if mtm is None:
+                            st.info("No price bars in this date range")
+                        else:
+                            st.caption(f"{mtm['bars']:,} bars from {pd.Timestamp(mtm['first']):%Y-%m-%d} "
+                                       f"to {pd.Timestamp(mtm['last']):%Y-%m-%d}, "
+                                       f"charted at {len(timestamps):,} points")
+                            
+                            col1, col2, col3, col4 = st.columns(4)
+                            
+                            with col1:
+                                st.metric("Latest Unrealized P&L", f"Rs. {mtm['latest_unrealized_gain']:,.2f}")
+                            
+                            with col2:
+                                st.metric("Best", f"Rs. {mtm['best_unrealized_gain']:,.2f}")
+                            
+                            with col3:
+                                st.metric("Worst", f"Rs. {mtm['worst_unrealized_gain']:,.2f}")
+                            
+                            with col4:
+                                st.metric("Bars at/above B.E.S", f"{mtm['pct_bars_above_bes']:.1f}%")
+                            
+                            st.markdown("**Unrealized P&L (Rs.)**")
+                            st.line_chart(pd.DataFrame({'Unrealized P&L': curve['unrealized_gain']},
+                                                       index=timestamps))
+                            st.markdown("**Distance to B.E.S (%)**")
+                            st.line_chart(pd.DataFrame({'Distance to B.E.S %': curve['distance_to_bes_pct']},
+                                                       index=timestamps))
         
-        df_scenarios = pd.DataFrame(scenarios)
-        st.dataframe(df_scenarios, use_container_width=True, hide_index=True)
+        # Live P&L - the feed's ticks redraw this block only, at a capped frame rate
+        with st.expander("📡 Live P&L"):
+            if st.toggle("Stream live prices", key="mp_live_on",
+                         help=f"Unrealized P&L at the latest {mp_symbol} price from the live feed set in the sidebar, "
+                              "for the whole position and each lot on the current page"):
+                live_position(mp_symbol, ledger.version, total_quantity, total_cost_all, mp_bes_price,
+                              bool(mp_day_trade), mp_schedule, lots, first_lot=start)
         
         st.divider()
         
@@ -666,7 +1459,7 @@ with tab3:
         st.info(f"""
         **Summary:**
         
-        - **Total Purchases:** {len(st.session_state.purchases)} transactions
+        - **Total Purchases:** {len(ledger)} transactions
         - **Total Shares:** {total_quantity:,} shares
         - **Total Investment:** Rs. {total_cost_all:,.2f} (including Rs. {total_buy_fees:.2f} in fees)
         - **Overall Avg Price:** Rs. {overall_avg_price:.4f} per share
@@ -680,13 +1473,16 @@ with tab3:
         """)
         
         # Detailed breakdown
-        with st.expander("🔍 Detailed Calculation Breakdown"):
+        with section("multi_purchase.breakdown"), st.expander("🔍 Detailed Calculation Breakdown"):
             st.markdown(f"""
-            **Individual Purchases:**
+            **Selected Purchase:**
             """)
-            for i, purchase in enumerate(st.session_state.purchases, 1):
+            if selected_lot is None:
+                st.caption("Select a purchase in the table above to see its breakdown here.")
+            else:
+                purchase = ledger[selected_lot]
                 st.markdown(f"""
-                **Purchase #{i}:**
+                **Purchase #{selected_lot + 1}:**
                 - Buy Price: Rs. {purchase['price']:.2f}
                 - Quantity: {purchase['quantity']:,} shares
                 - Buy Value: Rs. {purchase['buy_value']:,.2f}
@@ -732,7 +1528,7 @@ with tab3:
            - Total investment amount
            - Break-even sell price
         3. **View profit scenarios** at different sell prices
-        4. Use the "Clear All" button to start over with a new stock
+        4. Pick or type another symbol to track a different stock, or use "Clear All" to start over
         
         **Example:**
         - Buy 1000 shares at Rs. 100
@@ -741,3 +1537,113 @@ with tab3:
         
         The calculator will show you the true average price for all 3000 shares!
         """)
+    
+    # Portfolio-wide rollup from each symbol's running totals
+    if len(portfolio) > 1:
+        st.divider()
+        st.markdown("### 🗂️ Portfolio Overview")
+        
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.metric("Symbols", f"{len(portfolio):,}")
+        
+        with col2:
+            st.metric("Total Purchases", f"{portfolio.total_lots:,}")
+        
+        with col3:
+            st.metric("Total Quantity", f"{portfolio.total_quantity:,}")
+        
+        with col4:
+            st.metric("Total Cost", f"Rs. {portfolio.total_cost:,.2f}", help="Across every symbol, including buy fees")
+        
+        portfolio_same_day = st.radio(
+            "Trading Type",
+            options=["Same Day Trading", "Sell on Another Day"],
+            horizontal=True,
+            help="Used for each symbol's B.E.S price",
+            key="mp_portfolio_same_day"
+        )
+        summary = portfolio.summary(portfolio_same_day)
+        df_portfolio = pd.DataFrame({
+            'Symbol': summary['symbol'],
+            'Purchases': summary['lots'],
+            'Quantity': summary['total_quantity'],
+            'Total Cost': summary['total_cost'],
+            'Overall Avg Price': summary['overall_avg_price'],
+            'B.E.S Price': summary['bes_price']
+        })
+        st.dataframe(df_portfolio, use_container_width=True, hide_index=True, column_config={
+            'Total Cost': rupees('Total Cost'),
+            'Overall Avg Price': rupees('Overall Avg Price', 4),
+            'B.E.S Price': rupees('B.E.S Price', 4)
+        })
+
+
+def main():
+    # Page configuration
+    st.set_page_config(page_title="CalqTrade", page_icon="🪙", layout="wide")
+    
+    try:
+        serve_metrics_from_env()
+    except (OSError, ValueError) as error:
+        st.sidebar.warning(f"Metrics server not started: {error}")
+    
+    # Sidebar - settings shared by every tab
+    with st.sidebar:
+        st.markdown("### ⚙️ Settings")
+        schedules, schedule_error = fee_schedules()
+        if schedule_error is not None:
+            st.warning(f"Fee schedules in ${FEE_SCHEDULES_ENV} could not be loaded, so the standard fees "
+                       f"apply: {schedule_error}")
+        if len(schedules) > 1:
+            st.selectbox(
+                "Fee schedule",
+                options=list(schedules),
+                key="fee_schedule",
+                help="Brokerage tiers, minimum charges and day/swing sell fees. "
+                     "Extra schedules are loaded from the JSON file in $CALQTRADE_FEE_SCHEDULES"
+            )
+        st.toggle(
+            "Exact fee arithmetic",
+            key="exact_fees",
+            disabled=fee_settings()[1] is not None,
+            help="Compute every fee leg in integer cents, rounded to the cent like a broker contract note, "
+                 "instead of binary floating point (standard fee schedule only)"
+        )
+        price_feeds = configured_price_feeds()
+        if len(price_feeds) > 1:
+            st.selectbox(
+                "Live price feed",
+                options=price_feeds,
+                key="price_feed",
+                help="Files of SYMBOL,PRICE lines that another process appends to, or tcp://host:port sources, "
+                     f"listed in ${PRICE_FEED_ENV}"
+            )
+        show_timings = st.toggle("⏱️ Show timings", key="debug_timings",
+                                 help="Time spent in each section of the tabs on the last run")
+        # Filled in after the tabs run, so it shows this run's timings
+        timing_placeholder = st.empty()
+
+    # Create tabs - each calculator is a fragment, so a widget change only
+    # reruns the tab it belongs to
+    tab1, tab2, tab3 = st.tabs(["💹 Single Trade", "⚖️ Break-Even", "📊 Multi Purchase"])
+
+    with tab1:
+        render_single_trade()
+
+    with tab2:
+        render_break_even()
+
+    with tab3:
+        render_multi_purchase()
+
+    if show_timings:
+        with timing_placeholder.container():
+            timing_panel()
+
+
+# Streamlit runs the script as __main__; importing it (as the benchmarks
+# do) only defines the tab renderers
+if __name__ == "__main__":
+    main()
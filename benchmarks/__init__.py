@@ -0,0 +1,12 @@
+"""Reproducible benchmarks for the calculation core and the tab scripts.
+
+    python -m benchmarks                    # run and compare with baseline.json
+    python -m benchmarks -k engine          # only benchmarks whose name contains "engine"
+    python -m benchmarks --save-baseline    # record the current timings as the baseline
+    python -m benchmarks -k cold_start      # fresh-process import and first-render times
+
+Each benchmark reports the best per-call time over several repeats with
+a fixed seed for its inputs. A benchmark that runs slower than its stored
+baseline by more than its threshold, or over its absolute budget, is a
+regression, and the run exits with status 1.
+"""
@@ -0,0 +1,81 @@
+"""Fee, B.E.S and P&L formulas at scalar and batch scale."""
+import numpy as np
+
+from benchmarks.runner import benchmark
+from calqtrade.cache import cached_break_even, clear_caches
+from calqtrade.engine import bes_price, buy_side, calculate_trade, calculate_trades, pnl_surface
+from calqtrade.fees import STANDARD_SCHEDULE
+from calqtrade.fixedpoint import exact_trade, exact_trades
+
+BATCH_SIZE = 1_000_000
+EXACT_BATCH_SIZE = 100_000
+
+
+def _trades(count, seed=0):
+    generator = np.random.default_rng(seed)
+    buy_price = generator.uniform(10, 5000, count).round(2)
+    sell_price = (buy_price * generator.uniform(0.8, 1.2, count)).round(2)
+    quantity = generator.integers(1, 10_000, count)
+    day_trade = generator.random(count) < 0.5
+    return buy_price, sell_price, quantity, day_trade
+
+
+@benchmark("engine.scalar.calculate_trade")
+def scalar_trade():
+    return lambda: calculate_trade(100.0, 105.0, 1000, "Day Trading")
+
+
+@benchmark("engine.scalar.bes_price")
+def scalar_bes():
+    _, _, avg_price, total_cost = buy_side(100.0, 1000)
+    return lambda: bes_price(total_cost, avg_price, 1000, False)
+
+
+@benchmark("engine.scalar.calculate_trade[schedule]")
+def scalar_trade_schedule():
+    return lambda: calculate_trade(100.0, 105.0, 1000, "Day Trading", STANDARD_SCHEDULE)
+
+
+@benchmark("engine.scalar.exact_trade")
+def scalar_exact_trade():
+    return lambda: exact_trade(100.0, 105.0, 1000, "Day Trading")
+
+
+@benchmark("cache.break_even[miss]")
+def break_even_miss():
+    def call():
+        clear_caches()
+        cached_break_even(100.0, 1000, True)
+
+    return call
+
+
+@benchmark("cache.break_even[hit]")
+def break_even_hit():
+    cached_break_even(100.0, 1000, True)
+    return lambda: cached_break_even(100.0, 1000, True)
+
+
+@benchmark(f"engine.batch.calculate_trades[{BATCH_SIZE:,}]")
+def batch_trades():
+    trades = _trades(BATCH_SIZE)
+    return lambda: calculate_trades(*trades)
+
+
+@benchmark(f"engine.batch.calculate_trades[schedule,{BATCH_SIZE:,}]")
+def batch_trades_schedule():
+    trades = _trades(BATCH_SIZE)
+    return lambda: calculate_trades(*trades, STANDARD_SCHEDULE)
+
+
+@benchmark(f"engine.batch.exact_trades[{EXACT_BATCH_SIZE:,}]")
+def batch_exact_trades():
+    trades = _trades(EXACT_BATCH_SIZE)
+    return lambda: exact_trades(*trades)
+
+
+@benchmark("engine.batch.pnl_surface[1000x1000]")
+def surface():
+    sell_prices = np.linspace(80, 130, 1000)
+    quantities = np.arange(1, 1001)
+    return lambda: pnl_surface(100.0, sell_prices, quantities)
@@ -0,0 +1,67 @@
+"""Cold start: a fresh interpreter importing the core, importing the app, and rendering it once.
+
+Each call starts a new Python process, as a freshly scaled-out container
+does, so nothing is served from an earlier import. One process start
+varies by a third from run to run (numpy's import alone does), too much
+for the relative threshold, so the absolute budgets decide: they fail the
+run on any machine, and the change from the baseline is only reported.
+"""
+import os
+import subprocess
+import sys
+
+from benchmarks.runner import benchmark
+from calqtrade.store import LEDGER_PATH_ENV
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The calculation core must not pull in the UI or dataframe stacks
+IMPORT_CORE = """
+import sys
+import calqtrade
+loaded = [name for name in ("streamlit", "pandas", "pyarrow") if name in sys.modules]
+if loaded:
+    sys.exit(f"import calqtrade loaded {', '.join(loaded)}")
+"""
+
+# Importing the script only defines the tab renderers
+IMPORT_APP = """
+import sys
+import app
+if "pandas" in sys.modules:
+    sys.exit("import app loaded pandas before any table was shown")
+"""
+
+FIRST_RENDER = """
+from streamlit.testing.v1 import AppTest
+app_test = AppTest.from_file("app.py", default_timeout=120).run()
+if app_test.exception:
+    raise SystemExit(app_test.exception[0].message)
+"""
+
+
+def _fresh_process(code):
+    environment = dict(os.environ, **{LEDGER_PATH_ENV: ""})
+
+    def call():
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=environment,
+                                capture_output=True, text=True)
+        if result.returncode:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    return call
+
+
+@benchmark("cold_start.import_calqtrade", threshold=None, number=1, budget=1.0)
+def import_core():
+    return _fresh_process(IMPORT_CORE)
+
+
+@benchmark("cold_start.import_app", threshold=None, number=1, budget=2.5)
+def import_app():
+    return _fresh_process(IMPORT_APP)
+
+
+@benchmark("cold_start.first_render", threshold=None, number=1, budget=6.0)
+def first_render():
+    return _fresh_process(FIRST_RENDER)
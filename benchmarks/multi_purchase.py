@@ -0,0 +1,139 @@
+"""Multi Purchase tab aggregation at 10, 1k and 100k lots, undo history and the averaging-down planner."""
+import numpy as np
+
+from benchmarks.runner import benchmark
+from calqtrade.ledger import PurchaseLedger
+from calqtrade.fees import FeeSchedule
+from calqtrade.history import PortfolioHistory
+from calqtrade.matching import FIFO, LotMatcher
+from calqtrade.planner import plan_ladder, shares_to_target
+from calqtrade.portfolio import Portfolio
+
+LOT_COUNTS = (10, 1_000, 100_000)
+# Lots are spread over up to this many symbols in the portfolio benchmarks
+SYMBOLS = 100
+
+
+def _lots(count, seed=0):
+    generator = np.random.default_rng(seed)
+    return generator.uniform(50, 150, count).round(2), generator.integers(1, 5_000, count)
+
+
+def _ledger(count):
+    ledger = PurchaseLedger()
+    ledger.extend(*_lots(count))
+    return ledger
+
+
+for _count in LOT_COUNTS:
+
+    @benchmark(f"ledger.extend+bes[{_count:,}]")
+    def ledger_extend(count=_count):
+        price, quantity = _lots(count)
+
+        def call():
+            ledger = PurchaseLedger()
+            ledger.extend(price, quantity)
+            ledger.bes_price("Same Day Trading")
+            ledger.exact_bes_price("Sell on Another Day")
+
+        return call
+
+    @benchmark(f"ledger.add+remove_last[{_count:,}]")
+    def ledger_add(count=_count):
+        ledger = _ledger(count)
+
+        def call():
+            ledger.add(101.25, 100)
+            ledger.remove(-1)
+
+        return call
+
+    @benchmark(f"ledger.remove_first[{_count:,}]")
+    def ledger_remove_first(count=_count):
+        ledger = _ledger(count)
+
+        def call():
+            lot = ledger.remove(0)
+            ledger.add(lot["price"], lot["quantity"])
+
+        return call
+
+    @benchmark(f"ledger.columns[{_count:,}]")
+    def ledger_columns(count=_count):
+        ledger = _ledger(count)
+
+        def call():
+            # Force the derived columns to be rebuilt, as after any change
+            ledger._derived = None
+            ledger.columns()
+
+        return call
+
+    @benchmark(f"portfolio.extend+summary[{_count:,}]")
+    def portfolio_summary(count=_count):
+        price, quantity = _lots(count)
+        symbols = np.array([f"SYM{index % SYMBOLS:03d}" for index in range(count)])
+
+        def call():
+            portfolio = Portfolio()
+            portfolio.extend(symbols, price, quantity)
+            portfolio.summary("Same Day Trading")
+
+        return call
+
+    @benchmark(f"matching.fifo_sell_half[{_count:,}]")
+    def fifo_sell(count=_count):
+        ledger = _ledger(count)
+
+        def call():
+            matcher = LotMatcher.from_ledger(ledger, FIFO)
+            matcher.sell(ledger.total_quantity // 2, 110.0, "Sell on Another Day")
+
+        return call
+
+
+HISTORY_EVENTS = 10_000
+
+
+@benchmark(f"history.undo+redo[{HISTORY_EVENTS:,} events]")
+def history_undo():
+    price, quantity = _lots(HISTORY_EVENTS)
+    portfolio = Portfolio()
+    history = PortfolioHistory(portfolio)
+    for index, (lot_price, lot_quantity) in enumerate(zip(price.tolist(), quantity.tolist())):
+        history.add(f"SYM{index % SYMBOLS:03d}", lot_price, lot_quantity)
+
+    def call():
+        history.undo()
+        history.redo()
+
+    return call
+
+
+# A tiered schedule with a minimum charge, which has no closed-form plan
+PLANNER_SCHEDULE = FeeSchedule(
+    "Tiered",
+    buy={"tiers": [[0, 1.12], [1_000_000, 0.95]], "minimum": 50},
+    day_sell={"rate": 0.30},
+    swing_sell={"tiers": [[0, 1.12], [1_000_000, 0.95]], "minimum": 50},
+)
+PLANNER_PRICES = 100_000
+
+
+for _schedule in (None, PLANNER_SCHEDULE):
+    _suffix = "" if _schedule is None else "[schedule]"
+
+    @benchmark(f"planner.shares_to_target[{PLANNER_PRICES:,} prices]{_suffix}")
+    def planner_single(schedule=_schedule):
+        ledger = _ledger(1_000)
+        prices = np.linspace(ledger.overall_avg_price * 0.99, ledger.overall_avg_price * 0.5, PLANNER_PRICES)
+        target = ledger.overall_avg_price * 0.98
+        return lambda: shares_to_target(ledger.total_quantity, ledger.total_cost, prices, target, schedule=schedule)
+
+    @benchmark(f"planner.plan_ladder{_suffix}")
+    def planner_ladder(schedule=_schedule):
+        ledger = _ledger(1_000)
+        average = ledger.overall_avg_price
+        return lambda: plan_ladder(ledger.total_quantity, ledger.total_cost, average * 0.98, average * 0.97,
+                                   average * 0.8, schedule=schedule, max_order_quantity=100_000)
@@ -0,0 +1,69 @@
+"""Headless render time of each tab script with Streamlit's AppTest.
+
+Each benchmark times a rerun of an already-started script, which is what
+a widget interaction costs; the first run (imports, caches) is excluded.
+"""
+import os
+import sys
+
+import numpy as np
+
+from benchmarks.runner import benchmark
+from calqtrade.portfolio import Portfolio
+from calqtrade.store import LEDGER_PATH_ENV
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+RENDER_TIMEOUT = 120
+# Render timings are noisier than the pure calculations
+RENDER_THRESHOLD = 0.5
+TAB_RENDERERS = ("render_single_trade", "render_break_even")
+# The Multi Purchase tab is rendered with this many lots loaded
+MULTI_PURCHASE_LOTS = (10, 1_000, 100_000)
+
+# Keep the benchmarks away from the saved purchase ledger
+os.environ[LEDGER_PATH_ENV] = ""
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def _started(app_test, session_state=None):
+    for key, value in (session_state or {}).items():
+        app_test.session_state[key] = value
+    app_test.run()
+    if app_test.exception:
+        raise RuntimeError(app_test.exception[0].message)
+    return app_test.run
+
+
+def _tab_script(renderer):
+    from streamlit.testing.v1 import AppTest
+
+    return AppTest.from_string(f"import app\napp.{renderer}()\n", default_timeout=RENDER_TIMEOUT)
+
+
+@benchmark("render.app", threshold=RENDER_THRESHOLD)
+def render_app():
+    from streamlit.testing.v1 import AppTest
+
+    return _started(AppTest.from_file(APP_PATH, default_timeout=RENDER_TIMEOUT))
+
+
+for _renderer in TAB_RENDERERS:
+
+    @benchmark(f"render.{_renderer}", threshold=RENDER_THRESHOLD)
+    def render_tab(renderer=_renderer):
+        return _started(_tab_script(renderer))
+
+
+for _count in MULTI_PURCHASE_LOTS:
+
+    @benchmark(f"render.render_multi_purchase[{_count:,} lots]", threshold=RENDER_THRESHOLD)
+    def render_multi_purchase(count=_count):
+        import app
+
+        generator = np.random.default_rng(0)
+        portfolio = Portfolio()
+        portfolio.extend(app.DEFAULT_SYMBOL, generator.uniform(50, 150, count).round(2),
+                         generator.integers(1, 5_000, count))
+        return _started(_tab_script("render_multi_purchase"), {"portfolio": portfolio})
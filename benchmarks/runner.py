@@ -0,0 +1,140 @@
+"""Benchmark registry, timing loop and baseline comparison."""
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+from collections import namedtuple
+
+import numpy as np
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Allowed slowdown over the baseline before a benchmark counts as a regression
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_REPEAT = 5
+# Each repeat runs the benchmark for at least this long (timeit's autorange)
+MIN_REPEAT_TIME = 0.2
+
+Benchmark = namedtuple("Benchmark", ("name", "setup", "threshold", "number", "budget"))
+
+BENCHMARKS = {}
+
+
+def benchmark(name, threshold=DEFAULT_THRESHOLD, number=None, budget=None):
+    """Register ``setup``, which builds the inputs and returns the zero-argument call to time.
+
+    ``number`` fixes the calls per repeat; by default it is chosen so a
+    repeat takes at least MIN_REPEAT_TIME. ``budget`` is an absolute limit
+    in seconds that fails the run on any machine, baseline or not. With
+    ``threshold=None`` the change from the baseline is only reported and
+    ``budget`` alone decides.
+    """
+    def register(setup):
+        if name in BENCHMARKS:
+            raise ValueError(f"Duplicate benchmark: {name}")
+        BENCHMARKS[name] = Benchmark(name, setup, threshold, number, budget)
+        return setup
+
+    return register
+
+
+def _load_suites():
+    # Importing a suite registers its benchmarks
+    from benchmarks import calculations, cold_start, multi_purchase, render  # noqa: F401
+
+
+def environment():
+    """Machine details stored with a baseline; timings only compare on a matching one."""
+    import streamlit
+
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "streamlit": streamlit.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def time_benchmark(bench, repeat=DEFAULT_REPEAT):
+    """Best seconds per call of ``bench`` over ``repeat`` repeats."""
+    call = bench.setup()
+    timer = timeit.Timer(call)
+    number = bench.number
+    if number is None:
+        number, elapsed = timer.autorange()
+        while elapsed < MIN_REPEAT_TIME:
+            number *= 2
+            elapsed *= 2
+    return min(timer.repeat(repeat, number)) / number
+
+
+def _format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.2f} ns"
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def run(pattern=None, repeat=DEFAULT_REPEAT, baseline=None, out=sys.stdout):
+    """Time every matching benchmark; returns ({name: seconds}, [regressed names])."""
+    _load_suites()
+    timings = {}
+    regressions = []
+    stored = (baseline or {}).get("timings", {})
+    for name, bench in BENCHMARKS.items():
+        if pattern and pattern not in name:
+            continue
+        seconds = time_benchmark(bench, repeat)
+        timings[name] = seconds
+        line = f"{name:<48} {_format_time(seconds)}"
+        if name in stored:
+            change = seconds / stored[name] - 1
+            line += f"  {change:+7.1%} vs baseline"
+            if bench.threshold is not None and change > bench.threshold:
+                regressions.append(name)
+                line += f"  REGRESSION (> {bench.threshold:.0%})"
+        if bench.budget is not None and seconds > bench.budget:
+            if name not in regressions:
+                regressions.append(name)
+            line += f"  OVER BUDGET ({_format_time(bench.budget).strip()})"
+        print(line, file=out, flush=True)
+    return timings, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Run the CalqTrade benchmarks")
+    parser.add_argument("-k", dest="pattern", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("-r", "--repeat", type=int, default=DEFAULT_REPEAT, help="Repeats per benchmark")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Write the timings to the baseline file (merged into it with -k)")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    if baseline is not None and baseline.get("environment") != environment():
+        print(f"note: baseline was recorded on {baseline.get('environment')}; "
+              "timings may not be comparable", file=sys.stderr)
+    timings, regressions = run(args.pattern, args.repeat, None if args.save_baseline else baseline)
+
+    if args.save_baseline:
+        stored = baseline["timings"] if baseline is not None and args.pattern else {}
+        stored.update(timings)
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            json.dump({"environment": environment(), "timings": dict(sorted(stored.items()))}, handle, indent=2)
+            handle.write("\n")
+        print(f"Saved {len(timings)} timing(s) to {args.baseline}", file=sys.stderr)
+        return 0
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
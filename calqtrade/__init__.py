@@ -0,0 +1,98 @@
+"""CalqTrade calculation core, importable without Streamlit."""
+from calqtrade.engine import (
+    DAY_TRADING_LABELS,
+    FEE_PERCENTAGE,
+    FEE_RATE,
+    STL_RATE,
+    TRADE_COLUMNS,
+    bes_price,
+    buy_side,
+    calculate_trade,
+    calculate_trades,
+    calculate_trades_frame,
+    is_day_trade,
+    pnl_surface,
+    sell_rate,
+    sell_side,
+    target_sell_price,
+)
+from calqtrade.feed import PRICE_FEED_ENV, PriceFeed, Quote, configured_price_feeds, open_price_feed
+from calqtrade.fees import (
+    STANDARD_SCHEDULE,
+    FeeSchedule,
+    FeeScheduleError,
+    FeeTable,
+    available_fee_schedules,
+    load_fee_schedules,
+)
+from calqtrade.history import Event, PortfolioHistory
+from calqtrade.importer import (
+    PurchaseImportError,
+    import_purchases,
+    iter_frame_chunks,
+    iter_purchase_chunks,
+)
+from calqtrade.ledger import PURCHASE_FIELDS, PurchaseLedger
+from calqtrade.matching import (
+    AVERAGE,
+    FIFO,
+    HIFO,
+    LIFO,
+    MATCHING_METHODS,
+    SPECIFIC,
+    LotMatcher,
+    LotMatchingError,
+    SellMatch,
+)
+from calqtrade.planner import (
+    AVG_PRICE,
+    BES_PRICE,
+    PLAN_FIELDS,
+    TARGET_METRICS,
+    Ladder,
+    PlanningError,
+    plan_ladder,
+    shares_to_target,
+)
+from calqtrade.portfolio import ROLLUP_FIELDS, SUMMARY_FIELDS, Portfolio, normalize_symbol
+from calqtrade.prices import (
+    MTM_FIELDS,
+    MemmapPriceSource,
+    ParquetPriceSource,
+    PriceFileError,
+    build_price_directory,
+    cached_mark_to_market,
+    cached_price_source,
+    configured_price_paths,
+    mark_to_market,
+    mtm_curve,
+    mtm_summary,
+    open_price_source,
+)
+from calqtrade.resources import SharedFileCache, clear_shared_caches, shared_cache_stats
+from calqtrade.store import (
+    AGGREGATE_FIELDS,
+    LedgerConflictError,
+    LedgerStore,
+    default_ledger_store,
+    open_ledger_store,
+)
+from calqtrade.symbols import SymbolMetadataError, load_symbol_metadata, symbol_label, symbol_metadata
+from calqtrade.cache import (
+    PROFIT_TARGETS,
+    cache_stats,
+    cached_break_even,
+    cached_profit_targets,
+    cached_trade,
+    clear_caches,
+)
+from calqtrade.fixedpoint import (
+    DEFAULT_ROUNDING,
+    ROUND_DOWN,
+    ROUND_HALF_EVEN,
+    ROUND_HALF_UP,
+    ROUND_UP,
+    exact_trade,
+    exact_trade_units,
+    exact_trades,
+)
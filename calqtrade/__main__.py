@@ -0,0 +1,5 @@
+import sys
+
+from calqtrade.cli import main
+
+sys.exit(main())
@@ -0,0 +1,125 @@
+"""Process-wide memoized calculations shared by every Streamlit session.
+
+Results are keyed on the plain inputs (prices, quantity, day-trade flag),
+held in bounded LRU caches and returned as immutable tuples, so one
+session can never modify a result another session is reading. Passing
+``exact=True`` evaluates the fee legs with calqtrade.fixedpoint instead of
+binary floats; exact and float results are cached separately. A
+calqtrade.fees.FeeSchedule is hashable and part of the key too; exact
+arithmetic is only available for the standard (schedule=None) fees.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from calqtrade.engine import (
+    TRADE_COLUMNS,
+    _safe_div,
+    bes_price,
+    buy_side,
+    calculate_trade,
+    sell_rate,
+    target_sell_price,
+)
+from calqtrade.fixedpoint import exact_break_even, exact_target_sell_price, exact_trade
+from calqtrade.prices import _cached_mark_to_market
+
+# Profit targets shown in the Break-Even tab's "Profit Target Scenarios"
+PROFIT_TARGETS = (0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 15.0, 20.0, 25.0, 30.0)
+
+TRADE_CACHE_SIZE = 4096
+BREAK_EVEN_CACHE_SIZE = 4096
+PROFIT_TARGET_CACHE_SIZE = 1024
+
+Trade = namedtuple("Trade", TRADE_COLUMNS)
+
+BreakEven = namedtuple("BreakEven", (
+    "buy_value",
+    "buy_fee",
+    "avg_price",
+    "total_cost",
+    "bes_price",
+    "sell_fee",
+    "price_move",
+    "pct_move",
+))
+
+ProfitTarget = namedtuple("ProfitTarget", (
+    "target_pct",
+    "profit_amount",
+    "sell_price",
+    "price_move",
+    "pct_move",
+))
+
+
+def _check_exact(exact, schedule):
+    if exact and schedule is not None:
+        raise ValueError("Exact fee arithmetic is only available for the standard fee schedule")
+
+
+@lru_cache(maxsize=TRADE_CACHE_SIZE)
+def cached_trade(buy_price, sell_price, quantity, day_trade, exact=False, schedule=None):
+    """Single Trade tab result for one set of inputs."""
+    _check_exact(exact, schedule)
+    if exact:
+        return Trade(**exact_trade(buy_price, sell_price, quantity, day_trade))
+    return Trade(**calculate_trade(buy_price, sell_price, quantity, day_trade, schedule))
+
+
+@lru_cache(maxsize=BREAK_EVEN_CACHE_SIZE)
+def cached_break_even(buy_price, quantity, day_trade, exact=False, schedule=None):
+    """Buy side, B.E.S price, sell fee at B.E.S and move needed from the buy price."""
+    _check_exact(exact, schedule)
+    if exact:
+        buy_value, buy_fee, avg_price, total_cost, bes, sell_fee = exact_break_even(buy_price, quantity, day_trade)
+    else:
+        buy_value, buy_fee, avg_price, total_cost = buy_side(buy_price, quantity, schedule)
+        bes = bes_price(total_cost, avg_price, quantity, day_trade, schedule)
+        if schedule is None:
+            sell_fee = bes * quantity * sell_rate(day_trade)
+        else:
+            sell_fee = schedule.sell_fee(bes * quantity, day_trade)
+    price_move = bes - buy_price
+    pct_move = _safe_div(price_move, buy_price, 100)
+    return BreakEven(buy_value, buy_fee, avg_price, total_cost, bes, sell_fee, price_move, pct_move)
+
+
+@lru_cache(maxsize=PROFIT_TARGET_CACHE_SIZE)
+def cached_profit_targets(buy_price, quantity, day_trade, targets=PROFIT_TARGETS, exact=False, schedule=None):
+    """Required sell price for every profit target, one ProfitTarget per row."""
+    total_cost = cached_break_even(buy_price, quantity, day_trade, exact, schedule).total_cost
+    target_pct = np.array(targets, dtype=np.float64)
+    if exact:
+        # One target at a time in Python ints, which never overflow, as for a single trade
+        profit_amount, sell_price = (np.array(column) for column in zip(*(
+            exact_target_sell_price(total_cost, quantity, pct, day_trade) for pct in target_pct.tolist()
+        )))
+    else:
+        profit_amount, sell_price = target_sell_price(total_cost, quantity, target_pct, day_trade, schedule)
+    price_move = sell_price - buy_price
+    pct_move = _safe_div(price_move, buy_price, 100)
+    return tuple(
+        ProfitTarget(*row)
+        for row in zip(targets, profit_amount.tolist(), sell_price.tolist(),
+                       price_move.tolist(), pct_move.tolist())
+    )
+
+
+CACHED_FUNCTIONS = {
+    "trade": cached_trade,
+    "break_even": cached_break_even,
+    "profit_targets": cached_profit_targets,
+    "mark_to_market": _cached_mark_to_market,
+}
+
+
+def cache_stats():
+    """Hit/miss counters and sizes for every calculation cache."""
+    return {name: function.cache_info()._asdict() for name, function in CACHED_FUNCTIONS.items()}
+
+
+def clear_caches():
+    for function in CACHED_FUNCTIONS.values():
+        function.cache_clear()
@@ -0,0 +1,161 @@
+"""Command-line batch mode: stream a trades file through the tab formulas.
+
+    python -m calqtrade trades.csv -o results.csv --workers 8
+
+The input (CSV or Parquet) needs buy_price, sell_price, quantity and
+trading_type columns; every other column is passed through. Chunks are
+fanned out across a process pool and written to the output in input
+order as soon as they are ready, so memory stays bounded by
+``chunksize × (2 × workers)`` rows however large the file is.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from calqtrade.engine import calculate_trades
+from calqtrade.fixedpoint import exact_trades
+from calqtrade.importer import detect_format, iter_frame_chunks
+
+DEFAULT_CHUNKSIZE = 250_000
+INPUT_COLUMNS = ("buy_price", "sell_price", "quantity", "trading_type")
+
+
+def evaluate_chunk(chunk, exact=False):
+    """Append every derived trade column to a chunk of trades."""
+    missing = [column for column in INPUT_COLUMNS if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    calculate = exact_trades if exact else calculate_trades
+    columns = calculate(*(chunk[column].to_numpy() for column in INPUT_COLUMNS))
+    return chunk.assign(**columns)
+
+
+def _process_chunk(chunk, exact, file_format, header):
+    # Runs in the worker: CSV formatting is as costly as the maths, so do both there
+    result = evaluate_chunk(chunk, exact)
+    if file_format == "csv":
+        return len(result), result.to_csv(header=header, index=False)
+    return len(result), result
+
+
+class ChunkWriter:
+    """Writes result chunks incrementally to CSV or Parquet."""
+
+    def __init__(self, path, file_format=None):
+        self.path = path
+        self.file_format = detect_format(path, file_format)
+        self._handle = None
+        self._parquet_writer = None
+
+    def write(self, frame):
+        """Append a result frame, or CSV text already formatted by a worker."""
+        if self.file_format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            if self._handle is None:
+                self._handle = open(self.path, "w", newline="") if self.path != "-" else sys.stdout
+            self._handle.write(frame)
+
+    @property
+    def empty(self):
+        """True until the first frame is written."""
+        return self._handle is None and self._parquet_writer is None
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if self._handle is not None and self._handle is not sys.stdout:
+            self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run_batch(source, output, workers=None, chunksize=DEFAULT_CHUNKSIZE, exact=False,
+              input_format=None, output_format=None, progress=None):
+    """Evaluate every trade in ``source`` and write the results to ``output``.
+
+    Returns the number of rows written. ``workers=1`` evaluates in-process.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = iter_frame_chunks(source, input_format, chunksize)
+    rows = 0
+    with ChunkWriter(output, output_format) as writer:
+        file_format = writer.file_format
+
+        def write(count, result):
+            nonlocal rows
+            writer.write(result)
+            rows += count
+            if progress:
+                progress(rows)
+
+        if workers == 1:
+            for index, chunk in enumerate(chunks):
+                write(*_process_chunk(chunk, exact, file_format, index == 0))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # Keep a bounded window of chunks in flight and write them back in order
+                pending = deque()
+                for index, chunk in enumerate(chunks):
+                    pending.append(executor.submit(_process_chunk, chunk, exact, file_format, index == 0))
+                    while pending and (len(pending) >= 2 * workers or pending[0].done()):
+                        write(*pending.popleft().result())
+                while pending:
+                    write(*pending.popleft().result())
+        if writer.empty:
+            # An input without rows (say, an empty Parquet file) still gets a result file with a header
+            import pandas as pd
+
+            write(*_process_chunk(pd.DataFrame({column: [] for column in INPUT_COLUMNS}), exact, file_format, True))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m calqtrade",
+        description="Compute avg price, B.E.S, fees, proceeds and gain/loss for a trades file",
+    )
+    parser.add_argument("input", help="CSV or Parquet file with buy_price, sell_price, quantity, trading_type")
+    parser.add_argument("-o", "--output", default="-", help="Output CSV or Parquet file (default: CSV to stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Worker processes (default: all cores; 1 runs in-process)")
+    parser.add_argument("-c", "--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows per chunk")
+    parser.add_argument("--exact", action="store_true", help="Use integer-cent fee arithmetic")
+    parser.add_argument("--input-format", choices=["csv", "parquet"], help="Override input format detection")
+    parser.add_argument("--output-format", choices=["csv", "parquet"], help="Override output format detection")
+    args = parser.parse_args(argv)
+
+    if args.output == "-" and args.output_format == "parquet":
+        parser.error("Parquet output needs a file path")
+
+    started = time.perf_counter()
+
+    def report(rows):
+        print(f"\r{rows:,} trades processed", end="", file=sys.stderr, flush=True)
+
+    try:
+        rows = run_batch(args.input, args.output, args.workers, args.chunksize, args.exact,
+                         args.input_format, args.output_format, progress=report)
+    except (OSError, ValueError) as error:
+        print(f"\nerror: {error}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - started
+    print(f"\r{rows:,} trades processed in {elapsed:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Fee, break-even and profit/loss formulas used by the calculator tabs.
+
+Every formula accepts either plain Python numbers or NumPy arrays, so the
+same code path evaluates one trade for the Streamlit page and millions of
+historical fills in one vectorized pass.
+
+Every formula also takes an optional ``schedule`` (a
+calqtrade.fees.FeeSchedule). Without one the calculator's published flat
+fees and B.E.S approximations are used; with one, fees come from the
+schedule's compiled tiers and break-even/target prices are solved exactly
+by inverting its sell leg.
+"""
+import numpy as np
+
+# Fee percentage (brokerage + STL) charged on a full transaction
+FEE_PERCENTAGE = 1.12
+FEE_RATE = FEE_PERCENTAGE / 100
+
+# STL Rate (Share Transaction Levy), the only sell fee on day trades
+STL_RATE = 0.30 / 100
+
+# Tabs 1 and 2 label it "Day Trading", tab 3 "Same Day Trading"
+DAY_TRADING_LABELS = ("Day Trading", "Same Day Trading")
+
+TRADE_COLUMNS = (
+    "buy_value",
+    "buy_fee",
+    "avg_price",
+    "total_cost",
+    "bes_price",
+    "sell_value",
+    "sell_fee",
+    "proceeds",
+    "gain_loss",
+    "return_pct",
+)
+
+
+def is_day_trade(trading_type):
+    """Map a trading type (radio label, bool or array of either) to day-trade flags."""
+    if isinstance(trading_type, str):
+        return trading_type in DAY_TRADING_LABELS
+    if isinstance(trading_type, (bool, np.bool_)):
+        return bool(trading_type)
+    trading_type = np.asarray(trading_type)
+    if trading_type.dtype == bool:
+        return trading_type
+    if trading_type.dtype.kind in "iu":
+        return trading_type != 0
+    return np.isin(trading_type, DAY_TRADING_LABELS)
+
+
+def _select(day_trade, day_value, swing_value):
+    # Scalars take the plain branch so single trades never pay for np.where
+    if isinstance(day_trade, np.ndarray):
+        return np.where(day_trade, day_value, swing_value)
+    return day_value if day_trade else swing_value
+
+
+def _safe_div(numerator, denominator, scale=1.0):
+    # numerator / denominator * scale, or 0 where the denominator is not positive
+    if isinstance(numerator, np.ndarray) or isinstance(denominator, np.ndarray):
+        numerator, denominator = np.broadcast_arrays(
+            np.asarray(numerator, dtype=np.float64),
+            np.asarray(denominator, dtype=np.float64),
+        )
+        out = np.zeros(numerator.shape, dtype=np.float64)
+        np.divide(numerator, denominator, out=out, where=denominator > 0)
+        return out * scale if scale != 1.0 else out
+    return (numerator / denominator) * scale if denominator > 0 else 0
+
+
+def buy_side(buy_price, quantity, schedule=None):
+    """Return (buy_value, buy_fee, avg_price, total_cost) for a purchase."""
+    buy_value = buy_price * quantity
+    buy_fee = buy_value * FEE_RATE if schedule is None else schedule.buy_fee(buy_value)
+    # Average Price (Avg Price) = (Buy Value + Buy Fee) / Quantity
+    avg_price = (buy_value + buy_fee) / quantity
+    # Total Cost = Avg Price × Quantity
+    total_cost = avg_price * quantity
+    return buy_value, buy_fee, avg_price, total_cost
+
+
+def bes_price(total_cost, avg_price, quantity, day_trade, schedule=None):
+    """Break-Even Sell price for a position.
+
+    Day trading only pays STL on the sell, so
+    B.E.S = Total Cost / (Qty × (1 - STL)). Swing trading pays the full fee
+    again, approximated as B.E.S = Avg Price × (1 + fee). Under a fee
+    schedule B.E.S is the price whose proceeds equal Total Cost exactly.
+    """
+    if schedule is not None:
+        return schedule.sell_value_for_proceeds(total_cost, day_trade) / quantity
+    day_bes = total_cost / (quantity * (1 - STL_RATE))
+    swing_bes = avg_price * (1 + FEE_RATE)
+    return _select(day_trade, day_bes, swing_bes)
+
+
+def sell_rate(day_trade):
+    """Fee rate charged on the sell value (STL only for day trades)."""
+    return _select(day_trade, STL_RATE, FEE_RATE)
+
+
+def sell_side(sell_price, quantity, day_trade, schedule=None):
+    """Return (sell_value, sell_fee, proceeds) for a sale."""
+    sell_value = sell_price * quantity
+    if schedule is None:
+        sell_fee = sell_value * sell_rate(day_trade)
+    else:
+        sell_fee = schedule.sell_fee(sell_value, day_trade)
+    proceeds = sell_value - sell_fee
+    return sell_value, sell_fee, proceeds
+
+
+def target_sell_price(total_cost, quantity, target_pct, day_trade, schedule=None):
+    """Return (target_profit, sell_price) needed to make ``target_pct`` on total cost.
+
+    As in the Break-Even tab, day trades ignore the sell fee here
+    (Sell Price × Qty = proceeds needed) while swing trades gross the
+    proceeds up by the full fee. Under a fee schedule both are grossed up
+    through the schedule's sell leg.
+    """
+    # Target profit amount based on total cost
+    target_profit = total_cost * (target_pct / 100)
+    proceeds_needed = total_cost + target_profit
+    if schedule is not None:
+        return target_profit, schedule.sell_value_for_proceeds(proceeds_needed, day_trade) / quantity
+    day_sell_price = proceeds_needed / quantity
+    swing_sell_price = proceeds_needed / (quantity * (1 - FEE_RATE))
+    return target_profit, _select(day_trade, day_sell_price, swing_sell_price)
+
+
+def pnl_surface(buy_price, sell_prices, quantities, day_trade=(True, False), schedule=None):
+    """Gain/loss and return % over a sell price × quantity grid.
+
+    Returns a dict with ``gain_loss`` and ``return_pct`` arrays shaped
+    (len(day_trade), len(quantities), len(sell_prices)), so both trading
+    types are evaluated in one broadcast pass.
+    """
+    day_trade = np.asarray(day_trade, dtype=bool).reshape(-1, 1, 1)
+    quantity = np.asarray(quantities, dtype=np.float64).reshape(1, -1, 1)
+    sell_price = np.asarray(sell_prices, dtype=np.float64).reshape(1, 1, -1)
+    _, _, _, total_cost = buy_side(buy_price, quantity, schedule)
+    _, _, proceeds = sell_side(sell_price, quantity, day_trade, schedule)
+    gain_loss = proceeds - total_cost
+    return {
+        "gain_loss": gain_loss,
+        "return_pct": _safe_div(gain_loss, total_cost, 100),
+    }
+
+
+def _trade_columns(buy_price, sell_price, quantity, day_trade, schedule=None):
+    buy_value, buy_fee, avg_price, total_cost = buy_side(buy_price, quantity, schedule)
+    bes = bes_price(total_cost, avg_price, quantity, day_trade, schedule)
+    sell_value, sell_fee, proceeds = sell_side(sell_price, quantity, day_trade, schedule)
+    gain_loss = proceeds - total_cost
+    return_pct = _safe_div(gain_loss, total_cost, 100)
+    return dict(zip(TRADE_COLUMNS, (
+        buy_value, buy_fee, avg_price, total_cost, bes,
+        sell_value, sell_fee, proceeds, gain_loss, return_pct,
+    )))
+
+
+def calculate_trade(buy_price, sell_price, quantity, trading_type, schedule=None):
+    """Evaluate a single trade, returning a dict of floats keyed by TRADE_COLUMNS."""
+    return _trade_columns(buy_price, sell_price, quantity, is_day_trade(trading_type), schedule)
+
+
+def calculate_trades(buy_price, sell_price, quantity, trading_type, schedule=None):
+    """Evaluate a batch of trades in one vectorized pass.
+
+    Inputs are array-likes of equal length (scalars broadcast); the result
+    is a dict of float64 arrays keyed by TRADE_COLUMNS.
+    """
+    buy_price = np.asarray(buy_price, dtype=np.float64)
+    sell_price = np.asarray(sell_price, dtype=np.float64)
+    quantity = np.asarray(quantity, dtype=np.float64)
+    day_trade = is_day_trade(trading_type)
+    buy_price, sell_price, quantity, day_trade = np.broadcast_arrays(
+        buy_price, sell_price, quantity, np.asarray(day_trade, dtype=bool)
+    )
+    return _trade_columns(buy_price, sell_price, quantity, day_trade, schedule)
+
+
+def calculate_trades_frame(trades, buy_price="buy_price", sell_price="sell_price",
+                           quantity="quantity", trading_type="trading_type", schedule=None):
+    """Append every derived trade column to a copy of a trades DataFrame."""
+    columns = calculate_trades(
+        trades[buy_price].to_numpy(),
+        trades[sell_price].to_numpy(),
+        trades[quantity].to_numpy(),
+        trades[trading_type].to_numpy(),
+        schedule,
+    )
+    return trades.assign(**columns)
@@ -0,0 +1,189 @@
+"""Live prices from a local feed for the Single Trade and Multi Purchase tabs.
+
+A feed is a text stream of ``SYMBOL,PRICE`` lines (a leading timestamp
+column, or any other leading columns, are ignored) read from either:
+
+- a file that another process appends to, followed like ``tail -f``
+- ``tcp://host:port``, a socket that sends one line per tick
+
+One daemon thread per source reads the stream and keeps only the latest
+price per symbol, so any number of ticks between two renders coalesce
+into a single update. Readers poll ``quote(symbol)`` at their own frame
+rate and compare its ``sequence`` with the last one they drew to skip
+work when nothing changed. At most MAX_FEEDS readers run per process;
+opening another stops the one polled least recently.
+
+The app only streams the sources listed, comma-separated, in
+$CALQTRADE_PRICE_FEED (os.pathsep would split ``tcp://host:port``), so a
+browser session can never make the server read a file or open a
+connection of its choosing. Write a test feed with::
+
+    python -m calqtrade.feed prices.feed ABC 100 --interval 0.05
+"""
+import argparse
+import os
+import random
+import socket
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from calqtrade.portfolio import normalize_symbol
+
+# File paths or tcp://host:port sources, comma-separated, offered in the app
+PRICE_FEED_ENV = "CALQTRADE_PRICE_FEED"
+MAX_FEEDS = 4
+
+# How often a tailed file is checked for new lines
+POLL_INTERVAL = 0.05
+# Wait before reopening a feed whose file or socket failed
+RETRY_INTERVAL = 2.0
+
+Quote = namedtuple("Quote", ("symbol", "price", "sequence", "received"))
+
+
+class PriceFeed:
+    """Latest price per symbol from a feed, read on a daemon thread."""
+
+    def __init__(self, source, poll_interval=POLL_INTERVAL, retry_interval=RETRY_INTERVAL):
+        self.source = source
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self.ticks = 0
+        self.rejected = 0
+        self.error = None
+        self._quotes = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="calqtrade-feed", daemon=True)
+        self._thread.start()
+
+    def quote(self, symbol):
+        """Latest Quote for ``symbol``, or None before its first tick."""
+        with self._lock:
+            return self._quotes.get(normalize_symbol(symbol))
+
+    def quotes(self):
+        with self._lock:
+            return dict(self._quotes)
+
+    def stop(self):
+        self._stopped.set()
+
+    def apply(self, line):
+        """Record one ``[...,]SYMBOL,PRICE`` line; other lines (headers, blanks) are counted and skipped."""
+        fields = line.strip().split(",")
+        try:
+            symbol, price = normalize_symbol(fields[-2]), float(fields[-1])
+        except (IndexError, ValueError):
+            symbol, price = "", 0.0
+        if not symbol or not price > 0:
+            self.rejected += 1
+            return
+        with self._lock:
+            self.ticks += 1
+            self._quotes[symbol] = Quote(symbol, price, self.ticks, time.time())
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                for line in self._lines():
+                    self.apply(line)
+                    self.error = None
+            except (OSError, ValueError) as error:
+                # ValueError covers undecodable lines and a malformed tcp:// address
+                self.error = error
+            self._stopped.wait(self.retry_interval)
+
+    def _lines(self):
+        if self.source.startswith("tcp://"):
+            return self._socket_lines()
+        return self._file_lines()
+
+    def _address(self):
+        host, _, port = self.source[len("tcp://"):].rpartition(":")
+        if not port.isdigit() or not 0 < int(port) < 65536:
+            raise ValueError(f"{self.source} is not a tcp://host:port address")
+        return host or "127.0.0.1", int(port)
+
+    def _socket_lines(self):
+        with socket.create_connection(self._address(), timeout=self.retry_interval) as connection:
+            # Wake up now and then to notice stop()
+            connection.settimeout(self.poll_interval * 10)
+            pending = b""
+            while not self._stopped.is_set():
+                try:
+                    data = connection.recv(65536)
+                except socket.timeout:
+                    continue
+                if not data:
+                    raise ConnectionError(f"{self.source} closed the connection")
+                *lines, pending = (pending + data).split(b"\n")
+                for line in lines:
+                    yield line.decode()
+
+    def _file_lines(self):
+        # Read what is already there (the latest prices), then follow appends;
+        # a file that shrinks was truncated or replaced and is read from the top
+        with open(self.source, "rb") as handle:
+            pending = b""
+            while not self._stopped.is_set():
+                chunk = handle.read(65536)
+                if chunk:
+                    *lines, pending = (pending + chunk).split(b"\n")
+                    for line in lines:
+                        yield line.decode()
+                    continue
+                if os.path.getsize(self.source) < handle.tell():
+                    handle.seek(0)
+                    pending = b""
+                self._stopped.wait(self.poll_interval)
+
+
+# source -> PriceFeed, least recently used first
+_FEEDS = OrderedDict()
+_FEEDS_LOCK = threading.Lock()
+
+
+def configured_price_feeds():
+    """Feed sources listed in $CALQTRADE_PRICE_FEED, in order."""
+    return [source.strip() for source in os.environ.get(PRICE_FEED_ENV, "").split(",") if source.strip()]
+
+
+def open_price_feed(source):
+    """Process-wide feed for ``source``; every session polls the same reader thread.
+
+    Only MAX_FEEDS feeds stay open: the least recently used one is
+    stopped to make room for another.
+    """
+    with _FEEDS_LOCK:
+        feed = _FEEDS.pop(source, None) or PriceFeed(source)
+        _FEEDS[source] = feed
+        while len(_FEEDS) > MAX_FEEDS:
+            _FEEDS.popitem(last=False)[1].stop()
+        return feed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Append a random-walk test feed to a file")
+    parser.add_argument("path")
+    parser.add_argument("symbol")
+    parser.add_argument("price", type=float)
+    parser.add_argument("--interval", type=float, default=0.1, help="Seconds between ticks")
+    parser.add_argument("--volatility", type=float, default=0.1, help="Percent move per tick (standard deviation)")
+    args = parser.parse_args(argv)
+    price = args.price
+    symbol = normalize_symbol(args.symbol)
+    with open(args.path, "a", encoding="utf-8") as handle:
+        try:
+            while True:
+                price = max(0.01, price * (1 + random.gauss(0, args.volatility / 100)))
+                handle.write(f"{time.time():.3f},{symbol},{price:.2f}\n")
+                handle.flush()
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
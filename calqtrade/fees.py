@@ -0,0 +1,211 @@
+"""Pluggable fee schedules compiled into lookup tables.
+
+A schedule has three legs: the buy fee, the sell fee on day trades and the
+sell fee on swing trades. Each leg is a list of marginal brokerage tiers
+(rate % charged on the part of the trade value above each breakpoint) plus
+an optional minimum charge per contract::
+
+    {
+        "name": "Tiered broker",
+        "buy": {"tiers": [[0, 1.12], [1000000, 0.95]], "minimum": 50},
+        "day_sell": {"rate": 0.30},
+        "swing_sell": {"tiers": [[0, 1.12], [1000000, 0.95]], "minimum": 50}
+    }
+
+When a schedule is built, every leg is compiled once into breakpoint,
+rate and base-fee arrays with the minimum folded in as an extra flat tier,
+so evaluating a fee is one ``searchsorted`` and one multiply-add for a
+single trade or a whole batch. Fees are non-decreasing and grow slower
+than the trade value, so net proceeds can be inverted exactly, tier by
+tier, to find break-even and target sell prices.
+"""
+import json
+import os
+from bisect import bisect_right
+
+import numpy as np
+
+from calqtrade.engine import FEE_PERCENTAGE, STL_RATE
+from calqtrade.resources import SharedFileCache
+
+# JSON file of extra schedules offered in the app's sidebar
+FEE_SCHEDULES_ENV = "CALQTRADE_FEE_SCHEDULES"
+
+LEGS = ("buy", "day_sell", "swing_sell")
+
+
+class FeeScheduleError(ValueError):
+    """Raised for a fee schedule that cannot be compiled."""
+
+
+class FeeTable:
+    """One compiled fee leg: fee = base[i] + (value - breakpoint[i]) × rate[i]."""
+
+    __slots__ = ("breakpoints", "rates", "bases", "net_breakpoints", "_breakpoint_list", "_net_list")
+
+    def __init__(self, tiers, minimum=0.0):
+        tiers = sorted((float(start), float(rate) / 100) for start, rate in tiers)
+        if not tiers or tiers[0][0] != 0:
+            raise FeeScheduleError("The first fee tier must start at a trade value of 0")
+        if any(rate < 0 or rate >= 1 for _, rate in tiers):
+            raise FeeScheduleError("Fee rates must be at least 0% and below 100%")
+        if minimum < 0:
+            raise FeeScheduleError("Minimum fee cannot be negative")
+        breakpoints = np.array([start for start, _ in tiers])
+        if len(np.unique(breakpoints)) != len(breakpoints):
+            raise FeeScheduleError("Fee tiers must start at distinct trade values")
+        rates = np.array([rate for _, rate in tiers])
+        # Fee accumulated at the start of each tier
+        bases = np.concatenate(([0.0], np.cumsum(np.diff(breakpoints) * rates[:-1])))
+        if minimum > 0:
+            breakpoints, rates, bases = self._fold_minimum(breakpoints, rates, bases, float(minimum))
+        self.breakpoints = breakpoints
+        self.rates = rates
+        self.bases = bases
+        # Net value (value - fee) at each breakpoint, increasing since rates < 100%
+        self.net_breakpoints = breakpoints - bases
+        self._breakpoint_list = breakpoints.tolist()
+        self._net_list = self.net_breakpoints.tolist()
+
+    @staticmethod
+    def _fold_minimum(breakpoints, rates, bases, minimum):
+        # Below the value where the tiered fee reaches the minimum, the fee is
+        # flat: prepend that region as a zero-rate tier charging the minimum
+        tier = np.searchsorted(bases, minimum, side="right") - 1
+        if rates[tier] == 0:
+            # The tiered fee never exceeds the minimum
+            return np.array([0.0]), np.array([0.0]), np.array([minimum])
+        crossover = breakpoints[tier] + (minimum - bases[tier]) / rates[tier]
+        keep = breakpoints > crossover
+        return (
+            np.concatenate(([0.0, crossover], breakpoints[keep])),
+            np.concatenate(([0.0, rates[tier]], rates[keep])),
+            np.concatenate(([minimum, minimum], bases[keep])),
+        )
+
+    def fee(self, value):
+        """Fee charged on a trade value (float or array)."""
+        if isinstance(value, np.ndarray):
+            tier = np.maximum(np.searchsorted(self.breakpoints, value, side="right") - 1, 0)
+            return self.bases[tier] + (value - self.breakpoints[tier]) * self.rates[tier]
+        tier = max(bisect_right(self._breakpoint_list, value) - 1, 0)
+        return float(self.bases[tier]) + (value - self._breakpoint_list[tier]) * float(self.rates[tier])
+
+    def gross_value(self, net):
+        """Trade value whose proceeds after this fee equal ``net``."""
+        if isinstance(net, np.ndarray):
+            tier = np.maximum(np.searchsorted(self.net_breakpoints, net, side="right") - 1, 0)
+            return self.breakpoints[tier] + (net - self.net_breakpoints[tier]) / (1 - self.rates[tier])
+        tier = max(bisect_right(self._net_list, net) - 1, 0)
+        return self._breakpoint_list[tier] + (net - self._net_list[tier]) / (1 - float(self.rates[tier]))
+
+
+class FeeSchedule:
+    """A named, compiled set of buy and day/swing sell fee legs.
+
+    Schedules compare and hash by their spec, so they can be used as keys
+    of the memoized calculations in calqtrade.cache.
+    """
+
+    __slots__ = ("name", "spec", "buy", "day_sell", "swing_sell")
+
+    def __init__(self, name, buy, day_sell, swing_sell):
+        self.name = name
+        self.spec = tuple(_leg_spec(leg, spec) for leg, spec in zip(LEGS, (buy, day_sell, swing_sell)))
+        self.buy, self.day_sell, self.swing_sell = (FeeTable(tiers, minimum) for tiers, minimum in self.spec)
+
+    @classmethod
+    def from_dict(cls, spec):
+        if not isinstance(spec, dict):
+            raise FeeScheduleError(f"Fee schedule must be an object, not {spec!r}")
+        try:
+            return cls(spec["name"], *(spec[leg] for leg in LEGS))
+        except KeyError as error:
+            raise FeeScheduleError(f"Fee schedule is missing {error.args[0]!r}") from None
+
+    def __eq__(self, other):
+        return isinstance(other, FeeSchedule) and (self.name, self.spec) == (other.name, other.spec)
+
+    def __hash__(self):
+        return hash((self.name, self.spec))
+
+    def __repr__(self):
+        return f"FeeSchedule({self.name!r})"
+
+    def buy_fee(self, buy_value):
+        return self.buy.fee(buy_value)
+
+    def sell_fee(self, sell_value, day_trade):
+        if isinstance(day_trade, np.ndarray):
+            return np.where(day_trade, self.day_sell.fee(sell_value), self.swing_sell.fee(sell_value))
+        return (self.day_sell if day_trade else self.swing_sell).fee(sell_value)
+
+    def sell_value_for_proceeds(self, proceeds, day_trade):
+        """Sell value whose proceeds after the sell fee equal ``proceeds``."""
+        if isinstance(day_trade, np.ndarray):
+            return np.where(day_trade, self.day_sell.gross_value(proceeds),
+                            self.swing_sell.gross_value(proceeds))
+        return (self.day_sell if day_trade else self.swing_sell).gross_value(proceeds)
+
+
+def _number(leg, field, value):
+    # JSON numbers only: null, strings and booleans are not fee amounts
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise FeeScheduleError(f"Fee leg {leg!r} needs a number for {field!r}, not {value!r}")
+    return float(value)
+
+
+def _leg_spec(leg, spec):
+    # {"rate": r} or {"tiers": [[start, rate], ...]} plus optional "minimum"
+    if not isinstance(spec, dict):
+        raise FeeScheduleError(f"Fee leg {leg!r} must be an object")
+    if "tiers" in spec:
+        tiers = spec["tiers"]
+        if not isinstance(tiers, (list, tuple)) or not all(
+                isinstance(tier, (list, tuple)) and len(tier) == 2 for tier in tiers):
+            raise FeeScheduleError(f"Fee leg {leg!r} needs 'tiers' as a list of [start, rate] pairs")
+        tiers = tuple((_number(leg, "tiers", start), _number(leg, "tiers", rate)) for start, rate in tiers)
+    elif "rate" in spec:
+        tiers = ((0.0, _number(leg, "rate", spec["rate"])),)
+    else:
+        raise FeeScheduleError(f"Fee leg {leg!r} needs a 'rate' or 'tiers'")
+    return tiers, _number(leg, "minimum", spec.get("minimum", 0.0))
+
+
+# The calculator's published fees: 1.12% on buys and swing sells, STL only on day sells
+STANDARD_SCHEDULE = FeeSchedule(
+    "Standard",
+    buy={"rate": FEE_PERCENTAGE},
+    day_sell={"rate": STL_RATE * 100},
+    swing_sell={"rate": FEE_PERCENTAGE},
+)
+
+
+def load_fee_schedules(path):
+    """Load schedules from a JSON file holding one schedule or a list of them."""
+    with open(path, encoding="utf-8") as handle:
+        try:
+            specs = json.load(handle)
+        except json.JSONDecodeError as error:
+            raise FeeScheduleError(f"Could not parse {path}: {error}") from None
+    if isinstance(specs, dict):
+        specs = specs.get("schedules", [specs])
+    if not isinstance(specs, list):
+        raise FeeScheduleError(f"{path} must hold a fee schedule or a list of them")
+    return {schedule.name: schedule for schedule in map(FeeSchedule.from_dict, specs)}
+
+
+# Schedule files compiled once per process and shared by every session
+FEE_SCHEDULE_FILES = SharedFileCache("fee_schedules", load_fee_schedules)
+
+
+def available_fee_schedules():
+    """Standard schedule plus any loaded from $CALQTRADE_FEE_SCHEDULES, by name.
+
+    The file is compiled once per process and recompiled when it changes.
+    """
+    schedules = {STANDARD_SCHEDULE.name: STANDARD_SCHEDULE}
+    path = os.environ.get(FEE_SCHEDULES_ENV)
+    if path:
+        schedules.update(FEE_SCHEDULE_FILES.get(path))
+    return schedules
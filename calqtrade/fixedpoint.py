@@ -0,0 +1,252 @@
+"""Exact fee arithmetic in integer minor units.
+
+Money is held in cents and per-share prices (avg price, B.E.S, target sell
+price) in 1/10,000 of a rupee, the precision the tabs display. Fee rates
+are integers over RATE_SCALE, so every fee leg is an integer product
+followed by one division with an explicit rounding rule. Amounts never go
+through binary floats, so summed fees reconcile to the cent against
+broker contract notes.
+
+Every function accepts Python ints (unbounded, for single trades) or
+int64 NumPy arrays (vectorized, for batch jobs).
+"""
+import numpy as np
+
+from calqtrade.engine import FEE_RATE, STL_RATE, TRADE_COLUMNS, _safe_div, _select, is_day_trade
+
+MONEY_SCALE = 100  # cents per rupee
+PRICE_SCALE = 10_000  # per-share prices to 4 decimals
+RATE_SCALE = 100_000  # rates in 1/1,000 of a basis point
+
+# 1.12% and 0.30% expressed over RATE_SCALE
+FEE_UNITS = round(FEE_RATE * RATE_SCALE)
+STL_UNITS = round(STL_RATE * RATE_SCALE)
+
+_PRICE_PER_MONEY = PRICE_SCALE // MONEY_SCALE
+_INT64_MAX = np.iinfo(np.int64).max
+_OVERFLOW_MESSAGE = "Amount too large for exact int64 arithmetic; evaluate it as a single trade"
+
+ROUND_DOWN = "down"
+ROUND_UP = "up"
+ROUND_HALF_UP = "half_up"
+ROUND_HALF_EVEN = "half_even"
+
+# Rounding rule applied to each leg. Fees round to the nearest cent; prices
+# that must be reached to break even or hit a target round up, so selling
+# at the displayed price never falls short.
+DEFAULT_ROUNDING = {
+    "buy_fee": ROUND_HALF_UP,
+    "sell_fee": ROUND_HALF_UP,
+    "avg_price": ROUND_HALF_UP,
+    "bes_price": ROUND_UP,
+    "target_profit": ROUND_HALF_UP,
+    "target_sell_price": ROUND_UP,
+}
+
+
+def _is_array(*values):
+    return any(isinstance(value, np.ndarray) for value in values)
+
+
+def div_round(numerator, denominator, rounding=ROUND_HALF_UP):
+    """Integer division of non-negative values with an explicit rounding rule."""
+    quotient, remainder = divmod(numerator, denominator)
+    if rounding == ROUND_DOWN:
+        return quotient
+    if rounding == ROUND_UP:
+        return quotient + (remainder > 0)
+    twice = 2 * remainder
+    if rounding == ROUND_HALF_UP:
+        return quotient + (twice >= denominator)
+    if rounding == ROUND_HALF_EVEN:
+        return quotient + ((twice > denominator) | ((twice == denominator) & (quotient % 2 == 1)))
+    raise ValueError(f"Unknown rounding rule: {rounding}")
+
+
+def _check_range(values, multiplier):
+    # int64 products must not wrap; Python ints never overflow
+    if isinstance(values, np.ndarray) and values.size and int(values.max()) > _INT64_MAX // multiplier:
+        raise OverflowError(_OVERFLOW_MESSAGE)
+
+
+def _check_product(price_units, quantity):
+    # Elementwise version of _check_range for a price × quantity product
+    if not _is_array(price_units, quantity) or not np.size(price_units) or not np.size(quantity):
+        return
+    # Usually the largest magnitudes already fit, which needs no temporary arrays
+    largest_price = max(abs(int(np.max(price_units))), abs(int(np.min(price_units))))
+    largest_quantity = max(abs(int(np.max(quantity))), abs(int(np.min(quantity))))
+    if largest_price * largest_quantity <= _INT64_MAX:
+        return
+    if np.any(np.abs(price_units) > _INT64_MAX // np.maximum(np.abs(quantity), 1)):
+        raise OverflowError(_OVERFLOW_MESSAGE)
+
+
+def to_minor(amount, scale=MONEY_SCALE):
+    """Convert rupee amounts (float or array) to integer minor units."""
+    if _is_array(amount) or isinstance(amount, (list, tuple)):
+        return np.rint(np.asarray(amount, dtype=np.float64) * scale).astype(np.int64)
+    return int(round(amount * scale))
+
+
+def from_minor(units, scale=MONEY_SCALE):
+    """Convert integer minor units back to rupees."""
+    return units / scale
+
+
+def _quantity(quantity):
+    # Whole shares only: a fractional quantity is an error, never truncated
+    if _is_array(quantity) or isinstance(quantity, (list, tuple)):
+        quantity = np.asarray(quantity)
+        if quantity.dtype.kind == "f" and not np.all(quantity == np.floor(quantity)):
+            raise ValueError("Exact arithmetic needs whole-share quantities")
+        return quantity.astype(np.int64, copy=False)
+    if quantity != int(quantity):
+        raise ValueError("Exact arithmetic needs whole-share quantities")
+    return int(quantity)
+
+
+def fee_units(value, rate_units, rounding=ROUND_HALF_UP):
+    """Fee in cents on a value in cents at ``rate_units`` / RATE_SCALE."""
+    _check_range(value, FEE_UNITS)
+    return div_round(value * rate_units, RATE_SCALE, rounding)
+
+
+def sell_rate_units(day_trade):
+    """Sell fee rate over RATE_SCALE (STL only for day trades)."""
+    return _select(day_trade, STL_UNITS, FEE_UNITS)
+
+
+def purchase_units(price_cents, quantity, rounding=DEFAULT_ROUNDING):
+    """Return (buy_value, buy_fee, total_cost) in cents for a purchase."""
+    _check_product(price_cents, quantity)
+    buy_value = price_cents * quantity
+    buy_fee = fee_units(buy_value, FEE_UNITS, rounding["buy_fee"])
+    return buy_value, buy_fee, buy_value + buy_fee
+
+
+def avg_price_units(total_cost, quantity, rounding=DEFAULT_ROUNDING):
+    """Avg Price = Total Cost ÷ Quantity, in 1/PRICE_SCALE rupees."""
+    return div_round(total_cost * _PRICE_PER_MONEY, quantity, rounding["avg_price"])
+
+
+def bes_price_units(total_cost, quantity, day_trade, rounding=DEFAULT_ROUNDING):
+    """B.E.S price in 1/PRICE_SCALE rupees, using the same formulas as the float engine."""
+    _check_range(total_cost, _PRICE_PER_MONEY * (RATE_SCALE + FEE_UNITS))
+    # Day: Total Cost ÷ (Qty × (1 - STL))
+    day_bes = div_round(total_cost * _PRICE_PER_MONEY * RATE_SCALE,
+                        quantity * (RATE_SCALE - STL_UNITS), rounding["bes_price"])
+    # Swing: Avg Price × (1 + fee), on the unrounded avg price
+    swing_bes = div_round(total_cost * _PRICE_PER_MONEY * (RATE_SCALE + FEE_UNITS),
+                          quantity * RATE_SCALE, rounding["bes_price"])
+    return _select(day_trade, day_bes, swing_bes)
+
+
+def sell_units(sell_price_cents, quantity, day_trade, rounding=DEFAULT_ROUNDING):
+    """Return (sell_value, sell_fee, proceeds) in cents for a sale."""
+    _check_product(sell_price_cents, quantity)
+    sell_value = sell_price_cents * quantity
+    sell_fee = fee_units(sell_value, sell_rate_units(day_trade), rounding["sell_fee"])
+    return sell_value, sell_fee, sell_value - sell_fee
+
+
+def target_units(total_cost, quantity, target_pct, day_trade, rounding=DEFAULT_ROUNDING):
+    """Return (target_profit in cents, sell price in 1/PRICE_SCALE rupees) for a profit %."""
+    # Percent to RATE_SCALE units: 0.5% -> 500
+    target_rate = to_minor(target_pct, RATE_SCALE // 100)
+    if _is_array(target_rate) and not _is_array(total_cost):
+        # A Python int total meets the rate array in int64, so it needs the range check too
+        total_cost = np.asarray(total_cost, dtype=np.int64)
+    _check_range(total_cost, max(int(np.max(target_rate)), 1))
+    target_profit = div_round(total_cost * target_rate, RATE_SCALE, rounding["target_profit"])
+    proceeds_needed = total_cost + target_profit
+    _check_range(proceeds_needed, _PRICE_PER_MONEY * RATE_SCALE)
+    # Day trades ignore the sell fee here, matching engine.target_sell_price
+    day_price = div_round(proceeds_needed * _PRICE_PER_MONEY, quantity, rounding["target_sell_price"])
+    swing_price = div_round(proceeds_needed * _PRICE_PER_MONEY * RATE_SCALE,
+                            quantity * (RATE_SCALE - FEE_UNITS), rounding["target_sell_price"])
+    return target_profit, _select(day_trade, day_price, swing_price)
+
+
+def exact_trade_units(buy_price, sell_price, quantity, trading_type, rounding=DEFAULT_ROUNDING):
+    """Every trade column in integer minor units (cents, or 1/PRICE_SCALE for prices).
+
+    ``return_pct`` is the only float, computed from the exact amounts.
+    """
+    quantity = _quantity(quantity)
+    day_trade = is_day_trade(trading_type)
+    buy_value, buy_fee, total_cost = purchase_units(to_minor(buy_price), quantity, rounding)
+    sell_value, sell_fee, proceeds = sell_units(to_minor(sell_price), quantity, day_trade, rounding)
+    gain_loss = proceeds - total_cost
+    return dict(zip(TRADE_COLUMNS, (
+        buy_value,
+        buy_fee,
+        avg_price_units(total_cost, quantity, rounding),
+        total_cost,
+        bes_price_units(total_cost, quantity, day_trade, rounding),
+        sell_value,
+        sell_fee,
+        proceeds,
+        gain_loss,
+        _safe_div(gain_loss, total_cost, 100),
+    )))
+
+
+def _to_rupees(units):
+    columns = {}
+    for column, value in units.items():
+        if column == "return_pct":
+            columns[column] = value
+        elif column in ("avg_price", "bes_price"):
+            columns[column] = from_minor(value, PRICE_SCALE)
+        else:
+            columns[column] = from_minor(value)
+    return columns
+
+
+def exact_trade(buy_price, sell_price, quantity, trading_type, rounding=DEFAULT_ROUNDING):
+    """Exact counterpart of engine.calculate_trade, returning rupee floats."""
+    return _to_rupees(exact_trade_units(buy_price, sell_price, _quantity(quantity), trading_type, rounding))
+
+
+def exact_trades(buy_price, sell_price, quantity, trading_type, rounding=DEFAULT_ROUNDING):
+    """Exact counterpart of engine.calculate_trades, returning rupee float arrays."""
+    buy_price, sell_price, quantity = np.broadcast_arrays(
+        np.asarray(buy_price, dtype=np.float64),
+        np.asarray(sell_price, dtype=np.float64),
+        _quantity(np.asarray(quantity)),
+    )
+    day_trade = np.broadcast_to(np.asarray(is_day_trade(trading_type), dtype=bool), buy_price.shape)
+    return _to_rupees(exact_trade_units(buy_price, sell_price, quantity, day_trade, rounding))
+
+
+def exact_sell_side(sell_price, quantity, day_trade, rounding=DEFAULT_ROUNDING):
+    """Exact counterpart of engine.sell_side: (sell_value, sell_fee, proceeds) in rupees."""
+    units = sell_units(to_minor(sell_price), _quantity(quantity), day_trade, rounding)
+    return tuple(from_minor(value) for value in units)
+
+
+def exact_break_even(buy_price, quantity, day_trade, rounding=DEFAULT_ROUNDING):
+    """Return (buy_value, buy_fee, avg_price, total_cost, bes_price, sell_fee at B.E.S) in rupees."""
+    quantity = _quantity(quantity)
+    buy_value, buy_fee, total_cost = purchase_units(to_minor(buy_price), quantity, rounding)
+    avg_price = avg_price_units(total_cost, quantity, rounding)
+    bes = bes_price_units(total_cost, quantity, day_trade, rounding)
+    # Sell value at the B.E.S price, to the cent
+    sell_value = div_round(bes * quantity, _PRICE_PER_MONEY, ROUND_HALF_UP)
+    sell_fee = fee_units(sell_value, sell_rate_units(day_trade), rounding["sell_fee"])
+    return (
+        from_minor(buy_value),
+        from_minor(buy_fee),
+        from_minor(avg_price, PRICE_SCALE),
+        from_minor(total_cost),
+        from_minor(bes, PRICE_SCALE),
+        from_minor(sell_fee),
+    )
+
+
+def exact_target_sell_price(total_cost, quantity, target_pct, day_trade, rounding=DEFAULT_ROUNDING):
+    """Exact counterpart of engine.target_sell_price: (target_profit, sell_price) in rupees."""
+    target_profit, sell_price = target_units(to_minor(total_cost), _quantity(quantity), target_pct,
+                                             day_trade, rounding)
+    return from_minor(target_profit), from_minor(sell_price, PRICE_SCALE)
@@ -0,0 +1,259 @@
+"""Undo, redo and restore for a Portfolio through an event log.
+
+Every change to the book (add, import, edit, delete, clear a symbol) is
+appended to the log as an Event naming its parent state, so the log is a
+tree: undoing and then making a new change starts a branch instead of
+discarding the undone events, and every state ever reached can be
+restored. Undo moves to the parent state and redo to the newest child.
+
+Events record their effect by lot id: per symbol, the lots an event
+removed (edited lots as they were before) and the lots it added (edited
+lots as they are after). Restoring a state walks only the events between
+the current state and the target through their common ancestor, undoing
+those above it and redoing those below, so its cost follows the lots
+those events touched, not the length of the log or the size of the book.
+
+A restore compares and writes only the lots those events touched, by id,
+so lots another session added to a shared store are never removed or
+rewritten, and lots this history removed (theirs included) are put back
+under their ids. Restored lots are written through to the portfolio's
+store like any other change.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from calqtrade.portfolio import normalize_symbol
+
+# ``changes`` maps each symbol to (removed, added), both (ids, price, quantity) arrays
+Event = namedtuple("Event", ("kind", "symbol", "args", "symbols", "parent", "depth", "changes"))
+
+_EMPTY = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), np.empty(0, dtype=np.int64))
+
+
+def _rows(ledger, rows):
+    # Copies of the (ids, price, quantity) columns at ``rows``
+    return (np.array(ledger.ids[rows], dtype=np.int64), np.array(ledger.price[rows], dtype=np.float64),
+            np.array(ledger.quantity[rows], dtype=np.int64))
+
+
+def _lots(portfolio, symbol, ids=None):
+    # Copies of ``symbol``'s (ids, price, quantity) columns, or of the lots with ``ids``
+    if symbol not in portfolio:
+        return _EMPTY
+    ledger = portfolio[symbol]
+    rows = slice(None) if ids is None else ledger.positions(ids)
+    return _rows(ledger, rows)
+
+
+def _present(portfolio, symbol, ids):
+    # Copies of the lots among ``ids`` that ``symbol`` still holds, found by
+    # binary search on its sorted ids, so the cost follows len(ids)
+    if symbol not in portfolio:
+        return _EMPTY
+    ledger = portfolio[symbol]
+    positions = np.searchsorted(ledger.ids, ids)
+    found = positions < len(ledger)
+    found[found] = ledger.ids[positions[found]] == ids[found]
+    rows = positions[found]
+    return _rows(ledger, rows)
+
+
+def _replace(lots, removed, added):
+    # ``lots`` without the ids in ``removed``, plus ``added``, in id order
+    keep = ~np.isin(lots[0], removed[0])
+    ids, price, quantity = (np.concatenate((column[keep], new)) for column, new in zip(lots, added))
+    order = np.argsort(ids, kind="stable")
+    return ids[order], price[order], quantity[order]
+
+
+def _select(lots, ids):
+    # The rows of ``lots`` whose id is in ``ids``
+    rows = np.isin(lots[0], ids)
+    return tuple(column[rows] for column in lots)
+
+
+def describe(event):
+    """One-line description of ``event`` for a history list."""
+    if event.kind == "add":
+        price, quantity = event.args
+        return f"Add {quantity:,} {event.symbol} @ Rs. {price:,.2f}"
+    if event.kind == "extend":
+        return f"Import {len(event.args[1]):,} purchases ({', '.join(event.symbols)})"
+    if event.kind == "remove":
+        return f"Delete {event.symbol} #{event.args[0] + 1}"
+    if event.kind == "update":
+        index, price, quantity = event.args
+        return f"Edit {event.symbol} #{index + 1} to {quantity:,} @ Rs. {price:,.2f}"
+    return f"Clear {event.symbol}"
+
+
+class PortfolioHistory:
+    """Event log of a Portfolio's changes, restored lot by lot."""
+
+    def __init__(self, portfolio):
+        self.portfolio = portfolio
+        self.events = []
+        # State 0 is the book as the history found it; state n follows events[n - 1]
+        self.head = 0
+        # State -> newest state recorded on top of it, for redo
+        self._children = {}
+
+    def __len__(self):
+        return len(self.events)
+
+    def _record(self, kind, symbol, args, symbols, change):
+        # Run ``change``, which returns (result, {symbol: (removed, added)}), and log its effect
+        result, changes = change()
+        event = Event(kind, symbol, args, symbols, self.head, self.depth(self.head) + 1, changes)
+        self.events.append(event)
+        self._children[event.parent] = self.head = len(self.events)
+        return result
+
+    def add(self, symbol, price, quantity):
+        symbol = normalize_symbol(symbol)
+        price, quantity = float(price), int(quantity)
+
+        def change():
+            ids = self.portfolio.extend(symbol, [price], [quantity])[symbol]
+            ledger = self.portfolio[symbol]
+            return ledger[int(ledger.positions(ids)[0])], {symbol: (_EMPTY, _lots(self.portfolio, symbol, ids))}
+
+        return self._record("add", symbol, (price, quantity), (symbol,), change)
+
+    def extend(self, symbol, price, quantity):
+        price = np.array(price, dtype=np.float64)
+        quantity = np.array(quantity, dtype=np.int64)
+        if not len(price):
+            # Nothing to record: an empty import is not a step to undo
+            return None
+        if isinstance(symbol, str):
+            symbol = normalize_symbol(symbol)
+            symbols = (symbol,)
+        else:
+            symbol = np.char.upper(np.char.strip(np.asarray(symbol, dtype=str)))
+            symbols = tuple(np.unique(symbol).tolist())
+
+        def change():
+            written = self.portfolio.extend(symbol, price, quantity)
+            return None, {name: (_EMPTY, _lots(self.portfolio, name, ids)) for name, ids in written.items()}
+
+        return self._record("extend", symbol, (price, quantity), symbols, change)
+
+    def remove(self, symbol, index):
+        symbol = normalize_symbol(symbol)
+        index = range(len(self.portfolio[symbol]))[index]
+
+        def change():
+            removed = _lots(self.portfolio, symbol, self.portfolio[symbol].ids[index:index + 1])
+            lot = self.portfolio[symbol][index]
+            self.portfolio.remove_lots(symbol, removed[0])
+            return lot, {symbol: (removed, _EMPTY)}
+
+        return self._record("remove", symbol, (index,), (symbol,), change)
+
+    def update(self, symbol, index, price, quantity):
+        symbol = normalize_symbol(symbol)
+        index = range(len(self.portfolio[symbol]))[index]
+        price, quantity = float(price), int(quantity)
+
+        def change():
+            removed = _lots(self.portfolio, symbol, self.portfolio[symbol].ids[index:index + 1])
+            self.portfolio.update_lots(symbol, removed[0], price, quantity)
+            ledger = self.portfolio[symbol]
+            lot = ledger[int(ledger.positions(removed[0])[0])]
+            return lot, {symbol: (removed, _lots(self.portfolio, symbol, removed[0]))}
+
+        return self._record("update", symbol, (index, price, quantity), (symbol,), change)
+
+    def clear_symbol(self, symbol):
+        symbol = normalize_symbol(symbol)
+        if symbol not in self.portfolio:
+            return
+
+        def change():
+            removed = _lots(self.portfolio, symbol)
+            self.portfolio.remove_lots(symbol, removed[0])
+            return None, {symbol: (removed, _EMPTY)}
+
+        self._record("clear_symbol", symbol, (), (symbol,), change)
+
+    def depth(self, state):
+        return self.events[state - 1].depth if state else 0
+
+    def parent(self, state):
+        return self.events[state - 1].parent if state else None
+
+    def can_undo(self):
+        return self.head > 0
+
+    def can_redo(self):
+        return self.head in self._children
+
+    def undo(self):
+        """Step back to the state before the last change; returns False if there is none."""
+        if not self.can_undo():
+            return False
+        self.checkout(self.parent(self.head))
+        return True
+
+    def redo(self):
+        """Reapply the newest change undone from this state; returns False if there is none."""
+        if not self.can_redo():
+            return False
+        self.checkout(self._children[self.head])
+        return True
+
+    def checkout(self, state):
+        """Restore the book to ``state`` (0 to len(history)), writing only the lots that differ.
+
+        Only lots touched by the events between the current state and
+        ``state`` are compared, so other lots (another session's, say) are
+        never removed or rewritten.
+        """
+        if not 0 <= state <= len(self.events):
+            raise IndexError(f"No state {state} in a history of {len(self.events)} events")
+        if state == self.head:
+            return
+        for symbol, (ids, wanted) in self._targets(state).items():
+            current = _present(self.portfolio, symbol, ids)
+            gone = ~np.isin(current[0], wanted[0])
+            if gone.any():
+                self.portfolio.remove_lots(symbol, current[0][gone])
+            missing = ~np.isin(wanted[0], current[0])
+            if missing.any():
+                self.portfolio.restore_lots(symbol, *(column[missing] for column in wanted))
+            # Both sides are in id order, so the lots kept line up
+            kept, held = _select(wanted, current[0]), _select(current, wanted[0])
+            edited = (kept[1] != held[1]) | (kept[2] != held[2])
+            if edited.any():
+                self.portfolio.update_lots(symbol, *(column[edited] for column in kept))
+        self.head = state
+
+    def states(self):
+        """(state, description) of every recorded state, oldest first."""
+        rows = [(0, "Original book")]
+        rows.extend((state, describe(event)) for state, event in enumerate(self.events, 1))
+        return rows
+
+    def _targets(self, state):
+        # {symbol: (ids touched on the way to ``state``, their lots at ``state``)}: the
+        # events above the common ancestor are undone newest first, then those below
+        # it redone oldest first, each setting the lots it touched
+        up, down = [], []
+        first, second = self.head, state
+        while first != second:
+            if self.depth(first) >= self.depth(second):
+                up.append(first)
+                first = self.parent(first)
+            else:
+                down.append(second)
+                second = self.parent(second)
+        steps = [(step, True) for step in up] + [(step, False) for step in reversed(down)]
+        touched, lots = {}, {}
+        for step, undo in steps:
+            for symbol, (removed, added) in self.events[step - 1].changes.items():
+                touched.setdefault(symbol, []).extend((removed[0], added[0]))
+                before, after = (added, removed) if undo else (removed, added)
+                lots[symbol] = _replace(lots.get(symbol, _EMPTY), before, after)
+        return {symbol: (np.unique(np.concatenate(ids)), lots[symbol]) for symbol, ids in touched.items()}
@@ -0,0 +1,363 @@
+"""Purchase ledger for the Multi Purchase tab.
+
+Lots are stored column-wise in NumPy arrays (id, price and quantity); buy
+value, buy fee, avg price and total cost are derived from them on demand.
+Running totals are kept next to the columns, so the summary metrics,
+overall avg price and B.E.S are constant-time no matter how many lots have
+been added. Buy value and buy fee are also totalled in integer cents (each
+lot's fee rounded to the cent), which never drift under add/delete and back
+the exact fee arithmetic mode. ``version`` increases on every change, so
+views built from the lots can tell when they are stale.
+
+Every lot also carries an integer id that never changes while the lot
+exists. Ids increase in purchase order: a ledger numbers its own lots,
+and a calqtrade.portfolio.Portfolio passes in the ids its store assigned,
+so callers that must find the same lot again after other lots were added
+or removed (history, recorded sells) hold on to the id, not the position.
+
+Float fees follow the ledger's ``schedule`` (a calqtrade.fees.FeeSchedule,
+or None for the standard fees); each lot is charged as its own contract.
+"""
+import numpy as np
+
+from calqtrade.engine import bes_price, buy_side, is_day_trade
+from calqtrade.fixedpoint import (
+    MONEY_SCALE,
+    PRICE_SCALE,
+    avg_price_units,
+    bes_price_units,
+    from_minor,
+    purchase_units,
+    to_minor,
+)
+
+PURCHASE_FIELDS = ("price", "quantity", "buy_value", "buy_fee", "avg_price", "total_cost")
+
+_INITIAL_CAPACITY = 16
+
+
+def _readonly(view):
+    view.flags.writeable = False
+    return view
+
+
+class PurchaseLedger:
+    """Ordered purchase lots plus incrementally maintained totals."""
+
+    __slots__ = (
+        "_id",
+        "_price",
+        "_quantity",
+        "_next_id",
+        "_size",
+        "_derived",
+        "schedule",
+        "version",
+        "total_quantity",
+        "total_buy_value",
+        "total_buy_fees",
+        "total_cost",
+        "total_buy_value_cents",
+        "total_buy_fee_cents",
+    )
+
+    def __init__(self, schedule=None):
+        self.schedule = schedule
+        self.version = 0
+        self._next_id = 1
+        self._id = np.empty(_INITIAL_CAPACITY, dtype=np.int64)
+        self._price = np.empty(_INITIAL_CAPACITY, dtype=np.float64)
+        self._quantity = np.empty(_INITIAL_CAPACITY, dtype=np.int64)
+        self._size = 0
+        self._derived = None
+        self._reset_totals()
+
+    def _reset_totals(self):
+        self.total_quantity = 0
+        self.total_buy_value = 0.0
+        self.total_buy_fees = 0.0
+        self.total_cost = 0.0
+        self.total_buy_value_cents = 0
+        self.total_buy_fee_cents = 0
+
+    def _apply(self, quantity, buy_value, buy_fee, total_cost, sign):
+        self.total_quantity += sign * int(quantity)
+        self.total_buy_value += sign * float(buy_value)
+        self.total_buy_fees += sign * float(buy_fee)
+        self.total_cost += sign * float(total_cost)
+
+    def _apply_cents(self, price, quantity, sign):
+        buy_value, buy_fee, _ = purchase_units(to_minor(price), quantity)
+        self.total_buy_value_cents += sign * int(np.sum(buy_value))
+        self.total_buy_fee_cents += sign * int(np.sum(buy_fee))
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        capacity = len(self._price)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self._id = np.resize(self._id, capacity)
+        self._price = np.resize(self._price, capacity)
+        self._quantity = np.resize(self._quantity, capacity)
+
+    def _new_ids(self, ids, count):
+        # ``ids`` as an int64 array, or the next ``count`` of the ledger's own
+        if ids is None:
+            ids = np.arange(self._next_id, self._next_id + count, dtype=np.int64)
+        else:
+            ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        if count:
+            self._next_id = max(self._next_id, int(ids.max()) + 1)
+        return ids
+
+    def positions(self, ids):
+        """Positions of the lots with ``ids``; raises KeyError if any is not in the ledger."""
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        positions = np.searchsorted(self.ids, ids)
+        found = positions < self._size
+        found[found] = self._id[positions[found]] == ids[found]
+        if not found.all():
+            raise KeyError(f"No lot with id {int(ids[~found][0])}")
+        return positions
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        columns = self.columns()
+        values = [columns[field].tolist() for field in PURCHASE_FIELDS]
+        for row in zip(*values):
+            yield dict(zip(PURCHASE_FIELDS, row))
+
+    def __getitem__(self, index):
+        """Return lot ``index`` as a dict keyed by PURCHASE_FIELDS."""
+        index = range(self._size)[index]
+        price = float(self._price[index])
+        quantity = int(self._quantity[index])
+        return dict(zip(PURCHASE_FIELDS, (price, quantity, *buy_side(price, quantity, self.schedule))))
+
+    @property
+    def ids(self):
+        """Read-only view of the lot ids, in purchase order."""
+        return _readonly(self._id[:self._size])
+
+    @property
+    def price(self):
+        """Read-only view of the buy price column."""
+        return _readonly(self._price[:self._size])
+
+    @property
+    def quantity(self):
+        """Read-only view of the quantity column."""
+        return _readonly(self._quantity[:self._size])
+
+    def columns(self):
+        """Return every PURCHASE_FIELDS column as read-only arrays.
+
+        ``price`` and ``quantity`` are views onto the ledger storage; the
+        derived columns are computed in one vectorized pass and reused until
+        the ledger changes.
+        """
+        if self._derived is None:
+            price = self.price
+            quantity = self.quantity
+            derived = buy_side(price, quantity, self.schedule)
+            for column in derived:
+                column.flags.writeable = False
+            self._derived = dict(zip(PURCHASE_FIELDS, (price, quantity, *derived)))
+        return self._derived
+
+    def add(self, price, quantity, lot_id=None):
+        """Record a purchase and return its fee-enriched lot."""
+        self._reserve(1)
+        self._id[self._size] = self._new_ids(lot_id, 1)[0]
+        self._price[self._size] = price
+        self._quantity[self._size] = quantity
+        self._size += 1
+        self._derived = None
+        self.version += 1
+        buy_value, buy_fee, avg_price, total_cost = buy_side(price, quantity, self.schedule)
+        self._apply(quantity, buy_value, buy_fee, total_cost, 1)
+        self._apply_cents(price, int(quantity), 1)
+        return dict(zip(PURCHASE_FIELDS, (price, quantity, buy_value, buy_fee, avg_price, total_cost)))
+
+    def extend(self, price, quantity, ids=None):
+        """Append a batch of purchases given as price and quantity arrays."""
+        price = np.asarray(price, dtype=np.float64)
+        quantity = np.asarray(quantity, dtype=np.int64)
+        count = len(price)
+        if count == 0:
+            return
+        self._reserve(count)
+        self._id[self._size:self._size + count] = self._new_ids(ids, count)
+        self._price[self._size:self._size + count] = price
+        self._quantity[self._size:self._size + count] = quantity
+        self._size += count
+        self._derived = None
+        self.version += 1
+        buy_value, buy_fee, _, total_cost = buy_side(price, quantity, self.schedule)
+        self._apply(quantity.sum(), buy_value.sum(), buy_fee.sum(), total_cost.sum(), 1)
+        self._apply_cents(price, quantity, 1)
+
+    def remove(self, index):
+        """Delete the lot at ``index`` and return it."""
+        lot = self[index]
+        index = range(self._size)[index]
+        end = self._size
+        self._id[index:end - 1] = self._id[index + 1:end]
+        self._price[index:end - 1] = self._price[index + 1:end]
+        self._quantity[index:end - 1] = self._quantity[index + 1:end]
+        self._size -= 1
+        self._derived = None
+        self.version += 1
+        if self._size:
+            self._apply(lot['quantity'], lot['buy_value'], lot['buy_fee'], lot['total_cost'], -1)
+            self._apply_cents(lot['price'], lot['quantity'], -1)
+        else:
+            # Start from exact zeros rather than accumulated rounding residue
+            self._reset_totals()
+        return lot
+
+    def update(self, index, price, quantity):
+        """Replace the lot at ``index`` in place and return the new fee-enriched lot."""
+        old = self[index]
+        index = range(self._size)[index]
+        self._price[index] = price
+        self._quantity[index] = quantity
+        self._derived = None
+        self.version += 1
+        buy_value, buy_fee, avg_price, total_cost = buy_side(price, quantity, self.schedule)
+        self._apply(old['quantity'], old['buy_value'], old['buy_fee'], old['total_cost'], -1)
+        self._apply(quantity, buy_value, buy_fee, total_cost, 1)
+        self._apply_cents(old['price'], old['quantity'], -1)
+        self._apply_cents(price, int(quantity), 1)
+        return dict(zip(PURCHASE_FIELDS, (price, quantity, buy_value, buy_fee, avg_price, total_cost)))
+
+    def _change_totals(self, price, quantity, sign):
+        # Add (sign 1) or take away (sign -1) the totals of a batch of lots
+        buy_value, buy_fee, _, total_cost = buy_side(price, quantity, self.schedule)
+        self._apply(quantity.sum(), buy_value.sum(), buy_fee.sum(), total_cost.sum(), sign)
+        self._apply_cents(price, quantity, sign)
+
+    def insert_lots(self, ids, price, quantity):
+        """Put back lots with known ``ids`` (say, deleted ones) at their place in purchase order."""
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        price = np.atleast_1d(np.asarray(price, dtype=np.float64))
+        quantity = np.atleast_1d(np.asarray(quantity, dtype=np.int64))
+        if not len(ids):
+            return
+        order = np.argsort(ids, kind="stable")
+        ids, price, quantity = ids[order], price[order], quantity[order]
+        at = np.searchsorted(self.ids, ids)
+        inside = at < self._size
+        if np.any(self._id[at[inside]] == ids[inside]):
+            raise ValueError("Lot ids must not already be in the ledger")
+        columns = (np.insert(self.ids, at, ids), np.insert(self.price, at, price),
+                   np.insert(self.quantity, at, quantity))
+        size = self._size + len(ids)
+        self._reserve(len(ids))
+        for column, values in zip((self._id, self._price, self._quantity), columns):
+            column[:size] = values
+        self._size = size
+        self._next_id = max(self._next_id, int(ids.max()) + 1)
+        self._derived = None
+        self.version += 1
+        self._change_totals(price, quantity, 1)
+
+    def remove_lots(self, ids):
+        """Delete the lots with ``ids``; returns their (price, quantity) arrays."""
+        positions = self.positions(ids)
+        price = self.price[positions]
+        quantity = self.quantity[positions]
+        keep = np.ones(self._size, dtype=bool)
+        keep[positions] = False
+        size = int(keep.sum())
+        for column in (self._id, self._price, self._quantity):
+            column[:size] = column[:self._size][keep]
+        self._size = size
+        self._derived = None
+        self.version += 1
+        if self._size:
+            self._change_totals(price, quantity, -1)
+        else:
+            self._reset_totals()
+        return price, quantity
+
+    def update_lots(self, ids, price, quantity):
+        """Replace the price and quantity of the lots with ``ids``, keeping their place."""
+        positions = self.positions(ids)
+        old_price = self.price[positions]
+        old_quantity = self.quantity[positions]
+        self._price[positions] = price
+        self._quantity[positions] = quantity
+        self._derived = None
+        self.version += 1
+        self._change_totals(old_price, old_quantity, -1)
+        self._change_totals(self._price[positions], self._quantity[positions], 1)
+
+    def set_schedule(self, schedule):
+        """Switch fee schedule, re-deriving the fee totals from the stored lots."""
+        if schedule == self.schedule:
+            return
+        self.schedule = schedule
+        self._derived = None
+        self.version += 1
+        self._reset_totals()
+        if self._size:
+            price = self.price
+            quantity = self.quantity
+            buy_value, buy_fee, _, total_cost = buy_side(price, quantity, schedule)
+            self._apply(quantity.sum(), buy_value.sum(), buy_fee.sum(), total_cost.sum(), 1)
+            self._apply_cents(price, quantity, 1)
+
+    def clear(self):
+        self._id = np.empty(_INITIAL_CAPACITY, dtype=np.int64)
+        self._price = np.empty(_INITIAL_CAPACITY, dtype=np.float64)
+        self._quantity = np.empty(_INITIAL_CAPACITY, dtype=np.int64)
+        self._size = 0
+        self._derived = None
+        self.version += 1
+        self._reset_totals()
+
+    @property
+    def overall_avg_price(self):
+        # Overall Average Price = Total Cost ÷ Total Quantity
+        return self.total_cost / self.total_quantity if self.total_quantity > 0 else 0
+
+    @property
+    def simple_weighted_avg(self):
+        # Weighted average of buy prices (without fees, for reference)
+        return self.total_buy_value / self.total_quantity if self.total_quantity > 0 else 0
+
+    def bes_price(self, trading_type):
+        """B.E.S price for selling the whole position."""
+        if self.total_quantity <= 0:
+            return 0
+        return bes_price(self.total_cost, self.overall_avg_price, self.total_quantity,
+                         is_day_trade(trading_type), self.schedule)
+
+    @property
+    def total_cost_cents(self):
+        return self.total_buy_value_cents + self.total_buy_fee_cents
+
+    def exact_totals(self):
+        """Return (total_buy_value, total_buy_fees, total_cost, overall_avg_price, simple_weighted_avg)
+        from the integer-cent totals."""
+        if self.total_quantity <= 0:
+            return 0.0, 0.0, 0.0, 0, 0
+        return (
+            from_minor(self.total_buy_value_cents),
+            from_minor(self.total_buy_fee_cents),
+            from_minor(self.total_cost_cents),
+            from_minor(avg_price_units(self.total_cost_cents, self.total_quantity), PRICE_SCALE),
+            self.total_buy_value_cents / MONEY_SCALE / self.total_quantity,
+        )
+
+    def exact_bes_price(self, trading_type):
+        """B.E.S price from the integer-cent totals, rounded up to 1/PRICE_SCALE."""
+        if self.total_quantity <= 0:
+            return 0
+        units = bes_price_units(self.total_cost_cents, self.total_quantity, is_day_trade(trading_type))
+        return from_minor(units, PRICE_SCALE)
@@ -0,0 +1,166 @@
+"""Lot matching for partial sells and realized P&L.
+
+Each open lot carries its remaining quantity and remaining cost, seeded
+from the ledger's per-purchase ``total_cost`` (buy value plus buy fee), so
+a lot's cost per share is its fee-inclusive ``avg_price``. A sell is
+matched against the open lots with the matcher's accounting method:
+
+- ``fifo``      oldest lot first (deque, amortized O(1) per lot consumed)
+- ``lifo``      newest lot first (stack, amortized O(1))
+- ``hifo``      highest cost per share first (heap, O(log n))
+- ``average``   cost basis at the running average cost of the open position (O(1))
+- ``specific``  the lots named in the sell (O(1) per lot)
+
+Exhausted lots are skipped lazily when they reach the front of a queue,
+so no sell ever rescans the open lots.
+"""
+import heapq
+from collections import deque, namedtuple
+
+import numpy as np
+
+from calqtrade.engine import is_day_trade, sell_side
+
+FIFO = "fifo"
+LIFO = "lifo"
+HIFO = "hifo"
+AVERAGE = "average"
+SPECIFIC = "specific"
+
+MATCHING_METHODS = (FIFO, LIFO, HIFO, AVERAGE, SPECIFIC)
+
+SellMatch = namedtuple("SellMatch", (
+    "quantity",
+    "sell_price",
+    "sell_value",
+    "sell_fee",
+    "proceeds",
+    "cost_basis",
+    "realized_gain",
+    "lots",  # ((lot index, quantity, cost basis), ...); empty for average cost
+))
+
+
+class LotMatchingError(ValueError):
+    """Raised for a sell the open lots cannot cover."""
+
+
+class LotMatcher:
+    """Open lots of one position and the sells matched against them."""
+
+    def __init__(self, quantity, total_cost, method=FIFO, schedule=None):
+        if method not in MATCHING_METHODS:
+            raise ValueError(f"Unknown matching method: {method}")
+        self.method = method
+        self.schedule = schedule
+        self.remaining = np.array(quantity, dtype=np.int64)
+        self.remaining_cost = np.array(total_cost, dtype=np.float64)
+        self.open_quantity = int(self.remaining.sum())
+        self.open_cost = float(self.remaining_cost.sum())
+        self.realized_gain = 0.0
+        self.sells = []
+        count = len(self.remaining)
+        if method == FIFO:
+            self._queue = deque(range(count))
+        elif method == LIFO:
+            self._queue = list(range(count))
+        elif method == HIFO:
+            cost_per_share = self.remaining_cost / np.maximum(self.remaining, 1)
+            self._queue = list(zip((-cost_per_share).tolist(), range(count)))
+            heapq.heapify(self._queue)
+
+    @classmethod
+    def from_ledger(cls, ledger, method=FIFO):
+        """Matcher over every lot of a PurchaseLedger, using the ledger's fee schedule."""
+        columns = ledger.columns()
+        return cls(columns["quantity"], columns["total_cost"], method, ledger.schedule)
+
+    @property
+    def open_avg_price(self):
+        # Open Cost ÷ Open Quantity
+        return self.open_cost / self.open_quantity if self.open_quantity > 0 else 0
+
+    def _next_lot(self):
+        # Front of the method's queue, dropping lots already used up
+        queue = self._queue
+        if self.method == FIFO:
+            while self.remaining[queue[0]] == 0:
+                queue.popleft()
+            return queue[0]
+        if self.method == LIFO:
+            while self.remaining[queue[-1]] == 0:
+                queue.pop()
+            return queue[-1]
+        while self.remaining[queue[0][1]] == 0:
+            heapq.heappop(queue)
+        return queue[0][1]
+
+    def _take(self, lot, quantity):
+        remaining = int(self.remaining[lot])
+        if quantity == remaining:
+            cost = float(self.remaining_cost[lot])
+        else:
+            cost = float(self.remaining_cost[lot]) * quantity / remaining
+        self.remaining[lot] = remaining - quantity
+        self.remaining_cost[lot] -= cost
+        return lot, quantity, cost
+
+    def _match(self, quantity, lots):
+        if self.method == AVERAGE:
+            cost = self.open_cost if quantity == self.open_quantity else self.open_avg_price * quantity
+            return cost, ()
+        matched = []
+        if self.method == SPECIFIC:
+            for lot, lot_quantity in lots.items():
+                if lot_quantity < 1:
+                    raise LotMatchingError(f"Quantity for lot #{lot + 1} must be at least 1")
+                if not 0 <= lot < len(self.remaining) or lot_quantity > self.remaining[lot]:
+                    raise LotMatchingError(f"Lot #{lot + 1} does not hold {lot_quantity:,} shares")
+            for lot, lot_quantity in lots.items():
+                matched.append(self._take(lot, lot_quantity))
+        else:
+            left = quantity
+            while left:
+                lot = self._next_lot()
+                take = min(left, int(self.remaining[lot]))
+                matched.append(self._take(lot, take))
+                left -= take
+        return sum(cost for _, _, cost in matched), tuple(matched)
+
+    def sell(self, quantity, sell_price, trading_type, lots=None):
+        """Match a sell against the open lots and return its SellMatch.
+
+        ``lots`` maps lot index to quantity and is required for the
+        ``specific`` method, where it also sets the sell quantity. Lots
+        listed with zero shares are ignored; negative quantities are rejected.
+        """
+        if self.method == SPECIFIC:
+            if not lots:
+                raise LotMatchingError("Choose the lots to sell from")
+            lots = {int(lot): int(lot_quantity) for lot, lot_quantity in lots.items() if lot_quantity}
+            quantity = sum(lots.values())
+        quantity = int(quantity)
+        if quantity < 1:
+            raise LotMatchingError("Sell quantity must be at least 1")
+        if quantity > self.open_quantity:
+            raise LotMatchingError(f"Only {self.open_quantity:,} shares are open")
+        cost_basis, matched = self._match(quantity, lots)
+        sell_value, sell_fee, proceeds = sell_side(sell_price, quantity, is_day_trade(trading_type), self.schedule)
+        self.open_quantity -= quantity
+        # Start from exact zeros once the position is closed
+        self.open_cost = self.open_cost - cost_basis if self.open_quantity else 0.0
+        realized_gain = proceeds - cost_basis
+        self.realized_gain += realized_gain
+        match = SellMatch(quantity, sell_price, sell_value, sell_fee, proceeds, cost_basis, realized_gain, matched)
+        self.sells.append(match)
+        return match
+
+    def open_lots(self):
+        """Indices, remaining quantity and remaining cost of lots still open.
+
+        Under average cost only the position is tracked, not individual lots.
+        """
+        if self.method == AVERAGE:
+            raise LotMatchingError("Average cost tracks the open position, not individual lots")
+        open_mask = self.remaining > 0
+        return np.flatnonzero(open_mask), self.remaining[open_mask], self.remaining_cost[open_mask]
@@ -0,0 +1,200 @@
+"""Latency histograms for hot sections of the app and the service.
+
+``with timed(name):`` measures a block and adds its duration to a
+process-wide histogram, so every Streamlit session in the process
+contributes to the same aggregates. Histograms use fixed
+Prometheus-style buckets: recording is one bisect and a few additions
+under a lock, and memory stays constant however many samples arrive.
+
+The aggregates are exported as Prometheus text or JSON, by the service's
+``GET /metrics`` and ``GET /metrics.json``, or, for the Streamlit process,
+by a small HTTP server started when $CALQTRADE_METRICS_PORT is set::
+
+    CALQTRADE_METRICS_PORT=9100 streamlit run app.py
+    curl localhost:9100/metrics
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT_ENV = "CALQTRADE_METRICS_PORT"
+METRIC_NAME = "calqtrade_section_seconds"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds; a final +Inf bucket catches the rest
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Counts of observations per latency bucket plus their sum and maximum."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def cumulative(self):
+        """Observations at or below each bucket bound, ending with the +Inf total."""
+        total = 0
+        counts = []
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+    def quantile(self, q):
+        """Estimate of the ``q`` quantile, interpolated within its bucket as Prometheus does."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        lower = 0.0
+        seen = 0
+        for bound, count in zip(self.buckets + (self.max,), self.counts):
+            if count and seen + count >= rank:
+                upper = min(bound, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.max
+
+
+class MetricsRegistry:
+    """Histograms keyed by section name, shared by every thread in the process."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def snapshot(self):
+        """{name: dict of count, sum, mean, max, p50/p95/p99 and cumulative buckets}."""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            result = {}
+            for name, histogram in histograms:
+                row = {
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "mean": histogram.sum / histogram.count,
+                    "max": histogram.max,
+                }
+                for q in QUANTILES:
+                    row[f"p{round(q * 100)}"] = histogram.quantile(q)
+                bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+                row["buckets"] = dict(zip(bounds, histogram.cumulative()))
+                result[name] = row
+            return result
+
+    def to_json(self):
+        return json.dumps({"sections": self.snapshot()})
+
+    def to_prometheus(self):
+        """Histograms in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent in an instrumented CalqTrade section",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        for name, row in self.snapshot().items():
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            for bound, count in row["buckets"].items():
+                lines.append(f'{METRIC_NAME}_bucket{{section="{label}",le="{bound}"}} {count}')
+            lines.append(f'{METRIC_NAME}_sum{{section="{label}"}} {row["sum"]!r}')
+            lines.append(f'{METRIC_NAME}_count{{section="{label}"}} {row["count"]}')
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class timed:
+    """Time a block into ``registry`` and, if given, store the seconds in ``record[name]``.
+
+    Blocks left by an exception (including Streamlit's rerun and stop
+    signals) are not recorded, since their time covers only part of the work.
+    """
+
+    def __init__(self, name, record=None, registry=REGISTRY):
+        self.name = name
+        self.record = record
+        self.registry = registry
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            seconds = time.perf_counter() - self._started
+            self.registry.observe(self.name, seconds)
+            if self.record is not None:
+                self.record[self.name] = seconds
+        return False
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body, content_type = self.registry.to_prometheus(), PROMETHEUS_CONTENT_TYPE
+        elif path == "/metrics.json":
+            body, content_type = self.registry.to_json(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes arrive every few seconds; keep them out of the app's log
+        pass
+
+
+@lru_cache(maxsize=None)
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve REGISTRY on ``host:port`` from a daemon thread; started once per process."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="calqtrade-metrics", daemon=True).start()
+    return server
+
+
+def serve_metrics_from_env():
+    """Start the metrics server if $CALQTRADE_METRICS_PORT is set; returns the server or None."""
+    port = os.environ.get(METRICS_PORT_ENV, "").strip()
+    if not port:
+        return None
+    # Checked here so a bad value is a ValueError for the app to report, not an OverflowError from bind()
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"${METRICS_PORT_ENV}={port!r} is not a port number (1-65535)")
+    return start_metrics_server(int(port))
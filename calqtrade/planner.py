@@ -0,0 +1,238 @@
+"""Averaging-down planner: the buys that bring a position to a target price.
+
+The Multi Purchase tab answers "what is my average after these buys";
+this module answers the inverse. Every purchase is valued with
+engine.buy_side, the same fee-inclusive formula as the ledger, and the
+target is either the overall average price or the B.E.S price.
+
+With the standard fees one more lot of q shares at price P moves the
+average to (C + P(1 + f)q) / (Q + q), so the shares needed to reach a
+target average T are::
+
+    q = (C - T·Q) / (T - P(1 + f))        (only possible while P(1 + f) < T)
+
+A B.E.S target is first turned into the average it implies (B.E.S ×
+(1 - STL) for day trades, B.E.S ÷ (1 + fee) for swing trades). Under a fee
+schedule with tiers or minimum charges there is no closed form, and q is
+found by a bisection run over every candidate price at once.
+
+plan_ladder spreads the buy over a ladder of limit orders between two
+prices. It scores a grid of (rung count × size skew) candidates in one
+pass and returns the cheapest ladder that reaches the target once every
+rung fills, within an optional per-order quantity cap and budget.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from calqtrade.engine import FEE_RATE, STL_RATE, _select, bes_price, buy_side
+
+AVG_PRICE = "avg_price"
+BES_PRICE = "bes_price"
+TARGET_METRICS = (AVG_PRICE, BES_PRICE)
+
+# Upper bound for the bisection search of a single buy
+MAX_PLAN_QUANTITY = 10 ** 12
+DEFAULT_MAX_RUNGS = 10
+# Each rung is this many times the size of the rung above it
+DEFAULT_SKEWS = tuple(np.round(np.linspace(1.0, 2.0, 21), 2))
+# Bisection steps for a ladder's size under a fee schedule
+LADDER_ITERATIONS = 60
+
+PLAN_FIELDS = (
+    "buy_price",
+    "quantity",
+    "reachable",
+    "cost",
+    "new_quantity",
+    "new_total_cost",
+    "new_avg_price",
+    "new_bes_price",
+)
+
+Ladder = namedtuple("Ladder", (
+    "prices",
+    "quantities",
+    "costs",
+    "cash",
+    "avg_after",
+    "bes_after",
+    "rungs",
+    "skew",
+    "candidates",
+    "feasible",
+))
+
+
+class PlanningError(ValueError):
+    """Raised for a position or target that cannot be planned for."""
+
+
+def _lot_cost(price, quantity, schedule):
+    # Total cost of buying ``quantity`` at ``price``; zero where nothing is bought
+    quantity = np.asarray(quantity)
+    cost = buy_side(price, np.maximum(quantity, 1), schedule)[3]
+    return np.where(quantity > 0, cost, 0.0)
+
+
+def position_metric(total_cost, quantity, metric, day_trade, schedule=None):
+    """The position's average price or B.E.S price, for arrays or scalars."""
+    avg_price = total_cost / quantity
+    if metric == AVG_PRICE:
+        return avg_price
+    return bes_price(total_cost, avg_price, quantity, day_trade, schedule)
+
+
+def _check(quantity, total_cost, target, metric, day_trade, schedule):
+    if metric not in TARGET_METRICS:
+        raise PlanningError(f"Unknown target metric: {metric!r}")
+    if quantity < 1 or total_cost <= 0:
+        raise PlanningError("Plan for a position with at least one share")
+    if target <= 0:
+        raise PlanningError("The target price must be positive")
+    current = float(position_metric(total_cost, quantity, metric, day_trade, schedule))
+    if current <= target:
+        raise PlanningError(f"The position is already at Rs. {current:.4f}, at or below the target")
+
+
+def _target_avg(target, metric, day_trade):
+    # Average price that gives ``target`` under the standard fees
+    if metric == AVG_PRICE:
+        return target
+    return _select(day_trade, target * (1 - STL_RATE), target / (1 + FEE_RATE))
+
+
+def shares_to_target(quantity, total_cost, buy_price, target, metric=AVG_PRICE, day_trade=False,
+                     schedule=None, max_quantity=MAX_PLAN_QUANTITY):
+    """Fewest shares to buy at each ``buy_price`` to bring the position to ``target``.
+
+    Returns a dict of arrays keyed by PLAN_FIELDS. Where no quantity up to
+    ``max_quantity`` is enough (the price with fees is not below the
+    target), ``reachable`` is False and ``quantity`` is 0.
+    """
+    _check(quantity, total_cost, target, metric, day_trade, schedule)
+    buy_price = np.atleast_1d(np.asarray(buy_price, dtype=np.float64))
+
+    def reaches(shares):
+        new_cost = total_cost + _lot_cost(buy_price, shares, schedule)
+        return position_metric(new_cost, quantity + shares, metric, day_trade, schedule) <= target
+
+    if schedule is None:
+        target_avg = _target_avg(target, metric, day_trade)
+        unit_cost = buy_price * (1 + FEE_RATE)
+        reachable = unit_cost < target_avg
+        with np.errstate(divide="ignore", invalid="ignore"):
+            needed = np.ceil((total_cost - target_avg * quantity) / (target_avg - unit_cost))
+        shares = np.where(reachable, np.clip(needed, 1, max_quantity), 0).astype(np.int64)
+        # Rounding in the division can leave the closed form one share short
+        shares = np.where(reachable & ~reaches(shares), shares + 1, shares)
+    else:
+        reachable = reaches(np.full(buy_price.shape, max_quantity, dtype=np.int64))
+        low = np.zeros(buy_price.shape, dtype=np.int64)
+        high = np.full(buy_price.shape, max_quantity, dtype=np.int64)
+        while np.any(high - low > 1):
+            middle = (low + high) // 2
+            done = reaches(middle)
+            high = np.where(done, middle, high)
+            low = np.where(done, low, middle)
+        shares = np.where(reachable, high, 0)
+
+    cost = _lot_cost(buy_price, shares, schedule)
+    new_quantity = quantity + shares
+    new_total_cost = total_cost + cost
+    return dict(zip(PLAN_FIELDS, (
+        buy_price,
+        shares,
+        reachable,
+        cost,
+        new_quantity,
+        new_total_cost,
+        new_total_cost / new_quantity,
+        position_metric(new_total_cost, new_quantity, BES_PRICE, day_trade, schedule),
+    )))
+
+
+def plan_ladder(quantity, total_cost, target, high, low, metric=AVG_PRICE, day_trade=False, schedule=None,
+                max_rungs=DEFAULT_MAX_RUNGS, skews=DEFAULT_SKEWS, max_order_quantity=None, budget=None):
+    """Cheapest ladder of buy orders from ``high`` down to ``low`` that reaches ``target``.
+
+    A candidate with n rungs places orders at n evenly spaced prices
+    (just ``high`` for n = 1) sized 1 : skew : skew² ... from the top; it is
+    scaled to the smallest whole-share ladder that reaches the target once
+    filled. Returns a Ladder (avg_after and bes_after give the position
+    after each rung fills, top down), or None if no candidate fits the
+    quantity cap and budget.
+    """
+    _check(quantity, total_cost, target, metric, day_trade, schedule)
+    if not 0 < low <= high:
+        raise PlanningError("The ladder needs 0 < low <= high")
+    if max_rungs < 1:
+        raise PlanningError("The ladder needs at least one rung")
+    # Candidate axes: rung count, skew, rung
+    counts = np.arange(1, max_rungs + 1)
+    rung = np.arange(max_rungs)
+    active = rung[None, :] < counts[:, None]
+    steps = np.maximum(counts - 1, 1)[:, None]
+    prices = np.where(active, high - (high - low) * rung[None, :] / steps, 0.0)[:, None, :]
+    skews = np.asarray(skews, dtype=np.float64)
+    weights = np.where(active[:, None, :], skews[None, :, None] ** rung[None, None, :], 0.0)
+
+    def ladder(scale):
+        shares = np.ceil(scale[..., None] * weights).astype(np.int64)
+        # Every active rung buys at least one share
+        return np.where(active[:, None, :], np.maximum(shares, 1), 0)
+
+    def outcome(shares):
+        costs = _lot_cost(prices, shares, schedule)
+        new_cost = total_cost + costs.sum(axis=-1)
+        new_quantity = quantity + shares.sum(axis=-1)
+        return costs, position_metric(new_cost, new_quantity, metric, day_trade, schedule)
+
+    shape = (len(counts), len(skews))
+    if schedule is None:
+        target_avg = _target_avg(target, metric, day_trade)
+        room = (weights * (target_avg - prices * (1 + FEE_RATE))).sum(axis=-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scale = np.where(room > 0, (total_cost - target_avg * quantity) / room, np.inf)
+    else:
+        # Largest scale any order could need, then bisect every candidate at once
+        ceiling = np.full(shape, float(MAX_PLAN_QUANTITY))
+        low_scale = np.zeros(shape)
+        high_scale = np.where(outcome(ladder(ceiling))[1] <= target, ceiling, np.inf)
+        for _ in range(LADDER_ITERATIONS):
+            middle = np.where(np.isfinite(high_scale), (low_scale + high_scale) / 2, 0.0)
+            done = outcome(ladder(middle))[1] <= target
+            high_scale = np.where(done & np.isfinite(high_scale), middle, high_scale)
+            low_scale = np.where(done, low_scale, middle)
+        scale = high_scale
+
+    finite = np.isfinite(scale)
+    shares = ladder(np.where(finite, scale, 0.0))
+    costs, reached = outcome(shares)
+    cash = costs.sum(axis=-1)
+    feasible = finite & (reached <= target * (1 + 1e-12))
+    if max_order_quantity:
+        feasible &= shares.max(axis=-1) <= max_order_quantity
+    if budget:
+        feasible &= cash <= budget
+    if not feasible.any():
+        return None
+
+    best = np.unravel_index(np.argmin(np.where(feasible, cash, np.inf)), shape)
+    rungs = int(counts[best[0]])
+    best_shares = shares[best][:rungs]
+    best_costs = costs[best][:rungs]
+    filled_cost = total_cost + np.cumsum(best_costs)
+    filled_quantity = quantity + np.cumsum(best_shares)
+    return Ladder(
+        prices[best[0], 0, :rungs],
+        best_shares,
+        best_costs,
+        float(cash[best]),
+        filled_cost / filled_quantity,
+        position_metric(filled_cost, filled_quantity, BES_PRICE, day_trade, schedule),
+        rungs,
+        float(skews[best[1]]),
+        int(feasible.size),
+        int(feasible.sum()),
+    )
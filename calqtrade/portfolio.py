@@ -0,0 +1,426 @@
+"""Multi-symbol purchase index for the Multi Purchase tab.
+
+Purchases are keyed by ticker: each symbol owns a PurchaseLedger with its
+own running totals, found by a dict lookup, and a sorted symbol list is
+kept alongside for display. Portfolio-wide totals are updated by the
+change in the touched symbol's totals, so adding or deleting a lot never
+rescans the other symbols' lots.
+
+A portfolio can be backed by a calqtrade.store.LedgerStore: every change
+is written through to it, and Portfolio.load opens a saved book from the
+store's per-symbol aggregate rows, reading a symbol's lots only when that
+symbol is first used. Lots are written by id, and the store's revision of
+each symbol is tracked: when a write shows that another session changed
+the symbol in between, or refresh() finds such a change, the symbol is
+read again so the portfolio and the store never disagree.
+"""
+from bisect import bisect_left, insort
+
+import numpy as np
+
+from calqtrade.engine import FEE_RATE, bes_price, is_day_trade
+from calqtrade.ledger import PurchaseLedger
+from calqtrade.store import LedgerConflictError
+
+# Running totals rolled up from each symbol's ledger
+ROLLUP_FIELDS = (
+    "total_quantity",
+    "total_buy_value",
+    "total_buy_fees",
+    "total_cost",
+    "total_buy_value_cents",
+    "total_buy_fee_cents",
+)
+
+SUMMARY_FIELDS = ("symbol", "lots", "total_quantity", "total_cost", "overall_avg_price", "bes_price")
+
+
+def normalize_symbol(symbol):
+    """Tickers are matched case-insensitively and without surrounding spaces."""
+    return str(symbol).strip().upper()
+
+
+def _saved_rollup(row):
+    # ROLLUP_FIELDS for a symbol not loaded yet, from its stored aggregate
+    # row; with flat standard fees every float total is linear in buy value
+    buy_value = row["total_buy_value"]
+    return (
+        row["total_quantity"],
+        buy_value,
+        buy_value * FEE_RATE,
+        buy_value * (1 + FEE_RATE),
+        row["total_buy_value_cents"],
+        row["total_buy_fee_cents"],
+    )
+
+
+class Portfolio:
+    """Purchase ledgers indexed by symbol plus portfolio-wide running totals."""
+
+    def __init__(self, schedule=None, store=None):
+        self.schedule = schedule
+        self.store = store
+        self._ledgers = {}
+        # Aggregate rows of stored symbols whose lots have not been read yet
+        self._saved = {}
+        self._symbols = []
+        # Store revision of each symbol as this portfolio last saw it
+        self._revisions = {}
+        # Next lot id when there is no store to hand them out
+        self._next_id = 1
+        self._reset_totals()
+
+    @classmethod
+    def load(cls, store, schedule=None):
+        """Open the book saved in ``store`` from its aggregate rows."""
+        portfolio = cls(None, store)
+        # Revisions first: a write in between makes them look stale, so refresh() rereads
+        portfolio._revisions = store.revisions()
+        portfolio._saved = store.aggregates()
+        portfolio._symbols = sorted(portfolio._saved)
+        for row in portfolio._saved.values():
+            portfolio._add_rollup(_saved_rollup(row), 1)
+        portfolio.set_schedule(schedule)
+        return portfolio
+
+    def _add_rollup(self, values, sign):
+        for field, value in zip(ROLLUP_FIELDS, values):
+            setattr(self, field, getattr(self, field) + sign * value)
+
+    def _load(self, symbol):
+        # Loaded ledger for ``symbol``, reading its lots from the store on first use
+        ledger = self._ledgers.get(symbol)
+        if ledger is None and symbol in self._saved:
+            row = self._saved.pop(symbol)
+            ledger = PurchaseLedger(self.schedule)
+            ids, price, quantity, self._revisions[symbol] = self.store.load_lots(symbol)
+            ledger.extend(price, quantity, ids)
+            self._add_rollup(_saved_rollup(row), -1)
+            self._add_rollup(self._snapshot(ledger), 1)
+            self._ledgers[symbol] = ledger
+        return ledger
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def __contains__(self, symbol):
+        symbol = normalize_symbol(symbol)
+        return symbol in self._ledgers or symbol in self._saved
+
+    def __getitem__(self, symbol):
+        ledger = self._load(normalize_symbol(symbol))
+        if ledger is None:
+            raise KeyError(symbol)
+        return ledger
+
+    def __iter__(self):
+        return iter(self._symbols)
+
+    def symbols(self):
+        """Symbols holding at least one lot, in alphabetical order."""
+        return list(self._symbols)
+
+    def search(self, prefix, limit=50):
+        """Symbols starting with ``prefix``, found by bisecting the sorted list."""
+        prefix = normalize_symbol(prefix)
+        start = bisect_left(self._symbols, prefix)
+        matches = []
+        for symbol in self._symbols[start:start + limit]:
+            if not symbol.startswith(prefix):
+                break
+            matches.append(symbol)
+        return matches
+
+    def ledger(self, symbol):
+        """Ledger for ``symbol``; an empty, unindexed one if it holds no lots yet."""
+        ledger = self._load(normalize_symbol(symbol))
+        return ledger if ledger is not None else PurchaseLedger(self.schedule)
+
+    def _snapshot(self, ledger):
+        return [getattr(ledger, field) for field in ROLLUP_FIELDS]
+
+    def _update(self, symbol, change):
+        # Apply ``change`` to one symbol's ledger and roll its delta into the totals
+        ledger = self._load(symbol)
+        if ledger is None:
+            ledger = PurchaseLedger(self.schedule)
+        before = self._snapshot(ledger)
+        result = change(ledger)
+        self._add_rollup(before, -1)
+        self._add_rollup(self._snapshot(ledger), 1)
+        if ledger and symbol not in self._ledgers:
+            self._ledgers[symbol] = ledger
+            insort(self._symbols, symbol)
+        elif not ledger and symbol in self._ledgers:
+            del self._ledgers[symbol]
+            del self._symbols[bisect_left(self._symbols, symbol)]
+        if not self._symbols:
+            # Start from exact zeros rather than accumulated rounding residue
+            self._reset_totals()
+        return result
+
+    def _reset_totals(self):
+        for field in ROLLUP_FIELDS:
+            setattr(self, field, 0 if field == "total_quantity" or field.endswith("_cents") else 0.0)
+
+    def _new_ids(self, count):
+        # Ids for lots of a portfolio without a store
+        ids = np.arange(self._next_id, self._next_id + count, dtype=np.int64)
+        self._next_id += count
+        return ids
+
+    def _written(self, symbol, revision, change):
+        # Apply a change just written to the store, unless the revision shows
+        # another writer got there first; then the symbol is read again instead
+        if revision == self._revisions.get(symbol, 0) + 1:
+            self._revisions[symbol] = revision
+            return self._update(symbol, change)
+        self._reload(symbol)
+        return None
+
+    def _reload(self, symbol):
+        # Replace ``symbol``'s lots with those in the store
+        row = self._saved.pop(symbol, None)
+        if row is not None:
+            self._add_rollup(_saved_rollup(row), -1)
+            del self._symbols[bisect_left(self._symbols, symbol)]
+        ids, price, quantity, revision = self.store.load_lots(symbol)
+
+        def replace(ledger):
+            ledger.clear()
+            ledger.extend(price, quantity, ids)
+
+        self._update(symbol, replace)
+        self._revisions[symbol] = revision
+
+    def refresh(self):
+        """Read again every symbol another writer changed in the store; returns those symbols."""
+        if self.store is None:
+            return []
+        revisions = self.store.revisions()
+        changed = sorted(symbol for symbol in set(revisions) | set(self._revisions)
+                         if revisions.get(symbol, 0) != self._revisions.get(symbol, 0))
+        saved = None
+        for symbol in changed:
+            if symbol in self._ledgers or self.schedule is not None:
+                self._reload(symbol)
+                continue
+            # Not read yet: swap in its new aggregate row
+            saved = self.store.aggregates() if saved is None else saved
+            row = self._saved.pop(symbol, None)
+            if row is not None:
+                self._add_rollup(_saved_rollup(row), -1)
+                del self._symbols[bisect_left(self._symbols, symbol)]
+            row = saved.get(symbol)
+            if row is not None:
+                self._saved[symbol] = row
+                self._add_rollup(_saved_rollup(row), 1)
+                insort(self._symbols, symbol)
+            self._revisions[symbol] = row["revision"] if row is not None else revisions[symbol]
+        if not self._symbols:
+            self._reset_totals()
+        return changed
+
+    def add(self, symbol, price, quantity):
+        """Record a purchase of ``symbol`` and return its fee-enriched lot."""
+        symbol = normalize_symbol(symbol)
+        if self.store is None:
+            lot_id = int(self._new_ids(1)[0])
+            return self._update(symbol, lambda ledger: ledger.add(price, quantity, lot_id))
+        # Read the symbol's saved lots first, so they never include this one twice
+        self._load(symbol)
+        ids, revision = self.store.insert(symbol, price, quantity)
+        lot_id = int(ids[0])
+        lot = self._written(symbol, revision, lambda ledger: ledger.add(price, quantity, lot_id))
+        if lot is None:
+            ledger = self._ledgers[symbol]
+            lot = ledger[int(ledger.positions(lot_id)[0])]
+        return lot
+
+    def extend(self, symbol, price, quantity):
+        """Append purchases given as arrays; ``symbol`` is one ticker or an array of them.
+
+        Returns {symbol: ids given to its new lots}.
+        """
+        price = np.asarray(price, dtype=np.float64)
+        quantity = np.asarray(quantity, dtype=np.int64)
+        if isinstance(symbol, str):
+            groups = [(normalize_symbol(symbol), price, quantity)]
+        else:
+            symbols = np.char.upper(np.char.strip(np.asarray(symbol, dtype=str)))
+            # One extend per distinct symbol, keeping each symbol's file order
+            unique, inverse = np.unique(symbols, return_inverse=True)
+            order = np.argsort(inverse, kind="stable")
+            bounds = np.searchsorted(inverse[order], np.arange(len(unique) + 1))
+            groups = []
+            for index, name in enumerate(unique.tolist()):
+                rows = order[bounds[index]:bounds[index + 1]]
+                groups.append((name, price[rows], quantity[rows]))
+        if self.store is None:
+            written = [(self._new_ids(len(group_price)), None) for _, group_price, _ in groups]
+            for (name, group_price, group_quantity), (ids, _) in zip(groups, written):
+                self._update(name, lambda ledger: ledger.extend(group_price, group_quantity, ids))
+        else:
+            for name, _, _ in groups:
+                self._load(name)
+            written = self.store.insert_groups(groups)
+            for (name, group_price, group_quantity), (ids, revision) in zip(groups, written):
+                self._written(name, revision, lambda ledger: ledger.extend(group_price, group_quantity, ids))
+        return {name: ids for (name, _, _), (ids, _) in zip(groups, written)}
+
+    def _lot_id(self, symbol, index):
+        # Id of lot ``index`` of ``symbol``, after normalizing both
+        ledger = self[symbol]
+        return int(ledger.ids[range(len(ledger))[index]])
+
+    def remove(self, symbol, index):
+        """Delete lot ``index`` of ``symbol`` and return it."""
+        symbol = normalize_symbol(symbol)
+        lot_id = self._lot_id(symbol, index)
+        lot = self[symbol][index]
+        self.remove_lots(symbol, [lot_id])
+        return lot
+
+    def update(self, symbol, index, price, quantity):
+        """Replace lot ``index`` of ``symbol`` and return the new lot."""
+        symbol = normalize_symbol(symbol)
+        lot_id = self._lot_id(symbol, index)
+        self.update_lots(symbol, [lot_id], [price], [quantity])
+        ledger = self[symbol]
+        return ledger[int(ledger.positions(lot_id)[0])]
+
+    def _write(self, symbol, write, change):
+        # Write to the store (if any) and apply ``change`` to the symbol's
+        # ledger; a conflict rereads the symbol before it is raised
+        if self.store is None:
+            return self._update(symbol, change)
+        self._load(symbol)
+        try:
+            revision = write()
+        except LedgerConflictError:
+            self._reload(symbol)
+            raise
+        return self._written(symbol, revision, change)
+
+    def remove_lots(self, symbol, ids):
+        """Delete the lots of ``symbol`` with ``ids``.
+
+        Raises KeyError for an id this portfolio does not hold, and
+        calqtrade.store.LedgerConflictError (after reading the symbol
+        again) if another session already removed one from the store.
+        """
+        symbol = normalize_symbol(symbol)
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        self[symbol].positions(ids)
+        self._write(symbol, lambda: self.store.delete(symbol, ids), lambda ledger: ledger.remove_lots(ids))
+
+    def update_lots(self, symbol, ids, price, quantity):
+        """Replace the price and quantity of the lots of ``symbol`` with ``ids``; errors as for remove_lots."""
+        symbol = normalize_symbol(symbol)
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        price = np.broadcast_to(np.asarray(price, dtype=np.float64), ids.shape)
+        quantity = np.broadcast_to(np.asarray(quantity, dtype=np.int64), ids.shape)
+        self[symbol].positions(ids)
+        self._write(symbol, lambda: self.store.update(symbol, ids, price, quantity),
+                    lambda ledger: ledger.update_lots(ids, price, quantity))
+
+    def restore_lots(self, symbol, ids, price, quantity):
+        """Put back lots of ``symbol`` under the ids they had, at their place in purchase order."""
+        symbol = normalize_symbol(symbol)
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        price = np.atleast_1d(np.asarray(price, dtype=np.float64))
+        quantity = np.atleast_1d(np.asarray(quantity, dtype=np.int64))
+        if not len(ids):
+            return
+        if self.store is None:
+            self._next_id = max(self._next_id, int(ids.max()) + 1)
+        self._write(symbol, lambda: self.store.restore(symbol, ids, price, quantity),
+                    lambda ledger: ledger.insert_lots(ids, price, quantity))
+
+    def clear_symbol(self, symbol):
+        """Delete every lot of ``symbol``."""
+        symbol = normalize_symbol(symbol)
+        if symbol not in self:
+            return
+        if symbol in self._ledgers:
+            self.remove_lots(symbol, self._ledgers[symbol].ids)
+            return
+        # Never loaded: drop its aggregate without reading the lots
+        if self.store is not None:
+            self._revisions[symbol] = self.store.clear_symbol(symbol)
+        row = self._saved.pop(symbol)
+        self._add_rollup(_saved_rollup(row), -1)
+        del self._symbols[bisect_left(self._symbols, symbol)]
+        if not self._symbols:
+            self._reset_totals()
+
+    def clear(self):
+        if self.store is not None:
+            self.store.clear()
+            self._revisions = self.store.revisions()
+        self._ledgers = {}
+        self._saved = {}
+        self._symbols = []
+        self._reset_totals()
+
+    def set_schedule(self, schedule):
+        """Switch fee schedule for every symbol and rebuild the rollup."""
+        if schedule == self.schedule:
+            return
+        # Tiered fees need every lot, so saved symbols are read in first
+        if schedule is not None:
+            for symbol in list(self._saved):
+                self._load(symbol)
+        self.schedule = schedule
+        self._reset_totals()
+        for ledger in self._ledgers.values():
+            ledger.set_schedule(schedule)
+            self._add_rollup(self._snapshot(ledger), 1)
+        for row in self._saved.values():
+            self._add_rollup(_saved_rollup(row), 1)
+
+    @property
+    def total_lots(self):
+        return (sum(len(ledger) for ledger in self._ledgers.values())
+                + sum(row["lots"] for row in self._saved.values()))
+
+    @property
+    def overall_avg_price(self):
+        # Total Cost ÷ Total Quantity across every symbol
+        return self.total_cost / self.total_quantity if self.total_quantity > 0 else 0
+
+    def summary(self, trading_type):
+        """Per-symbol rollup as a dict of arrays keyed by SUMMARY_FIELDS.
+
+        Built from each ledger's running totals, or the stored aggregate row
+        of symbols not loaded yet, one row per symbol.
+        """
+        count = len(self._symbols)
+        lots = np.zeros(count, dtype=np.int64)
+        total_quantity = np.zeros(count, dtype=np.int64)
+        total_cost = np.zeros(count, dtype=np.float64)
+        for row, symbol in enumerate(self._symbols):
+            ledger = self._ledgers.get(symbol)
+            if ledger is not None:
+                lots[row] = len(ledger)
+                total_quantity[row] = ledger.total_quantity
+                total_cost[row] = ledger.total_cost
+            else:
+                saved = self._saved[symbol]
+                lots[row] = saved["lots"]
+                total_quantity[row] = saved["total_quantity"]
+                total_cost[row] = _saved_rollup(saved)[3]
+        overall_avg_price = total_cost / total_quantity
+        # B.E.S for every symbol in one vectorized pass
+        if self.schedule is None:
+            bes = bes_price(total_cost, overall_avg_price, total_quantity, is_day_trade(trading_type))
+        else:
+            bes = np.array([self._ledgers[symbol].bes_price(trading_type) for symbol in self._symbols])
+        return dict(zip(SUMMARY_FIELDS, (
+            np.array(self._symbols, dtype=object),
+            lots,
+            total_quantity,
+            total_cost,
+            overall_avg_price,
+            np.asarray(bes, dtype=np.float64),
+        )))
@@ -0,0 +1,396 @@
+"""Historical price series for mark-to-market P&L.
+
+Two on-disk sources are supported, neither loaded into RAM as a whole:
+
+- a price directory (built once from a CSV or Parquet file) holding
+  ``timestamp.npy`` and ``close.npy`` sorted by symbol then time, plus an
+  ``index.json`` of each symbol's row range. Both arrays are opened with
+  ``mmap_mode="r"``, so a symbol's date range is found by binary search
+  and only the pages that are read come off disk.
+- a Parquet file with symbol, timestamp and close columns, read through a
+  memory map one symbol (and row-group filter) at a time.
+
+Build a price directory with::
+
+    python -m calqtrade.prices prices.csv prices_dir
+
+mark_to_market evaluates the current position against any close series
+with the engine's sell-side formulas; mtm_curve and mtm_summary sample or
+stream a stored series so years of intraday bars never materialize at once.
+cached_mark_to_market memoizes both for a position until the price source
+is reopened.
+
+Only the paths listed in $CALQTRADE_PRICE_PATH (separated by os.pathsep)
+are offered to the app, so a browser session can never open other files.
+"""
+import argparse
+import json
+import os
+import sys
+from functools import lru_cache
+
+import numpy as np
+
+from calqtrade.engine import _safe_div, bes_price, sell_side
+from calqtrade.importer import OPTIONAL_COLUMN_ALIASES, DEFAULT_CHUNKSIZE, detect_format, iter_frame_chunks
+from calqtrade.resources import SharedFileCache
+
+# Local price files or directories offered in the Multi Purchase tab
+PRICE_PATH_ENV = "CALQTRADE_PRICE_PATH"
+
+PRICE_COLUMN_ALIASES = {
+    "timestamp": ("timestamp", "date", "datetime", "time", "trade date"),
+    "close": ("close", "close price", "closing price", "last", "ltp", "price"),
+    **OPTIONAL_COLUMN_ALIASES,
+}
+
+MTM_FIELDS = (
+    "close",
+    "market_value",
+    "sell_fee",
+    "proceeds",
+    "unrealized_gain",
+    "return_pct",
+    "distance_to_bes",
+    "distance_to_bes_pct",
+)
+
+# Points drawn per chart; longer series are sampled evenly
+MAX_CHART_POINTS = 2000
+# Rows evaluated per step when streaming a whole series
+SUMMARY_CHUNK = 1_000_000
+MTM_CACHE_SIZE = 256
+
+
+class PriceFileError(ValueError):
+    """Raised for a price file that cannot be read or built."""
+
+
+def _canonical_price_column(name):
+    name = str(name).strip().lower()
+    for column, aliases in PRICE_COLUMN_ALIASES.items():
+        if name in aliases:
+            return column
+    return None
+
+
+def _clean_prices(chunk, symbol):
+    # (symbol, timestamp ns, close) arrays with unusable rows dropped
+    import pandas as pd
+
+    renamed = {}
+    for column in chunk.columns:
+        canonical = _canonical_price_column(column)
+        if canonical is not None and canonical not in renamed.values():
+            renamed[column] = canonical
+    chunk = chunk[list(renamed)].rename(columns=renamed)
+    missing = {"timestamp", "close"} - set(chunk.columns)
+    if missing:
+        raise PriceFileError(f"Missing column(s): {', '.join(sorted(missing))}")
+    if "symbol" in chunk:
+        symbols = chunk["symbol"].astype(str).str.strip().str.upper()
+    elif symbol:
+        symbols = pd.Series(symbol.strip().upper(), index=chunk.index)
+    else:
+        raise PriceFileError("The file has no symbol column; name the symbol it holds")
+    timestamps = pd.to_datetime(chunk["timestamp"], errors="coerce")
+    close = pd.to_numeric(chunk["close"], errors="coerce")
+    valid = (timestamps.notna() & close.notna() & (symbols != "")).to_numpy()
+    return (
+        symbols.to_numpy()[valid],
+        timestamps.to_numpy(dtype="datetime64[ns]")[valid].view(np.int64),
+        close.to_numpy(dtype=np.float64)[valid],
+    )
+
+
+def build_price_directory(source, destination, symbol=None, file_format=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Convert a CSV or Parquet price file into a memory-mappable price directory.
+
+    Streams the source twice: once to count rows per symbol and once to
+    write each row straight into its symbol's slot. Returns the row count.
+    """
+    def chunks():
+        for chunk in iter_frame_chunks(source, file_format, chunksize,
+                                       usecols=lambda column: _canonical_price_column(column) is not None):
+            yield _clean_prices(chunk, symbol)
+
+    counts = {}
+    for symbols, _, _ in chunks():
+        names, sizes = np.unique(symbols, return_counts=True)
+        for name, size in zip(names.tolist(), sizes.tolist()):
+            counts[name] = counts.get(name, 0) + size
+    total = sum(counts.values())
+    if not total:
+        raise PriceFileError("No valid price rows found")
+
+    os.makedirs(destination, exist_ok=True)
+    timestamps = np.lib.format.open_memmap(os.path.join(destination, "timestamp.npy"), mode="w+",
+                                           dtype=np.int64, shape=(total,))
+    close = np.lib.format.open_memmap(os.path.join(destination, "close.npy"), mode="w+",
+                                      dtype=np.float64, shape=(total,))
+    index = {}
+    start = 0
+    for name in sorted(counts):
+        index[name] = [start, start + counts[name]]
+        start += counts[name]
+    cursor = {name: bounds[0] for name, bounds in index.items()}
+
+    for symbols, chunk_timestamps, chunk_close in chunks():
+        order = np.argsort(symbols, kind="stable")
+        names, first = np.unique(symbols[order], return_index=True)
+        bounds = np.append(first, len(order))
+        for position, name in enumerate(names.tolist()):
+            rows = order[bounds[position]:bounds[position + 1]]
+            at = cursor[name]
+            timestamps[at:at + len(rows)] = chunk_timestamps[rows]
+            close[at:at + len(rows)] = chunk_close[rows]
+            cursor[name] = at + len(rows)
+
+    # Time-order each symbol's slice; one symbol is in memory at a time
+    for start, stop in index.values():
+        order = np.argsort(timestamps[start:stop], kind="stable")
+        timestamps[start:stop] = timestamps[start:stop][order]
+        close[start:stop] = close[start:stop][order]
+    timestamps.flush()
+    close.flush()
+    with open(os.path.join(destination, "index.json"), "w", encoding="utf-8") as handle:
+        json.dump(index, handle)
+    return total
+
+
+class MemmapPriceSource:
+    """Price directory written by build_price_directory, memory-mapped read-only."""
+
+    def __init__(self, directory):
+        self.path = directory
+        try:
+            with open(os.path.join(directory, "index.json"), encoding="utf-8") as handle:
+                self._index = json.load(handle)
+            self._timestamps = np.load(os.path.join(directory, "timestamp.npy"), mmap_mode="r")
+            self._close = np.load(os.path.join(directory, "close.npy"), mmap_mode="r")
+        except (OSError, ValueError) as error:
+            raise PriceFileError(f"Could not open price directory {directory}: {error}") from None
+
+    def symbols(self):
+        return sorted(self._index)
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def series(self, symbol, start=None, end=None):
+        """Return (timestamps as datetime64[ns], close) views for ``symbol`` between two dates."""
+        bounds = self._index.get(str(symbol).strip().upper())
+        if bounds is None:
+            raise KeyError(symbol)
+        timestamps = self._timestamps[bounds[0]:bounds[1]].view("datetime64[ns]")
+        close = self._close[bounds[0]:bounds[1]]
+        first, last = _date_range(timestamps, start, end)
+        return timestamps[first:last], close[first:last]
+
+
+class ParquetPriceSource:
+    """Parquet price file read through a memory map, one symbol at a time."""
+
+    def __init__(self, path):
+        import pyarrow.parquet as pq
+
+        self.path = path
+        try:
+            self._file = pq.ParquetFile(path, memory_map=True)
+        except (OSError, ValueError) as error:
+            raise PriceFileError(f"Could not open price file {path}: {error}") from None
+        self._columns = {}
+        for name in self._file.schema_arrow.names:
+            canonical = _canonical_price_column(name)
+            if canonical is not None and canonical not in self._columns:
+                self._columns[canonical] = name
+        missing = {"timestamp", "close"} - set(self._columns)
+        if missing:
+            raise PriceFileError(f"Missing column(s): {', '.join(sorted(missing))}")
+        self._symbols = None
+
+    def symbols(self):
+        """Symbols in the file, or an empty list for a single-series file."""
+        if "symbol" not in self._columns:
+            return []
+        return sorted(self._symbol_values())
+
+    def _symbol_values(self):
+        # Normalized symbol -> value as spelled in the file, read once
+        if self._symbols is None:
+            column = self._file.read(columns=[self._columns["symbol"]]).column(0)
+            self._symbols = {str(value).strip().upper(): value for value in column.unique().to_pylist()}
+        return self._symbols
+
+    def series(self, symbol, start=None, end=None):
+        """Return (timestamps as datetime64[ns], close) arrays for ``symbol`` between two dates."""
+        import pyarrow.parquet as pq
+
+        filters = None
+        if "symbol" in self._columns:
+            value = self._symbol_values().get(str(symbol).strip().upper())
+            if value is None:
+                raise KeyError(symbol)
+            filters = [(self._columns["symbol"], "==", value)]
+        table = pq.read_table(self.path, columns=[self._columns["timestamp"], self._columns["close"]],
+                              filters=filters, memory_map=True)
+        timestamps = np.asarray(table.column(0).to_numpy(), dtype="datetime64[ns]")
+        close = table.column(1).to_numpy().astype(np.float64)
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, close = timestamps[order], close[order]
+        first, last = _date_range(timestamps, start, end)
+        return timestamps[first:last], close[first:last]
+
+
+def _date_range(timestamps, start, end):
+    # Row bounds of [start, end] in sorted datetime64[ns] timestamps, by binary search
+    first = 0 if start is None else int(np.searchsorted(timestamps, np.datetime64(start, "ns"), side="left"))
+    last = len(timestamps) if end is None else int(np.searchsorted(timestamps, np.datetime64(end, "ns"), side="right"))
+    return first, last
+
+
+def open_price_source(path):
+    """Open a price directory or Parquet file by path."""
+    if os.path.isdir(path):
+        return MemmapPriceSource(path)
+    if detect_format(path) == "parquet":
+        return ParquetPriceSource(path)
+    raise PriceFileError("CSV price files cannot be memory-mapped; convert them with "
+                         "`python -m calqtrade.prices <file> <directory>` first")
+
+
+def _price_index(path):
+    # A price directory is replaced by rewriting its index last
+    return os.path.join(path, "index.json") if os.path.isdir(path) else path
+
+
+# Open sources (memory maps, Parquet metadata) shared by every session
+PRICE_SOURCES = SharedFileCache("price_sources", open_price_source, watch=_price_index)
+
+
+def configured_price_paths():
+    """Price files and directories listed in $CALQTRADE_PRICE_PATH, in order."""
+    return [path for path in os.environ.get(PRICE_PATH_ENV, "").split(os.pathsep) if path]
+
+
+def cached_price_source(path):
+    """Process-wide source for ``path``, reopened when the file or directory index changes."""
+    try:
+        return PRICE_SOURCES.get(path)
+    except OSError as error:
+        raise PriceFileError(f"Could not open price data {path}: {error}") from None
+
+
+def mark_to_market(close, quantity, total_cost, day_trade, schedule=None):
+    """Unrealized P&L and distance to B.E.S of a position at each close.
+
+    Returns a dict of arrays keyed by MTM_FIELDS.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    bes = bes_price(total_cost, total_cost / quantity, quantity, day_trade, schedule)
+    market_value, sell_fee, proceeds = sell_side(close, quantity, day_trade, schedule)
+    unrealized_gain = proceeds - total_cost
+    distance_to_bes = close - bes
+    return dict(zip(MTM_FIELDS, (
+        close,
+        market_value,
+        sell_fee,
+        proceeds,
+        unrealized_gain,
+        _safe_div(unrealized_gain, total_cost, 100),
+        distance_to_bes,
+        _safe_div(distance_to_bes, bes, 100),
+    )))
+
+
+def mtm_curve(source, symbol, quantity, total_cost, day_trade, schedule=None, start=None, end=None,
+              max_points=MAX_CHART_POINTS):
+    """Timestamps and mark_to_market columns at up to ``max_points`` evenly spaced bars."""
+    timestamps, close = source.series(symbol, start, end)
+    if len(timestamps) > max_points:
+        # Only the sampled rows are read from the memory map
+        rows = np.linspace(0, len(timestamps) - 1, max_points).astype(np.int64)
+        timestamps, close = timestamps[rows], close[rows]
+    return np.asarray(timestamps), mark_to_market(close, quantity, total_cost, day_trade, schedule)
+
+
+def mtm_summary(source, symbol, quantity, total_cost, day_trade, schedule=None, start=None, end=None,
+                chunk=SUMMARY_CHUNK):
+    """Best, worst and latest unrealized P&L and share of bars at or above B.E.S, streamed in chunks."""
+    timestamps, close = source.series(symbol, start, end)
+    bars = len(close)
+    if not bars:
+        return None
+    best = -np.inf
+    worst = np.inf
+    above = 0
+    for offset in range(0, bars, chunk):
+        columns = mark_to_market(close[offset:offset + chunk], quantity, total_cost, day_trade, schedule)
+        best = max(best, float(columns["unrealized_gain"].max()))
+        worst = min(worst, float(columns["unrealized_gain"].min()))
+        above += int(np.count_nonzero(columns["distance_to_bes"] >= 0))
+    latest = mark_to_market(close[-1:], quantity, total_cost, day_trade, schedule)
+    return {
+        "bars": bars,
+        "first": timestamps[0],
+        "last": timestamps[-1],
+        "best_unrealized_gain": best,
+        "worst_unrealized_gain": worst,
+        "latest_unrealized_gain": float(latest["unrealized_gain"][0]),
+        "pct_bars_above_bes": above / bars * 100,
+    }
+
+
+@lru_cache(maxsize=MTM_CACHE_SIZE)
+def _cached_mark_to_market(path, signature, symbol, quantity, total_cost, day_trade, schedule, start, end):
+    # ``signature`` is that of the source's file, so reopened price data is a new entry
+    source = cached_price_source(path)
+    summary = mtm_summary(source, symbol, quantity, total_cost, day_trade, schedule, start, end)
+    if summary is None:
+        return None, None, None
+    timestamps, curve = mtm_curve(source, symbol, quantity, total_cost, day_trade, schedule, start, end)
+    # Shared by every session, so nobody may write into the arrays
+    for column in (timestamps, *curve.values()):
+        column.flags.writeable = False
+    return summary, timestamps, curve
+
+
+def cached_mark_to_market(path, symbol, quantity, total_cost, day_trade, schedule=None, start=None, end=None):
+    """(summary, timestamps, curve) of mtm_summary and mtm_curve over the price data at ``path``.
+
+    Memoized per process on the position and date range until the source
+    is reopened for a changed file; all three are None when the range has
+    no bars.
+    """
+    try:
+        _, signature = PRICE_SOURCES.get_versioned(path)
+    except OSError as error:
+        raise PriceFileError(f"Could not open price data {path}: {error}") from None
+    summary, timestamps, curve = _cached_mark_to_market(path, signature, symbol, quantity, total_cost, day_trade,
+                                                        schedule, start, end)
+    if summary is None:
+        return None, None, None
+    return dict(summary), timestamps, dict(curve)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m calqtrade.prices",
+        description="Build a memory-mapped price directory from a CSV or Parquet price file",
+    )
+    parser.add_argument("input", help="File with symbol, date/timestamp and close columns")
+    parser.add_argument("output", help="Directory to write")
+    parser.add_argument("--symbol", help="Symbol for a file without a symbol column")
+    parser.add_argument("-c", "--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows per chunk")
+    args = parser.parse_args(argv)
+    try:
+        rows = build_price_directory(args.input, args.output, args.symbol, chunksize=args.chunksize)
+    except (OSError, ValueError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    print(f"Wrote {rows:,} bars to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Process-wide reference data loaded from files and shared by every session.
+
+Fee schedules, price sources and symbol metadata are read from files
+named in the environment. Each kind is held in one SharedFileCache per
+process, so concurrent Streamlit sessions read the same loaded objects
+instead of keeping per-session copies::
+
+    FEE_SCHEDULE_FILES = SharedFileCache("fee_schedules", load_fee_schedules)
+    schedules = FEE_SCHEDULE_FILES.get(path)
+
+A cached value is served without touching the disk for ``ttl`` seconds;
+after that the file's modification time and size are checked again and
+the value is reloaded only if they changed. A reload that fails (say a
+half-written file), or a file that is deleted, keeps serving the last
+good value until the file is fixed; the error is kept in ``errors()``.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds a loaded value is trusted before its file is checked for changes
+DEFAULT_TTL = 5.0
+DEFAULT_MAXSIZE = 8
+
+SHARED_CACHES = {}
+
+
+def file_signature(path):
+    """(modification time in ns, size) of ``path``; raises OSError if it cannot be read."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class SharedFileCache:
+    """Thread-safe LRU of ``load(path)`` results, invalidated when the file changes.
+
+    ``watch(path)`` names the file whose changes invalidate ``path``
+    (a directory's index file, for instance); by default it is ``path``.
+    """
+
+    def __init__(self, name, load, ttl=DEFAULT_TTL, maxsize=DEFAULT_MAXSIZE, watch=None):
+        if name in SHARED_CACHES:
+            raise ValueError(f"Duplicate shared cache: {name}")
+        self.name = name
+        self.load = load
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.watch = watch or (lambda path: path)
+        # path -> [value, signature, checked at, error of the last failed reload, signature loaded]
+        self._entries = OrderedDict()
+        # Held while loading too, so concurrent sessions load a file once
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        SHARED_CACHES[name] = self
+
+    def get(self, path):
+        """The value loaded from ``path``, loading or reloading it if needed."""
+        return self.get_versioned(path)[0]
+
+    def get_versioned(self, path):
+        """(value, signature) of ``path``, the signature being that of the file the value was loaded from."""
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(path)
+            if entry is not None and now - entry[2] < self.ttl:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[0], entry[4]
+            try:
+                signature = file_signature(self.watch(path))
+            except OSError as error:
+                if entry is None:
+                    raise
+                # A deleted or unreadable file keeps serving the last good value too
+                entry[2], entry[3] = now, error
+                return entry[0], entry[4]
+            if entry is not None and entry[1] == signature:
+                entry[2] = now
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[0], entry[4]
+            try:
+                value = self.load(path)
+            except Exception as error:
+                if entry is None:
+                    raise
+                # Serve the last good value and retry once the file changes again
+                entry[1], entry[2], entry[3] = signature, now, error
+                return entry[0], entry[4]
+            if entry is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+            self._entries[path] = [value, signature, now, None, signature]
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return value, signature
+
+    def invalidate(self, path=None):
+        """Drop ``path``, or every entry, so the next get() loads it again."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+    def errors(self):
+        """{path: error} for files whose latest reload failed."""
+        with self._lock:
+            return {path: entry[3] for path, entry in self._entries.items() if entry[3] is not None}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "currsize": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
+
+
+def shared_cache_stats():
+    """Hit/miss/reload counters of every shared file cache, by name."""
+    return {name: cache.stats() for name, cache in SHARED_CACHES.items()}
+
+
+def clear_shared_caches():
+    for cache in SHARED_CACHES.values():
+        cache.invalidate()
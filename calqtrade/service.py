@@ -0,0 +1,336 @@
+"""Headless HTTP/JSON calculation service.
+
+Exposes the same formulas as the Streamlit tabs without importing
+Streamlit::
+
+    python -m calqtrade.service --host 127.0.0.1 --port 8000
+
+Endpoints (POST, JSON body):
+
+- ``/trade``         one trade (tab 1): buy_price, sell_price, quantity, trading_type
+- ``/trades``        many trades as columns: {"buy_price": [...], "sell_price": [...], ...}
+- ``/break-even``    B.E.S price (tab 2): buy_price, quantity, trading_type
+- ``/target-price``  sell price for a profit % (tab 2): buy_price, quantity, trading_type, target_pct
+- ``/average``       multi-lot averaging (tab 3): price, quantity (lists), trading_type
+
+Every endpoint accepts ``"exact": true`` to use integer-cent arithmetic.
+``GET /health`` returns {"status": "ok"}. ``GET /metrics`` (Prometheus text)
+and ``GET /metrics.json`` return latency histograms of every endpoint.
+
+Concurrent ``/trade`` requests are collected into micro-batches and
+evaluated with one vectorized engine call.
+"""
+import argparse
+import asyncio
+import json
+import math
+from http import HTTPStatus
+
+import numpy as np
+
+from calqtrade.cache import cached_break_even, cached_profit_targets
+from calqtrade.engine import calculate_trades, is_day_trade
+from calqtrade.fixedpoint import exact_trades
+from calqtrade.ledger import PurchaseLedger
+from calqtrade.metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY, timed
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+
+MAX_BATCH_SIZE = 4096
+# How long the batcher waits for more /trade requests before evaluating
+BATCH_WINDOW = 0.001
+MAX_BODY_SIZE = 64 * 1024 * 1024
+
+
+class BadRequest(ValueError):
+    """Raised for a request body that cannot be evaluated."""
+
+
+def _field(payload, name):
+    if name not in payload:
+        raise BadRequest(f"Missing field: {name}")
+    return payload[name]
+
+
+def _columns(result):
+    return {name: np.asarray(values).tolist() for name, values in result.items()}
+
+
+class TradeBatcher:
+    """Collects single-trade requests and evaluates them in vectorized batches."""
+
+    def __init__(self, max_batch_size=MAX_BATCH_SIZE, window=BATCH_WINDOW):
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.trades = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, buy_price, sell_price, quantity, day_trade, exact):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(((buy_price, sell_price, quantity, day_trade, exact), future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        if self.window:
+            await asyncio.sleep(self.window)
+        while len(batch) < self.max_batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            self.batches += 1
+            self.trades += len(batch)
+            for exact in (False, True):
+                items = [(inputs, future) for inputs, future in batch if inputs[4] is exact]
+                if items:
+                    self._evaluate(items, exact)
+
+    @classmethod
+    def _evaluate(cls, items, exact):
+        try:
+            buy_price, sell_price, quantity, day_trade, _ = zip(*(inputs for inputs, _ in items))
+            calculate = exact_trades if exact else calculate_trades
+            result = calculate(buy_price, sell_price, quantity, np.array(day_trade, dtype=bool))
+            rows = zip(*(column.tolist() for column in result.values()))
+        except Exception as error:
+            if len(items) > 1:
+                # One bad trade (e.g. an exact-mode overflow) must not fail the
+                # rest of its batch: retry them one at a time
+                for item in items:
+                    cls._evaluate([item], exact)
+                return
+            _, future = items[0]
+            if not future.done():
+                future.set_exception(error)
+            return
+        for (_, future), row in zip(items, rows):
+            if not future.done():
+                future.set_result(dict(zip(result, row)))
+
+
+def _validate_trade(payload):
+    buy_price = float(_field(payload, "buy_price"))
+    sell_price = float(_field(payload, "sell_price"))
+    quantity = int(_field(payload, "quantity"))
+    if not (math.isfinite(buy_price) and math.isfinite(sell_price)):
+        raise BadRequest("Prices must be finite numbers")
+    if buy_price < 0 or sell_price < 0 or quantity < 1:
+        raise BadRequest("Prices must be non-negative and quantity at least 1")
+    return buy_price, sell_price, quantity
+
+
+async def handle_trade(service, payload):
+    buy_price, sell_price, quantity = _validate_trade(payload)
+    day_trade = is_day_trade(_field(payload, "trading_type"))
+    return await service.batcher.submit(buy_price, sell_price, quantity, bool(day_trade),
+                                        bool(payload.get("exact", False)))
+
+
+async def handle_trades(service, payload):
+    calculate = exact_trades if payload.get("exact") else calculate_trades
+    quantity = np.asarray(_field(payload, "quantity"), dtype=np.int64)
+    if np.any(quantity < 1):
+        raise BadRequest("Quantity must be at least 1")
+    result = calculate(
+        _field(payload, "buy_price"),
+        _field(payload, "sell_price"),
+        quantity,
+        _field(payload, "trading_type"),
+    )
+    return _columns(result)
+
+
+async def handle_break_even(service, payload):
+    buy_price = float(_field(payload, "buy_price"))
+    quantity = int(_field(payload, "quantity"))
+    if buy_price <= 0 or quantity < 1:
+        raise BadRequest("Buy price must be positive and quantity at least 1")
+    day_trade = bool(is_day_trade(_field(payload, "trading_type")))
+    return cached_break_even(buy_price, quantity, day_trade, bool(payload.get("exact", False)))._asdict()
+
+
+async def handle_target_price(service, payload):
+    buy_price = float(_field(payload, "buy_price"))
+    quantity = int(_field(payload, "quantity"))
+    if buy_price <= 0 or quantity < 1:
+        raise BadRequest("Buy price must be positive and quantity at least 1")
+    day_trade = bool(is_day_trade(_field(payload, "trading_type")))
+    target_pct = _field(payload, "target_pct")
+    targets = tuple(float(value) for value in (target_pct if isinstance(target_pct, list) else [target_pct]))
+    rows = cached_profit_targets(buy_price, quantity, day_trade, targets, bool(payload.get("exact", False)))
+    return {"targets": [row._asdict() for row in rows]}
+
+
+async def handle_average(service, payload):
+    price = np.asarray(_field(payload, "price"), dtype=np.float64)
+    quantity = np.asarray(_field(payload, "quantity"), dtype=np.int64)
+    if price.shape != quantity.shape or price.ndim != 1 or not len(price):
+        raise BadRequest("price and quantity must be non-empty lists of the same length")
+    if np.any(price <= 0) or np.any(quantity < 1):
+        raise BadRequest("Prices must be positive and quantities at least 1")
+    trading_type = _field(payload, "trading_type")
+    ledger = PurchaseLedger()
+    ledger.extend(price, quantity)
+    if payload.get("exact"):
+        total_buy_value, total_buy_fees, total_cost, overall_avg_price, simple_weighted_avg = ledger.exact_totals()
+        bes = ledger.exact_bes_price(trading_type)
+    else:
+        total_buy_value = ledger.total_buy_value
+        total_buy_fees = ledger.total_buy_fees
+        total_cost = ledger.total_cost
+        overall_avg_price = ledger.overall_avg_price
+        simple_weighted_avg = ledger.simple_weighted_avg
+        bes = ledger.bes_price(trading_type)
+    return {
+        "total_quantity": ledger.total_quantity,
+        "total_buy_value": total_buy_value,
+        "total_buy_fees": total_buy_fees,
+        "total_cost": total_cost,
+        "overall_avg_price": overall_avg_price,
+        "simple_weighted_avg": simple_weighted_avg,
+        "bes_price": bes,
+    }
+
+
+ROUTES = {
+    "/trade": handle_trade,
+    "/trades": handle_trades,
+    "/break-even": handle_break_even,
+    "/target-price": handle_target_price,
+    "/average": handle_average,
+}
+
+
+class CalculationService:
+    """asyncio HTTP/1.1 server (keep-alive, JSON bodies) around the calculation core."""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, batch_window=BATCH_WINDOW):
+        self.host = host
+        self.port = port
+        self.batch_window = batch_window
+        self.batcher = None
+        self.server = None
+        self._writers = set()
+
+    async def start(self):
+        self.batcher = TradeBatcher(window=self.batch_window)
+        self.batcher.start()
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        return self.server
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            # Close idle keep-alive connections so their handlers finish cleanly
+            for writer in list(self._writers):
+                writer.close()
+            await self.server.wait_closed()
+        if self.batcher is not None:
+            await self.batcher.stop()
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def dispatch(self, method, path, body):
+        """Return (status, payload) for one request; a str payload is sent as Prometheus text."""
+        if method == "GET" and path == "/health":
+            return HTTPStatus.OK, {"status": "ok"}
+        if method == "GET" and path == "/metrics":
+            return HTTPStatus.OK, REGISTRY.to_prometheus()
+        if method == "GET" and path == "/metrics.json":
+            return HTTPStatus.OK, {"sections": REGISTRY.snapshot()}
+        handler = ROUTES.get(path)
+        if handler is None:
+            return HTTPStatus.NOT_FOUND, {"error": f"Unknown endpoint: {path}"}
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Use POST with a JSON body"}
+        try:
+            with timed(f"service{path}"):
+                payload = json.loads(body or b"{}")
+                if not isinstance(payload, dict):
+                    raise BadRequest("Request body must be a JSON object")
+                return HTTPStatus.OK, await handler(self, payload)
+        except (ValueError, TypeError, OverflowError) as error:
+            return HTTPStatus.BAD_REQUEST, {"error": str(error)}
+
+    async def _handle_connection(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split(maxsplit=2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_SIZE:
+                    status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Request body too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.dispatch(method, path.split("?", 1)[0], body)
+                    keep_alive = (headers.get("connection", "").lower() != "close"
+                                  and version.strip().upper() == "HTTP/1.1")
+                if isinstance(payload, str):
+                    response, content_type = payload.encode(), PROMETHEUS_CONTENT_TYPE
+                else:
+                    response, content_type = json.dumps(payload).encode(), "application/json"
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(response)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+                    + response
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CalqTrade headless calculation service")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--batch-window", type=float, default=BATCH_WINDOW,
+                        help="Seconds to wait for more /trade requests before evaluating a batch")
+    args = parser.parse_args(argv)
+    service = CalculationService(args.host, args.port, args.batch_window)
+    print(f"CalqTrade service listening on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Monte Carlo outcome simulator for the Break-Even tab.
+
+Price paths follow geometric Brownian motion from the buy price. Paths are
+drawn as (paths × steps) blocks of normal increments and accumulated with
+one cumsum per block, so only each path's running maximum and final log
+return are kept. From those the simulator reports, for every sell price
+asked about, the probability that a path touches it before the horizon
+and the probability that it finishes at or above it. The Break-Even tab
+asks about B.E.S and its profit target prices as they are: B.E.S covers
+the sell fee, but under the standard fees day-trade targets leave it out
+(see calqtrade.engine.target_sell_price), so touching one of those does
+not guarantee the target profit after fees.
+
+Large runs are split into fixed-size tasks, each with its own child seed
+from one SeedSequence, and fanned out over a process pool; a given seed
+returns the same result whatever the number of workers. A run is capped
+at MAX_DRAWS normal draws (paths × steps per day × horizon days).
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing import get_context
+
+import numpy as np
+
+from calqtrade.engine import buy_side, sell_side
+
+TRADING_DAYS_PER_YEAR = 252
+DEFAULT_PATHS = 100_000
+# Paths per task handed to a worker; also fixes how seeds are split
+TASK_PATHS = 125_000
+# Normal draws held in memory per block within a task (16 MB of float64)
+BLOCK_ELEMENTS = 2_000_000
+# Smaller runs stay in-process, where they finish before a pool would start
+PARALLEL_MIN_PATHS = 250_000
+# Largest run accepted, about ten seconds of work on one core
+MAX_DRAWS = 250_000_000
+GAIN_PERCENTILES = (5, 50, 95)
+
+Simulation = namedtuple("Simulation", (
+    "paths",
+    "sell_prices",
+    "touch_probability",   # per sell price: path reaches it at any step
+    "finish_probability",  # per sell price: path ends at or above it
+    "profit_probability",  # proceeds at the horizon cover total cost
+    "expected_gain",       # mean gain/loss selling everything at the horizon
+    "gain_percentiles",    # gain/loss at GAIN_PERCENTILES
+))
+
+
+class SimulationError(ValueError):
+    """Raised for a simulation with no paths or steps, or too many draws."""
+
+
+def _simulate_task(seed, paths, steps, drift_step, volatility_step):
+    # (running max, final) log return of ``paths`` GBM paths, as float32
+    generator = np.random.default_rng(seed)
+    rows = max(1, BLOCK_ELEMENTS // steps)
+    path_max = np.empty(paths, dtype=np.float32)
+    final = np.empty(paths, dtype=np.float32)
+    block = np.empty((min(rows, paths), steps), dtype=np.float64)
+    for start in range(0, paths, rows):
+        count = min(rows, paths - start)
+        draws = block[:count]
+        generator.standard_normal(out=draws)
+        draws *= volatility_step
+        draws += drift_step
+        np.cumsum(draws, axis=1, out=draws)
+        # The path starts at the buy price, so its maximum is at least 0
+        path_max[start:start + count] = np.maximum(draws.max(axis=1), 0.0)
+        final[start:start + count] = draws[:, -1]
+    return path_max, final
+
+
+@lru_cache(maxsize=None)
+def _executor(workers):
+    # One long-lived pool per worker count; spawned so workers never inherit
+    # the locks of a threaded parent such as the Streamlit server
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+
+
+def simulate_log_returns(paths, horizon_days, volatility_pct, drift_pct=0.0, steps_per_day=1, seed=None,
+                         workers=None):
+    """Running-max and final log returns of GBM paths over ``horizon_days`` trading days."""
+    steps = int(horizon_days * steps_per_day)
+    if paths < 1 or steps < 1:
+        raise SimulationError("Need at least one path and one step")
+    if paths * steps > MAX_DRAWS:
+        raise SimulationError(f"{paths:,} paths of {steps:,} steps is more than {MAX_DRAWS:,} draws; "
+                              "use fewer paths, steps per day or days")
+    dt = 1 / (TRADING_DAYS_PER_YEAR * steps_per_day)
+    volatility = volatility_pct / 100
+    drift_step = (drift_pct / 100 - volatility ** 2 / 2) * dt
+    volatility_step = volatility * np.sqrt(dt)
+
+    sizes = [TASK_PATHS] * (paths // TASK_PATHS) + ([paths % TASK_PATHS] if paths % TASK_PATHS else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(child, size, steps, drift_step, volatility_step) for child, size in zip(seeds, sizes)]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers == 1 or paths < PARALLEL_MIN_PATHS:
+        results = [_simulate_task(*task) for task in tasks]
+    else:
+        results = list(_executor(workers).map(_simulate_task, *zip(*tasks)))
+    return np.concatenate([result[0] for result in results]), np.concatenate([result[1] for result in results])
+
+
+def simulate_outcomes(buy_price, quantity, day_trade, sell_prices, volatility_pct, drift_pct=0.0, horizon_days=20,
+                      steps_per_day=1, paths=DEFAULT_PATHS, schedule=None, seed=None, workers=None):
+    """Probability of reaching each of ``sell_prices`` for a position bought at ``buy_price``.
+
+    Touch and finish probabilities come from binary searches of the sorted
+    simulated returns; gain/loss at the horizon is net of the day or swing
+    sell fee. Returns a Simulation.
+    """
+    path_max, final = simulate_log_returns(paths, horizon_days, volatility_pct, drift_pct, steps_per_day, seed,
+                                           workers)
+    path_max.sort()
+    final.sort()
+    thresholds = np.log(np.asarray(sell_prices, dtype=np.float64) / buy_price).astype(np.float32)
+    touch = 1 - np.searchsorted(path_max, thresholds, side="left") / paths
+    finish = 1 - np.searchsorted(final, thresholds, side="left") / paths
+
+    total_cost = buy_side(buy_price, quantity, schedule)[3]
+    _, _, proceeds = sell_side(buy_price * np.exp(final.astype(np.float64)), quantity, day_trade, schedule)
+    gain = proceeds - total_cost
+    # Gain rises with the final price, so ``gain`` is already sorted
+    return Simulation(
+        paths,
+        np.asarray(sell_prices, dtype=np.float64),
+        touch,
+        finish,
+        float(np.count_nonzero(gain >= 0) / paths),
+        float(gain.mean()),
+        tuple(float(gain[min(int(pct / 100 * paths), paths - 1)]) for pct in GAIN_PERCENTILES),
+    )
@@ -0,0 +1,313 @@
+"""Durable SQLite purchase ledger behind the Multi Purchase tab.
+
+Lots live in one ``purchases`` table indexed by (symbol, id). Ids are
+handed out in purchase order and never reused, so a symbol's lots come
+back in purchase order straight from the index, and a lot is always
+addressed by its id: deleting or editing a lot another session already
+removed raises LedgerConflictError instead of touching a different one.
+The database runs in WAL mode, batches of lots are written with one
+``executemany`` per transaction, and a ``symbol_totals`` row per symbol
+(lots, quantity, buy value, and buy value/fee in cents) is updated in the
+same transaction. Opening a large saved book only reads those aggregate
+rows; a symbol's lots are read when it is first used.
+
+Every write also bumps the symbol's revision, so a reader can tell when
+another session (or process) has changed a symbol since it last read it.
+Persistence is off unless $CALQTRADE_LEDGER_PATH names a database file,
+and every session pointed at that file shares one book.
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+from calqtrade.fixedpoint import purchase_units, to_minor
+
+# Database file shared by every session; unset or empty keeps purchases in memory only
+LEDGER_PATH_ENV = "CALQTRADE_LEDGER_PATH"
+
+AGGREGATE_FIELDS = ("lots", "total_quantity", "total_buy_value", "total_buy_value_cents", "total_buy_fee_cents")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS purchases (
+    id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    -- When the lot was written to the store (the app has no trade date); not queried
+    purchased_at TEXT NOT NULL,
+    price REAL NOT NULL,
+    quantity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_purchases_symbol_id ON purchases (symbol, id);
+DROP INDEX IF EXISTS idx_purchases_date;
+CREATE TABLE IF NOT EXISTS symbol_totals (
+    symbol TEXT PRIMARY KEY,
+    lots INTEGER NOT NULL,
+    total_quantity INTEGER NOT NULL,
+    total_buy_value REAL NOT NULL,
+    total_buy_value_cents INTEGER NOT NULL,
+    total_buy_fee_cents INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS symbol_revisions (
+    symbol TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ledger_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Lots of one symbol in purchase order, served by idx_purchases_symbol_id
+_LOT_ORDER = "ORDER BY id"
+
+_STAGED = "id IN (SELECT id FROM staged_ids)"
+
+
+class LedgerConflictError(ValueError):
+    """Raised when lots to change are no longer in the store, removed by another session."""
+
+
+def _timestamp():
+    return datetime.now().isoformat(timespec="microseconds")
+
+
+class LedgerStore:
+    """SQLite ledger shared by every session in the process.
+
+    One connection is guarded by a lock, so Streamlit's script threads can
+    share it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # WAL makes NORMAL durable against application crashes
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _transaction(self, work):
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(connection)
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+            return result
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def _read(self, work):
+        # Several queries against one snapshot of the database
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN")
+            try:
+                return work(connection)
+            finally:
+                connection.execute("COMMIT")
+
+    @staticmethod
+    def _add_totals(connection, symbol, price, quantity, sign):
+        buy_value_cents, buy_fee_cents, _ = purchase_units(to_minor(price), quantity)
+        row = (
+            sign * len(price),
+            sign * int(np.sum(quantity)),
+            sign * float(np.sum(price * quantity)),
+            sign * int(np.sum(buy_value_cents)),
+            sign * int(np.sum(buy_fee_cents)),
+        )
+        connection.execute(
+            "INSERT INTO symbol_totals VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (symbol) DO UPDATE SET "
+            "lots = lots + excluded.lots, "
+            "total_quantity = total_quantity + excluded.total_quantity, "
+            "total_buy_value = total_buy_value + excluded.total_buy_value, "
+            "total_buy_value_cents = total_buy_value_cents + excluded.total_buy_value_cents, "
+            "total_buy_fee_cents = total_buy_fee_cents + excluded.total_buy_fee_cents",
+            (symbol, *row),
+        )
+        connection.execute("DELETE FROM symbol_totals WHERE symbol = ? AND lots <= 0", (symbol,))
+
+    @staticmethod
+    def _bump(connection, symbol):
+        # Next revision of ``symbol``, recorded with the write that caused it
+        connection.execute(
+            "INSERT INTO symbol_revisions VALUES (?, 1) "
+            "ON CONFLICT (symbol) DO UPDATE SET revision = revision + 1",
+            (symbol,),
+        )
+        return connection.execute("SELECT revision FROM symbol_revisions WHERE symbol = ?", (symbol,)).fetchone()[0]
+
+    @staticmethod
+    def _allocate_ids(connection, count):
+        # Ids after every one handed out so far, so a deleted lot's id is never reused
+        row = connection.execute("SELECT value FROM ledger_meta WHERE key = 'last_lot_id'").fetchone()
+        last = max(row[0] if row else 0,
+                   connection.execute("SELECT COALESCE(MAX(id), 0) FROM purchases").fetchone()[0])
+        connection.execute(
+            "INSERT INTO ledger_meta VALUES ('last_lot_id', ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (last + count,),
+        )
+        return np.arange(last + 1, last + count + 1, dtype=np.int64)
+
+    @staticmethod
+    def _stage(connection, symbol, ids):
+        # Load ``ids`` into a temporary table and return the (price, quantity)
+        # arrays of those lots; raises LedgerConflictError if any is missing
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        connection.execute("CREATE TEMP TABLE IF NOT EXISTS staged_ids (id INTEGER PRIMARY KEY)")
+        connection.execute("DELETE FROM staged_ids")
+        connection.executemany("INSERT INTO staged_ids VALUES (?)", zip(ids.tolist()))
+        rows = connection.execute(
+            f"SELECT id, price, quantity FROM purchases WHERE symbol = ? AND {_STAGED} {_LOT_ORDER}", (symbol,)
+        ).fetchall()
+        if len(rows) != len(ids):
+            raise LedgerConflictError(f"{len(ids) - len(rows):,} of the {symbol} lots were removed in another session")
+        _, price, quantity = zip(*rows) if rows else ((), (), ())
+        return np.array(price, dtype=np.float64), np.array(quantity, dtype=np.int64)
+
+    @classmethod
+    def _insert(cls, connection, symbol, ids, price, quantity, purchased_at):
+        try:
+            connection.executemany(
+                "INSERT INTO purchases (id, symbol, purchased_at, price, quantity) VALUES (?, ?, ?, ?, ?)",
+                zip(ids.tolist(), [symbol] * len(ids), [purchased_at] * len(ids), price.tolist(), quantity.tolist()),
+            )
+        except sqlite3.IntegrityError:
+            raise LedgerConflictError(f"Some of the {symbol} lots to restore are already in the book") from None
+        cls._add_totals(connection, symbol, price, quantity, 1)
+
+    def insert(self, symbol, price, quantity, purchased_at=None):
+        """Append lots of one symbol (price and quantity arrays) in one transaction; returns (ids, revision)."""
+        return self.insert_groups([(symbol, price, quantity)], purchased_at)[0]
+
+    def insert_groups(self, groups, purchased_at=None):
+        """Append (symbol, price, quantity) groups of lots in a single transaction.
+
+        Returns the new lots' ids and the symbol's revision after the write, one (ids, revision) per group.
+        """
+        purchased_at = purchased_at or _timestamp()
+
+        def work(connection):
+            written = []
+            for symbol, price, quantity in groups:
+                price = np.atleast_1d(np.asarray(price, dtype=np.float64))
+                quantity = np.atleast_1d(np.asarray(quantity, dtype=np.int64))
+                ids = self._allocate_ids(connection, len(price))
+                if len(price):
+                    self._insert(connection, symbol, ids, price, quantity, purchased_at)
+                written.append((ids, self._bump(connection, symbol)))
+            return written
+
+        return self._transaction(work)
+
+    def restore(self, symbol, ids, price, quantity, purchased_at=None):
+        """Put back lots under the ids they had before; returns the symbol's revision."""
+
+        def work(connection):
+            self._insert(connection, symbol, np.atleast_1d(np.asarray(ids, dtype=np.int64)),
+                         np.atleast_1d(np.asarray(price, dtype=np.float64)),
+                         np.atleast_1d(np.asarray(quantity, dtype=np.int64)), purchased_at or _timestamp())
+            return self._bump(connection, symbol)
+
+        return self._transaction(work)
+
+    def delete(self, symbol, ids):
+        """Delete the lots of ``symbol`` with ``ids``; returns the symbol's revision."""
+
+        def work(connection):
+            price, quantity = self._stage(connection, symbol, ids)
+            connection.execute(f"DELETE FROM purchases WHERE {_STAGED}")
+            self._add_totals(connection, symbol, price, quantity, -1)
+            return self._bump(connection, symbol)
+
+        return self._transaction(work)
+
+    def update(self, symbol, ids, price, quantity):
+        """Change the price and quantity of the lots of ``symbol`` with ``ids``; returns the symbol's revision."""
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        price = np.broadcast_to(np.asarray(price, dtype=np.float64), ids.shape)
+        quantity = np.broadcast_to(np.asarray(quantity, dtype=np.int64), ids.shape)
+
+        def work(connection):
+            old_price, old_quantity = self._stage(connection, symbol, ids)
+            connection.executemany("UPDATE purchases SET price = ?, quantity = ? WHERE id = ?",
+                                   zip(price.tolist(), quantity.tolist(), ids.tolist()))
+            self._add_totals(connection, symbol, old_price, old_quantity, -1)
+            self._add_totals(connection, symbol, price, quantity, 1)
+            return self._bump(connection, symbol)
+
+        return self._transaction(work)
+
+    def clear_symbol(self, symbol):
+        """Delete every lot of ``symbol``; returns its revision."""
+
+        def work(connection):
+            connection.execute("DELETE FROM purchases WHERE symbol = ?", (symbol,))
+            connection.execute("DELETE FROM symbol_totals WHERE symbol = ?", (symbol,))
+            return self._bump(connection, symbol)
+
+        return self._transaction(work)
+
+    def clear(self):
+        def work(connection):
+            connection.execute("DELETE FROM purchases")
+            connection.execute("DELETE FROM symbol_totals")
+            connection.execute("UPDATE symbol_revisions SET revision = revision + 1")
+
+        self._transaction(work)
+
+    def aggregates(self):
+        """Precomputed per-symbol rows: {symbol: dict keyed by AGGREGATE_FIELDS, plus its ``revision``}."""
+        rows = self._query(
+            f"SELECT symbol, {', '.join(AGGREGATE_FIELDS)}, COALESCE(revision, 0) "
+            "FROM symbol_totals LEFT JOIN symbol_revisions USING (symbol) ORDER BY symbol"
+        )
+        return {row[0]: dict(zip((*AGGREGATE_FIELDS, "revision"), row[1:])) for row in rows}
+
+    def revisions(self):
+        """{symbol: revision} of every symbol ever written."""
+        return dict(self._query("SELECT symbol, revision FROM symbol_revisions"))
+
+    def load_lots(self, symbol):
+        """Return (ids, price, quantity) arrays of every lot of ``symbol`` in purchase order, and its revision."""
+
+        def work(connection):
+            rows = connection.execute(
+                f"SELECT id, price, quantity FROM purchases WHERE symbol = ? {_LOT_ORDER}", (symbol,)
+            ).fetchall()
+            revision = connection.execute("SELECT revision FROM symbol_revisions WHERE symbol = ?",
+                                          (symbol,)).fetchone()
+            return rows, revision[0] if revision else 0
+
+        rows, revision = self._read(work)
+        ids, price, quantity = zip(*rows) if rows else ((), (), ())
+        return (np.array(ids, dtype=np.int64), np.array(price, dtype=np.float64),
+                np.array(quantity, dtype=np.int64), revision)
+
+
+@lru_cache(maxsize=None)
+def open_ledger_store(path):
+    """Process-wide LedgerStore for ``path``."""
+    return LedgerStore(path)
+
+
+def default_ledger_store():
+    """Store at $CALQTRADE_LEDGER_PATH, or None when it is not set (purchases stay in the session)."""
+    path = os.environ.get(LEDGER_PATH_ENV)
+    return open_ledger_store(path) if path else None
@@ -0,0 +1,59 @@
+"""Reference data for tickers: display names and any other per-symbol fields.
+
+Loaded from the JSON file named by $CALQTRADE_SYMBOLS, either an object
+keyed by ticker or a list of objects with a ``symbol`` field::
+
+    {"ABC": {"name": "ABC Holdings", "sector": "Banks"}, "XYZ": "XYZ Plc"}
+    [{"symbol": "ABC", "name": "ABC Holdings"}]
+
+The file is read once per process, shared by every session and reread
+when it changes.
+"""
+import json
+import os
+
+from calqtrade.portfolio import normalize_symbol
+from calqtrade.resources import SharedFileCache
+
+SYMBOLS_ENV = "CALQTRADE_SYMBOLS"
+
+
+class SymbolMetadataError(ValueError):
+    """Raised for a symbol metadata file that cannot be used."""
+
+
+def load_symbol_metadata(path):
+    """{normalized symbol: dict of fields} from a JSON metadata file."""
+    with open(path, encoding="utf-8") as handle:
+        try:
+            spec = json.load(handle)
+        except json.JSONDecodeError as error:
+            raise SymbolMetadataError(f"Could not parse {path}: {error}") from None
+    if isinstance(spec, dict):
+        # A bare string is the display name
+        spec = [{**(fields if isinstance(fields, dict) else {"name": fields}), "symbol": symbol}
+                for symbol, fields in spec.items()]
+    elif not isinstance(spec, list):
+        raise SymbolMetadataError(f"{path} must hold an object keyed by symbol or a list of entries")
+    metadata = {}
+    for fields in spec:
+        if not isinstance(fields, dict) or not str(fields.get("symbol", "")).strip():
+            raise SymbolMetadataError(f"Every entry in {path} needs a symbol: {fields!r}")
+        symbol = normalize_symbol(fields["symbol"])
+        metadata[symbol] = {**fields, "symbol": symbol}
+    return metadata
+
+
+SYMBOL_FILES = SharedFileCache("symbol_metadata", load_symbol_metadata)
+
+
+def symbol_metadata():
+    """Metadata from $CALQTRADE_SYMBOLS by symbol, or an empty dict when it is not set."""
+    path = os.environ.get(SYMBOLS_ENV)
+    return SYMBOL_FILES.get(path) if path else {}
+
+
+def symbol_label(symbol, metadata=None):
+    """``symbol`` followed by its display name, if the metadata has one."""
+    name = (symbol_metadata() if metadata is None else metadata).get(symbol, {}).get("name")
+    return f"{symbol} · {name}" if name else symbol
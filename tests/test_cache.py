@@ -0,0 +1,67 @@
+"""Memoized tab results: the same numbers as the engine, computed once per process."""
+import pytest
+
+from calqtrade.cache import (
+    PROFIT_TARGETS,
+    cache_stats,
+    cached_break_even,
+    cached_profit_targets,
+    cached_trade,
+    clear_caches,
+)
+from calqtrade.engine import FEE_RATE, STL_RATE, buy_side, calculate_trade, target_sell_price
+from calqtrade.fees import STANDARD_SCHEDULE
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    clear_caches()
+    yield
+    clear_caches()
+
+
+def test_repeated_inputs_are_served_from_the_cache():
+    first = cached_trade(100.0, 105.0, 1_000, True)
+    assert cached_trade(100.0, 105.0, 1_000, True) is first
+    stats = cache_stats()["trade"]
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert first._asdict() == pytest.approx(calculate_trade(100.0, 105.0, 1_000, True))
+    # Exact and float results are separate entries
+    assert cached_trade(100.0, 105.0, 1_000, True, exact=True) is not first
+    assert cache_stats()["trade"]["currsize"] == 2
+    clear_caches()
+    assert cache_stats()["trade"]["currsize"] == 0
+
+
+@pytest.mark.parametrize("day_trade", [True, False])
+def test_break_even_matches_the_original_tab(day_trade):
+    result = cached_break_even(250.0, 400, day_trade)
+    _, _, avg_price, total_cost = buy_side(250.0, 400)
+    # Tab 2 before the engine: B.E.S and the sell fee charged at it
+    if day_trade:
+        bes = total_cost / (400 * (1 - STL_RATE))
+        sell_fee = bes * 400 * STL_RATE
+    else:
+        bes = avg_price * (1 + FEE_RATE)
+        sell_fee = bes * 400 * FEE_RATE
+    assert (result.bes_price, result.sell_fee) == pytest.approx((bes, sell_fee))
+    assert result.price_move == pytest.approx(bes - 250.0)
+    assert result.pct_move == pytest.approx((bes - 250.0) / 250.0 * 100)
+
+
+def test_profit_targets_are_immutable_rows():
+    rows = cached_profit_targets(250.0, 400, False)
+    assert tuple(row.target_pct for row in rows) == PROFIT_TARGETS
+    total_cost = buy_side(250.0, 400)[3]
+    for row in rows:
+        assert row.sell_price == pytest.approx(target_sell_price(total_cost, 400, row.target_pct, False)[1])
+    with pytest.raises(AttributeError):
+        rows[0].sell_price = 0.0
+    assert cached_profit_targets(250.0, 400, False) is rows
+
+
+def test_exact_mode_needs_the_standard_fees():
+    with pytest.raises(ValueError):
+        cached_trade(100.0, 105.0, 10, False, exact=True, schedule=STANDARD_SCHEDULE)
+    assert cached_trade(100.0, 105.0, 10, False, schedule=STANDARD_SCHEDULE).gain_loss == pytest.approx(
+        calculate_trade(100.0, 105.0, 10, False)["gain_loss"])
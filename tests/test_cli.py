@@ -0,0 +1,68 @@
+"""Batch mode round trips: trades file in, the same file plus every derived column out."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from calqtrade.cli import INPUT_COLUMNS, main
+from calqtrade.engine import TRADE_COLUMNS, calculate_trades
+from calqtrade.fixedpoint import exact_trades
+
+
+@pytest.fixture
+def trades():
+    generator = np.random.default_rng(5)
+    count = 1_000
+    return pd.DataFrame({
+        "trade_id": np.arange(count),
+        "buy_price": np.round(generator.uniform(1, 1_000, count), 2),
+        "sell_price": np.round(generator.uniform(1, 1_000, count), 2),
+        "quantity": generator.integers(1, 10_000, count),
+        "trading_type": generator.choice(["Day Trading", "Swing Trading"], count),
+    })
+
+
+@pytest.mark.parametrize("workers, exact", [(1, False), (2, False), (1, True)])
+def test_csv_round_trip(tmp_path, trades, workers, exact):
+    source, output = tmp_path / "trades.csv", tmp_path / "results.csv"
+    trades.to_csv(source, index=False)
+    args = [str(source), "-o", str(output), "-w", str(workers), "-c", "128"]
+    assert main(args + ["--exact"] if exact else args) == 0
+    result = pd.read_csv(output)
+    assert result.columns.tolist() == [*trades.columns, *TRADE_COLUMNS]
+    assert result["trade_id"].tolist() == trades["trade_id"].tolist()
+    calculate = exact_trades if exact else calculate_trades
+    expected = calculate(*(trades[column].to_numpy() for column in INPUT_COLUMNS))
+    for column in TRADE_COLUMNS:
+        np.testing.assert_allclose(result[column].to_numpy(), expected[column], rtol=1e-12)
+
+
+def test_parquet_round_trip(tmp_path, trades):
+    source, output = tmp_path / "trades.parquet", tmp_path / "results.parquet"
+    trades.to_parquet(source)
+    assert main([str(source), "-o", str(output), "-w", "1", "-c", "300"]) == 0
+    result = pd.read_parquet(output)
+    expected = calculate_trades(*(trades[column].to_numpy() for column in INPUT_COLUMNS))
+    np.testing.assert_array_equal(result["gain_loss"].to_numpy(), expected["gain_loss"])
+
+
+@pytest.mark.parametrize("suffix", ["csv", "parquet"])
+def test_inputs_without_rows_still_write_a_header(tmp_path, suffix):
+    source, output = tmp_path / f"trades.{suffix}", tmp_path / "results.csv"
+    empty = pd.DataFrame({column: pd.Series(dtype=float) for column in INPUT_COLUMNS})
+    if suffix == "csv":
+        empty.to_csv(source, index=False)
+    else:
+        empty.to_parquet(source)
+    assert main([str(source), "-o", str(output), "-w", "1"]) == 0
+    assert output.read_text().strip() == ",".join((*INPUT_COLUMNS, *TRADE_COLUMNS))
+
+
+def test_bad_inputs_are_reported(tmp_path, trades, capsys):
+    source = tmp_path / "trades.csv"
+    trades.assign(quantity=trades["quantity"] + 0.5).to_csv(source, index=False)
+    # Exact mode never truncates a fractional quantity
+    assert main([str(source), "-o", str(tmp_path / "out.csv"), "-w", "1", "--exact"]) == 1
+    assert "whole-share" in capsys.readouterr().err
+    trades.drop(columns="trading_type").to_csv(source, index=False)
+    assert main([str(source), "-o", str(tmp_path / "out.csv"), "-w", "1"]) == 1
+    assert "trading_type" in capsys.readouterr().err
@@ -0,0 +1,121 @@
+"""The vectorized engine against the calculator's original per-trade formulas."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from calqtrade.engine import (
+    TRADE_COLUMNS,
+    bes_price,
+    buy_side,
+    calculate_trade,
+    calculate_trades,
+    calculate_trades_frame,
+    is_day_trade,
+    pnl_surface,
+    target_sell_price,
+)
+from calqtrade.fees import FeeSchedule
+
+FEE_PERCENTAGE = 1.12
+STL_RATE = 0.30 / 100
+
+
+def baseline_trade(buy_price, sell_price, quantity, same_day):
+    # Tab 1 as it was written before the engine existed, one trade at a time
+    total_buy_value = buy_price * quantity
+    buy_fee = total_buy_value * (FEE_PERCENTAGE / 100)
+    avg_price = (total_buy_value + buy_fee) / quantity
+    total_cost = avg_price * quantity
+    if same_day == "Day Trading":
+        bes = total_cost / (quantity * (1 - STL_RATE))
+        sell_fee = sell_price * quantity * STL_RATE if sell_price > 0 else 0
+    else:
+        bes = avg_price * (1 + FEE_PERCENTAGE / 100)
+        sell_fee = sell_price * quantity * (FEE_PERCENTAGE / 100) if sell_price > 0 else 0
+    total_sell_value = sell_price * quantity
+    proceeds = total_sell_value - sell_fee
+    gain_loss = proceeds - total_cost
+    gain_loss_percentage = (gain_loss / total_cost) * 100 if total_cost > 0 else 0
+    return dict(zip(TRADE_COLUMNS, (total_buy_value, buy_fee, avg_price, total_cost, bes,
+                                    total_sell_value, sell_fee, proceeds, gain_loss, gain_loss_percentage)))
+
+
+def baseline_target(total_cost, quantity, target_pct, same_day):
+    # Tab 2's profit-target table before the engine existed
+    target_profit = total_cost * (target_pct / 100)
+    target_proceeds_needed = total_cost + target_profit
+    if same_day == "Day Trading":
+        return target_profit, target_proceeds_needed / quantity
+    return target_profit, target_proceeds_needed / (quantity * (1 - FEE_PERCENTAGE / 100))
+
+
+def random_trades(count, seed=0):
+    generator = np.random.default_rng(seed)
+    buy_price = np.round(generator.uniform(0.5, 5_000, count), 2)
+    sell_price = np.round(buy_price * generator.uniform(0.5, 1.5, count), 2)
+    # Sell price 0 is allowed by tab 1 and charges no sell fee
+    sell_price[::17] = 0.0
+    quantity = generator.integers(1, 1_000_000, count)
+    trading_type = generator.choice(["Day Trading", "Swing Trading"], count)
+    return buy_price, sell_price, quantity, trading_type
+
+
+def test_batch_matches_the_original_formulas():
+    buy_price, sell_price, quantity, trading_type = random_trades(2_000)
+    result = calculate_trades(buy_price, sell_price, quantity, trading_type)
+    for row in range(len(buy_price)):
+        expected = baseline_trade(float(buy_price[row]), float(sell_price[row]), int(quantity[row]),
+                                  str(trading_type[row]))
+        for column in TRADE_COLUMNS:
+            assert result[column][row] == pytest.approx(expected[column], rel=1e-12, abs=1e-9), column
+
+
+@pytest.mark.parametrize("trading_type", ["Day Trading", "Swing Trading"])
+def test_single_trade_matches_the_original_formulas(trading_type):
+    expected = baseline_trade(100.0, 105.0, 1_000, trading_type)
+    assert calculate_trade(100.0, 105.0, 1_000, trading_type) == pytest.approx(expected, rel=1e-15)
+
+
+def test_frame_keeps_other_columns():
+    buy_price, sell_price, quantity, trading_type = random_trades(50, seed=1)
+    frame = pd.DataFrame({"trade_id": np.arange(50), "buy_price": buy_price, "sell_price": sell_price,
+                          "quantity": quantity, "trading_type": trading_type})
+    result = calculate_trades_frame(frame)
+    assert result["trade_id"].tolist() == list(range(50))
+    np.testing.assert_array_equal(result["gain_loss"].to_numpy(),
+                                  calculate_trades(buy_price, sell_price, quantity, trading_type)["gain_loss"])
+
+
+@pytest.mark.parametrize("trading_type", ["Day Trading", "Same Day Trading", "Swing Trading"])
+def test_targets_match_the_original_table(trading_type):
+    day_trade = is_day_trade(trading_type)
+    _, _, avg_price, total_cost = buy_side(250.0, 400)
+    targets = np.array([0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 15.0, 20.0, 25.0, 30.0])
+    profit, price = target_sell_price(total_cost, 400, targets, day_trade)
+    # Tab 3 labels day trades "Same Day Trading"; the original table knew only tab 2's label
+    same_day = "Day Trading" if day_trade else "Swing Trading"
+    for row, target in enumerate(targets):
+        assert (profit[row], price[row]) == pytest.approx(baseline_target(total_cost, 400, target, same_day))
+    assert bes_price(total_cost, avg_price, 400, day_trade) == pytest.approx(
+        baseline_trade(250.0, 0.0, 400, same_day)["bes_price"])
+
+
+def test_trading_type_flags():
+    assert is_day_trade("Same Day Trading") and not is_day_trade("Swing Trading")
+    assert is_day_trade(np.array([1, 0])).tolist() == [True, False]
+    assert is_day_trade(["Day Trading", "Swing Trading"]).tolist() == [True, False]
+
+
+@pytest.mark.parametrize("schedule", [None, FeeSchedule("Minimum", {"rate": 1.0, "minimum": 40}, {"rate": 0.3},
+                                                        {"rate": 1.0, "minimum": 40})])
+def test_pnl_surface_matches_trade_by_trade(schedule):
+    sell_prices = np.linspace(90.0, 110.0, 21)
+    quantities = np.array([1, 10, 250, 10_000])
+    surface = pnl_surface(100.0, sell_prices, quantities, schedule=schedule)
+    assert surface["gain_loss"].shape == (2, len(quantities), len(sell_prices))
+    for layer, day_trade in enumerate((True, False)):
+        for row, quantity in enumerate(quantities.tolist()):
+            for column, sell_price in enumerate(sell_prices.tolist()):
+                expected = calculate_trade(100.0, sell_price, quantity, day_trade, schedule)
+                assert surface["gain_loss"][layer, row, column] == pytest.approx(expected["gain_loss"], abs=1e-9)
+                assert surface["return_pct"][layer, row, column] == pytest.approx(expected["return_pct"], abs=1e-9)
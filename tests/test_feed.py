@@ -0,0 +1,60 @@
+"""Configured feed sources and the bounded set of open feeds."""
+import time
+
+import pytest
+
+from calqtrade import feed
+from calqtrade.feed import MAX_FEEDS, PRICE_FEED_ENV, configured_price_feeds, open_price_feed
+
+
+@pytest.fixture(autouse=True)
+def no_open_feeds():
+    yield
+    with feed._FEEDS_LOCK:
+        for opened in feed._FEEDS.values():
+            opened.stop()
+        feed._FEEDS.clear()
+
+
+def test_sources_are_listed_in_the_environment(monkeypatch):
+    monkeypatch.setenv(PRICE_FEED_ENV, "/feeds/a.feed, tcp://127.0.0.1:9000,,")
+    assert configured_price_feeds() == ["/feeds/a.feed", "tcp://127.0.0.1:9000"]
+    monkeypatch.delenv(PRICE_FEED_ENV)
+    assert configured_price_feeds() == []
+
+
+def test_least_recently_used_feed_is_stopped(tmp_path):
+    paths = [str(tmp_path / f"{number}.feed") for number in range(MAX_FEEDS + 1)]
+    first = open_price_feed(paths[0])
+    assert open_price_feed(paths[0]) is first
+    others = [open_price_feed(path) for path in paths[1:MAX_FEEDS]]
+    # Polling the first feed again keeps it open; the next one in line goes
+    open_price_feed(paths[0])
+    open_price_feed(paths[-1])
+    assert not first._stopped.is_set()
+    assert others[0]._stopped.is_set()
+    assert all(not other._stopped.is_set() for other in others[1:])
+    assert len(feed._FEEDS) == MAX_FEEDS
+
+
+def test_lines_update_the_latest_quote(tmp_path):
+    path = tmp_path / "prices.feed"
+    path.write_text("timestamp,symbol,price\n1.0,abc,100.5\n2.0,ABC,101\nbad line\n")
+    reader = open_price_feed(str(path))
+    deadline = time.monotonic() + 5
+    while reader.rejected < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert reader.quote("abc").price == 101.0
+    assert reader.ticks == 2
+    assert reader.rejected == 2
+
+
+@pytest.mark.parametrize("source", ["tcp://host", "tcp://host:port", "tcp://host:70000"])
+def test_malformed_address_is_reported_not_fatal(source):
+    reader = open_price_feed(source)
+    deadline = time.monotonic() + 5
+    while reader.error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert isinstance(reader.error, ValueError)
+    # The thread keeps retrying until stopped instead of dying
+    assert reader._thread.is_alive()
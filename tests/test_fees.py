@@ -0,0 +1,131 @@
+"""Compiled fee tiers, minimum charges and the inversion of the sell leg."""
+import json
+
+import numpy as np
+import pytest
+
+from calqtrade.engine import bes_price, buy_side, sell_side, target_sell_price
+from calqtrade.fees import STANDARD_SCHEDULE, FeeSchedule, FeeScheduleError, FeeTable, load_fee_schedules
+from calqtrade.symbols import SymbolMetadataError, load_symbol_metadata
+
+TIERS = [[0, 1.12], [100_000, 0.9], [1_000_000, 0.5]]
+
+TIERED = FeeSchedule(
+    "Tiered",
+    buy={"tiers": TIERS, "minimum": 50},
+    day_sell={"rate": 0.30, "minimum": 5},
+    swing_sell={"tiers": TIERS, "minimum": 50},
+)
+
+
+def marginal_fee(value, tiers, minimum=0.0):
+    # Reference: rate of each tier on the part of the value inside it, then the minimum
+    fee = 0.0
+    bounds = [start for start, _ in tiers[1:]] + [float("inf")]
+    for (start, rate), end in zip(tiers, bounds):
+        if value > start:
+            fee += (min(value, end) - start) * rate / 100
+    return max(fee, minimum)
+
+
+VALUES = np.concatenate((
+    np.linspace(0, 10_000, 1_001),
+    np.geomspace(1, 1e9, 2_000),
+    [4_464.2857142857, 100_000, 1_000_000, 99_999.99, 1_000_000.01],
+))
+
+
+@pytest.mark.parametrize("minimum", [0.0, 50.0, 5_000.0])
+def test_fee_matches_marginal_tiers(minimum):
+    table = FeeTable(TIERS, minimum)
+    expected = np.array([marginal_fee(value, TIERS, minimum) for value in VALUES])
+    np.testing.assert_allclose(table.fee(VALUES), expected, rtol=1e-12, atol=1e-9)
+    for value in VALUES[::97]:
+        assert table.fee(float(value)) == pytest.approx(marginal_fee(value, TIERS, minimum), rel=1e-12, abs=1e-9)
+
+
+@pytest.mark.parametrize("minimum", [0.0, 50.0, 5_000.0])
+def test_gross_value_inverts_the_fee(minimum):
+    table = FeeTable(TIERS, minimum)
+    # Every reachable net amount: proceeds are only defined above the minimum fee
+    net = VALUES[VALUES > minimum] - minimum
+    gross = table.gross_value(net)
+    np.testing.assert_allclose(gross - table.fee(gross), net, rtol=1e-12, atol=1e-7)
+    for amount in net[::53]:
+        value = table.gross_value(float(amount))
+        assert value - table.fee(value) == pytest.approx(amount, rel=1e-12, abs=1e-7)
+
+
+def test_minimum_covering_every_tier_is_flat():
+    table = FeeTable([[0, 0.0]], 25)
+    assert table.fee(np.array([0.0, 10.0, 1e9])).tolist() == [25.0, 25.0, 25.0]
+    assert table.gross_value(100.0) == 125.0
+
+
+def test_standard_schedule_matches_flat_formulas():
+    price, quantity = 123.45, 1_000
+    assert buy_side(price, quantity, STANDARD_SCHEDULE) == pytest.approx(buy_side(price, quantity))
+    for day_trade in (True, False):
+        assert sell_side(130.0, quantity, day_trade, STANDARD_SCHEDULE) == pytest.approx(
+            sell_side(130.0, quantity, day_trade))
+
+
+@pytest.mark.parametrize("day_trade", [True, False])
+@pytest.mark.parametrize("quantity", [1, 100, 10_000, 1_000_000])
+def test_schedule_bes_and_targets_are_exact(day_trade, quantity):
+    _, _, avg_price, total_cost = buy_side(50.0, quantity, TIERED)
+    bes = bes_price(total_cost, avg_price, quantity, day_trade, TIERED)
+    assert sell_side(bes, quantity, day_trade, TIERED)[2] == pytest.approx(total_cost, rel=1e-12)
+    target_pct = np.array([0.5, 5.0, 30.0])
+    profit, sell_price = target_sell_price(total_cost, quantity, target_pct, day_trade, TIERED)
+    np.testing.assert_allclose(sell_side(sell_price, quantity, day_trade, TIERED)[2], total_cost + profit,
+                               rtol=1e-12)
+
+
+def test_invalid_schedules_are_rejected():
+    with pytest.raises(FeeScheduleError):
+        FeeTable([[10, 1.0]])
+    with pytest.raises(FeeScheduleError):
+        FeeTable([[0, 100.0]])
+    with pytest.raises(FeeScheduleError):
+        FeeTable([[0, 1.0], [0, 2.0]])
+    with pytest.raises(FeeScheduleError):
+        FeeSchedule.from_dict({"name": "No sells", "buy": {"rate": 1.0}})
+
+
+def test_schedules_load_from_json(tmp_path):
+    path = tmp_path / "schedules.json"
+    path.write_text(json.dumps({"schedules": [{
+        "name": "Tiered",
+        "buy": {"tiers": TIERS, "minimum": 50},
+        "day_sell": {"rate": 0.30, "minimum": 5},
+        "swing_sell": {"tiers": TIERS, "minimum": 50},
+    }]}))
+    assert load_fee_schedules(str(path)) == {"Tiered": TIERED}
+    path.write_text("{not json")
+    with pytest.raises(FeeScheduleError):
+        load_fee_schedules(str(path))
+
+
+@pytest.mark.parametrize("payload", [
+    {"name": "Null rate", "buy": {"rate": None}, "day_sell": {"rate": 0.3}, "swing_sell": {"rate": 1.0}},
+    {"name": "Text tiers", "buy": {"tiers": "0:1.0"}, "day_sell": {"rate": 0.3}, "swing_sell": {"rate": 1.0}},
+    {"name": "Null minimum", "buy": {"rate": 1.0, "minimum": None}, "day_sell": {"rate": 0.3},
+     "swing_sell": {"rate": 1.0}},
+    ["oops"],
+    5,
+    None,
+])
+def test_wrongly_typed_schedule_files_are_rejected(tmp_path, payload):
+    path = tmp_path / "schedules.json"
+    path.write_text(json.dumps(payload))
+    with pytest.raises(FeeScheduleError):
+        load_fee_schedules(str(path))
+
+
+@pytest.mark.parametrize("payload", [5, "ABC", None])
+def test_symbol_files_must_be_an_object_or_list(tmp_path, payload):
+    path = tmp_path / "symbols.json"
+    path.write_text(json.dumps(payload))
+    with pytest.raises(SymbolMetadataError):
+        load_symbol_metadata(str(path))
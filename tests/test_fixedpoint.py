@@ -0,0 +1,140 @@
+"""Exact fee arithmetic against a Decimal reference and at the int64 limits."""
+from decimal import ROUND_CEILING, ROUND_HALF_UP, Decimal
+
+import numpy as np
+import pytest
+
+from calqtrade.cache import PROFIT_TARGETS, cached_profit_targets
+from calqtrade.fixedpoint import (
+    bes_price_units,
+    exact_trade_units,
+    exact_trades,
+    fee_units,
+    purchase_units,
+    sell_units,
+    target_units,
+    to_minor,
+)
+
+CENT = Decimal("0.01")
+PRICE_UNIT = Decimal("0.0001")
+FEE = Decimal("0.0112")
+STL = Decimal("0.003")
+
+
+def _cents(amount, rounding=ROUND_HALF_UP):
+    return int(amount.quantize(CENT, rounding=rounding) / CENT)
+
+
+def _price_units(amount, rounding=ROUND_CEILING):
+    return int(amount.quantize(PRICE_UNIT, rounding=rounding) / PRICE_UNIT)
+
+
+def reference_trade(buy_price, sell_price, quantity, day_trade):
+    # The contract-note arithmetic, done in Decimal
+    buy_value = Decimal(buy_price) * quantity
+    buy_fee = Decimal(_cents(buy_value * FEE)) * CENT
+    total_cost = buy_value + buy_fee
+    sell_value = Decimal(sell_price) * quantity
+    sell_fee = Decimal(_cents(sell_value * (STL if day_trade else FEE))) * CENT
+    if day_trade:
+        bes = total_cost / (quantity * (1 - STL))
+    else:
+        bes = total_cost / quantity * (1 + FEE)
+    return {
+        "buy_value": _cents(buy_value),
+        "buy_fee": _cents(buy_fee),
+        "avg_price": _price_units(total_cost / quantity, ROUND_HALF_UP),
+        "total_cost": _cents(total_cost),
+        "bes_price": _price_units(bes),
+        "sell_value": _cents(sell_value),
+        "sell_fee": _cents(sell_fee),
+        "proceeds": _cents(sell_value - sell_fee),
+    }
+
+
+def _random_trades(count, seed=0):
+    generator = np.random.default_rng(seed)
+    buy_price = generator.integers(1, 500_000, count) / 100
+    sell_price = generator.integers(1, 500_000, count) / 100
+    quantity = generator.integers(1, 100_000, count)
+    day_trade = generator.integers(0, 2, count).astype(bool)
+    return buy_price, sell_price, quantity, day_trade
+
+
+@pytest.mark.parametrize("day_trade", [True, False])
+def test_single_trade_matches_decimal_reference(day_trade):
+    for buy_price, sell_price, quantity in [(100.0, 105.0, 1), (0.01, 0.01, 1), (123.45, 99.99, 333),
+                                            (4_999.99, 5_123.45, 99_999), (10.05, 10.15, 7)]:
+        units = exact_trade_units(buy_price, sell_price, quantity, day_trade)
+        expected = reference_trade(f"{buy_price:.2f}", f"{sell_price:.2f}", quantity, day_trade)
+        assert {column: units[column] for column in expected} == expected
+        assert units["gain_loss"] == expected["proceeds"] - expected["total_cost"]
+
+
+def test_vectorized_trades_match_decimal_reference():
+    buy_price, sell_price, quantity, day_trade = _random_trades(2_000)
+    units = exact_trade_units(buy_price, sell_price, quantity, day_trade)
+    for row in range(len(buy_price)):
+        expected = reference_trade(f"{buy_price[row]:.2f}", f"{sell_price[row]:.2f}", int(quantity[row]),
+                                   bool(day_trade[row]))
+        assert {column: int(units[column][row]) for column in expected} == expected
+
+
+def test_vectorized_and_scalar_paths_agree():
+    buy_price, sell_price, quantity, day_trade = _random_trades(200, seed=1)
+    columns = exact_trades(buy_price, sell_price, quantity, day_trade)
+    for row in range(len(buy_price)):
+        single = exact_trade_units(float(buy_price[row]), float(sell_price[row]), int(quantity[row]),
+                                   bool(day_trade[row]))
+        assert columns["total_cost"][row] == single["total_cost"] / 100
+        assert columns["bes_price"][row] == single["bes_price"] / 10_000
+
+
+def test_half_cent_fees_round_up():
+    # 0.01 × 1.12% × 125 = 0.014 rupees -> 1 cent; 12.50 × 0.3% = 3.75 cents -> 4
+    assert purchase_units(1, 125)[1] == 1
+    assert fee_units(1_250, 300) == 4
+
+
+def test_day_trade_bes_price_never_falls_short():
+    buy_price, _, quantity, _ = _random_trades(500, seed=2)
+    _, _, total_cost = purchase_units(to_minor(buy_price), quantity)
+    bes = bes_price_units(total_cost, quantity, True)
+    for row in range(len(bes)):
+        # Selling at the rounded-up B.E.S price covers the cost after STL
+        proceeds = Decimal(int(bes[row])) * PRICE_UNIT * int(quantity[row]) * (1 - STL)
+        assert proceeds >= Decimal(int(total_cost[row])) * CENT
+
+
+def test_int64_overflow_is_reported_not_wrapped():
+    huge = np.array([np.iinfo(np.int64).max // 1_000], dtype=np.int64)
+    with pytest.raises(OverflowError):
+        fee_units(huge, 1_120)
+    # A Python int total against a rate array must be checked too
+    with pytest.raises(OverflowError):
+        target_units(10 ** 17, 10, np.array([5.0, 10.0]), False)
+    # price × quantity itself wraps before any fee is charged: 2**32 + 1 cents × 2**32
+    price = (2 ** 32 + 1) / 100
+    with pytest.raises(OverflowError):
+        exact_trades([price], [price], [2 ** 32], [True])
+    with pytest.raises(OverflowError):
+        sell_units(np.array([2 ** 32 + 1]), np.array([2 ** 32]), False)
+
+
+def test_python_ints_handle_any_size():
+    value = 10 ** 30
+    assert fee_units(value, 1_120) == value * 1_120 // 100_000
+    profit, price = target_units(10 ** 20, 10, 5.0, True)
+    assert profit == 5 * 10 ** 18
+    assert price == (10 ** 20 + profit) * 100 // 10
+
+
+def test_large_break_even_targets_stay_exact():
+    targets = cached_profit_targets(1_000_000.0, 10_000, True, PROFIT_TARGETS, True)
+    assert len(targets) == len(PROFIT_TARGETS)
+    total_cost = Decimal(1_000_000) * 10_000 * (1 + FEE)
+    for target in targets:
+        profit = (total_cost * Decimal(str(target.target_pct)) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+        assert target.profit_amount == float(profit)
+        assert target.sell_price == float(_price_units((total_cost + profit) / 10_000) * PRICE_UNIT)
@@ -0,0 +1,113 @@
+"""Restoring states of the event log against a fresh replay and a shared store."""
+import numpy as np
+import pytest
+
+from calqtrade.history import PortfolioHistory
+from calqtrade.portfolio import Portfolio
+from calqtrade.store import LedgerStore
+
+SYMBOLS = ("ABC", "XYZ", "QRS")
+
+
+def book(portfolio, ids=True):
+    # {symbol: lots as lists}, with or without their ids
+    columns = ("ids", "price", "quantity") if ids else ("price", "quantity")
+    return {symbol: tuple(getattr(portfolio[symbol], column).tolist() for column in columns)
+            for symbol in portfolio.symbols()}
+
+
+def random_changes(count, seed=0):
+    # (method, args) calls valid when run in order on an empty portfolio
+    generator = np.random.default_rng(seed)
+    sizes = dict.fromkeys(SYMBOLS, 0)
+    changes = []
+    for _ in range(count):
+        symbol = SYMBOLS[generator.integers(len(SYMBOLS))]
+        price, quantity = float(generator.integers(100, 20_000)) / 100, int(generator.integers(1, 1_000))
+        kind = generator.choice(["add", "extend", "remove", "update", "clear_symbol"] if sizes[symbol] else
+                                ["add", "extend"], p=[0.3, 0.2, 0.2, 0.25, 0.05] if sizes[symbol] else [0.6, 0.4])
+        if kind == "add":
+            changes.append(("add", (symbol, price, quantity)))
+            sizes[symbol] += 1
+        elif kind == "extend":
+            names = [SYMBOLS[index] for index in generator.integers(len(SYMBOLS), size=4)]
+            changes.append(("extend", (names, generator.integers(100, 20_000, 4) / 100,
+                                       generator.integers(1, 1_000, 4))))
+            for name in names:
+                sizes[name] += 1
+        elif kind == "remove":
+            changes.append(("remove", (symbol, int(generator.integers(sizes[symbol])))))
+            sizes[symbol] -= 1
+        elif kind == "update":
+            changes.append(("update", (symbol, int(generator.integers(sizes[symbol])), price, quantity)))
+        else:
+            changes.append(("clear_symbol", (symbol,)))
+            sizes[symbol] = 0
+    return changes
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_checkout_matches_a_fresh_replay(seed):
+    changes = random_changes(60, seed)
+    portfolio = Portfolio()
+    history = PortfolioHistory(portfolio)
+    states = [book(portfolio)]
+    for method, args in changes:
+        getattr(history, method)(*args)
+        states.append(book(portfolio))
+    order = np.random.default_rng(seed).permutation(len(states)).tolist() + [0, len(states) - 1, 3, 2]
+    for state in order:
+        history.checkout(state)
+        assert book(portfolio) == states[state]
+        replay = Portfolio()
+        for method, args in changes[:state]:
+            getattr(replay, method)(*args)
+        assert book(portfolio, ids=False) == book(replay, ids=False)
+
+
+def test_undo_redo_and_branches():
+    portfolio = Portfolio()
+    history = PortfolioHistory(portfolio)
+    history.extend("ABC", [10.0, 11.0, 12.0], [1, 2, 3])
+    history.remove("ABC", 1)
+    history.update("ABC", 0, 9.0, 5)
+    assert book(portfolio) == {"ABC": ([1, 3], [9.0, 12.0], [5, 3])}
+    assert history.undo() and history.undo()
+    # The deleted lot is back under its id, in its place
+    assert book(portfolio) == {"ABC": ([1, 2, 3], [10.0, 11.0, 12.0], [1, 2, 3])}
+    history.add("ABC", 13.0, 4)
+    assert not history.can_redo()
+    history.checkout(3)
+    assert book(portfolio) == {"ABC": ([1, 3], [9.0, 12.0], [5, 3])}
+    history.checkout(4)
+    assert book(portfolio) == {"ABC": ([1, 2, 3, 4], [10.0, 11.0, 12.0, 13.0], [1, 2, 3, 4])}
+    history.checkout(0)
+    assert book(portfolio) == {}
+    assert history.redo()
+    assert book(portfolio) == {"ABC": ([1, 2, 3], [10.0, 11.0, 12.0], [1, 2, 3])}
+    # An empty import changes nothing and is not recorded
+    events = len(history)
+    history.extend(np.array([], dtype=str), [], [])
+    assert len(history) == events
+
+
+def test_restores_leave_other_sessions_lots_alone(tmp_path):
+    store = LedgerStore(str(tmp_path / "ledger.sqlite3"))
+    mine, theirs = Portfolio.load(store), Portfolio.load(store)
+    history = PortfolioHistory(mine)
+    history.add("ABC", 100.0, 10)
+    theirs.add("ABC", 200.0, 20)
+    history.add("ABC", 101.0, 11)
+    history.update("ABC", 0, 99.0, 9)
+    history.checkout(0)
+    # Only this history's lots were taken back, by id
+    assert store.load_lots("ABC")[1].tolist() == [200.0]
+    history.checkout(3)
+    assert store.load_lots("ABC")[1].tolist() == [99.0, 200.0, 101.0]
+    # Their lot, cleared here, comes back on undo
+    history.clear_symbol("ABC")
+    assert "ABC" not in mine
+    history.undo()
+    assert store.load_lots("ABC")[1].tolist() == [99.0, 200.0, 101.0]
+    assert book(mine) == book(theirs.refresh() and theirs)
+    store.close()
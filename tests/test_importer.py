@@ -0,0 +1,66 @@
+"""Broker exports streamed into validated, fee-enriched purchase columns."""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from calqtrade.engine import buy_side
+from calqtrade.importer import PurchaseImportError, detect_format, import_purchases
+
+
+def imported(source, **options):
+    # Every chunk joined: (columns as lists, total rejected rows)
+    chunks = list(import_purchases(source, **options))
+    columns = {name: np.concatenate([chunk[name] for chunk, _ in chunks]).tolist() for name in chunks[0][0]}
+    return columns, sum(rejected for _, rejected in chunks)
+
+
+def test_header_aliases_and_extra_columns():
+    source = io.StringIO("Trade Date,Scrip,Buy Price,Qty,Broker\n"
+                         "2024-01-02,abc,\"1,250.50\",100,X\n"
+                         "2024-01-03,XYZ,10,5,Y\n")
+    columns, rejected = imported(source)
+    assert rejected == 0
+    assert columns["price"] == [1250.5, 10.0]
+    assert columns["quantity"] == [100, 5]
+    assert columns["symbol"] == ["abc", "XYZ"]
+    # Fees come from the same formulas as the Add Purchase form
+    assert columns["total_cost"] == pytest.approx(buy_side(np.array([1250.5, 10.0]), np.array([100, 5]))[3])
+
+
+def test_bad_rows_are_counted_and_skipped():
+    source = io.StringIO("price,quantity\n"
+                         "100,10\n"
+                         "0,10\n"           # below the form's minimum price
+                         "100,0\n"          # no shares
+                         "100,2.5\n"        # fractional shares
+                         "abc,10\n"         # not a number
+                         ",10\n"            # blank
+                         "100,-3\n"
+                         "99.5,7\n")
+    columns, rejected = imported(source, chunksize=3)
+    assert columns["price"] == [100.0, 99.5]
+    assert columns["quantity"] == [10, 7]
+    assert rejected == 6
+
+
+def test_blank_symbols_take_the_default_or_are_rejected():
+    text = "symbol,price,quantity\nABC,1,1\n,2,2\n"
+    columns, rejected = imported(io.StringIO(text), default_symbol="DEF")
+    assert columns["symbol"] == ["ABC", "DEF"] and rejected == 0
+    columns, rejected = imported(io.StringIO(text))
+    assert columns["symbol"] == ["ABC"] and rejected == 1
+
+
+def test_missing_required_columns_are_reported():
+    with pytest.raises(PurchaseImportError, match="quantity"):
+        list(import_purchases(io.StringIO("symbol,price\nABC,1\n")))
+
+
+def test_parquet_exports(tmp_path):
+    path = tmp_path / "fills.parquet"
+    pd.DataFrame({"Ticker": ["ABC", "XYZ"], "Rate": [10.0, 0.0], "Shares": [3, 4]}).to_parquet(path)
+    assert detect_format(str(path)) == "parquet"
+    columns, rejected = imported(str(path))
+    assert columns["symbol"] == ["ABC"] and columns["price"] == [10.0] and rejected == 1
@@ -0,0 +1,82 @@
+"""Running ledger totals against a recomputation from the stored lots."""
+import numpy as np
+import pytest
+
+from calqtrade.engine import FEE_RATE, STL_RATE
+from calqtrade.fees import FeeSchedule
+from calqtrade.fixedpoint import purchase_units, to_minor
+from calqtrade.ledger import PurchaseLedger
+
+TIERED = FeeSchedule.from_dict({
+    "name": "Tiered",
+    "buy": {"tiers": [[0, 1.12], [100_000, 0.8]], "minimum": 30},
+    "day_sell": {"rate": 0.30},
+    "swing_sell": {"rate": 1.12},
+})
+
+
+def assert_totals_match_lots(ledger):
+    # Tab 3's original summary: every lot's fee-enriched values summed from scratch
+    columns = ledger.columns()
+    assert ledger.total_quantity == int(columns["quantity"].sum())
+    assert ledger.total_buy_value == pytest.approx(columns["buy_value"].sum(), rel=1e-9, abs=1e-6)
+    assert ledger.total_buy_fees == pytest.approx(columns["buy_fee"].sum(), rel=1e-9, abs=1e-6)
+    assert ledger.total_cost == pytest.approx(columns["total_cost"].sum(), rel=1e-9, abs=1e-6)
+    buy_value, buy_fee, _ = purchase_units(to_minor(ledger.price), ledger.quantity)
+    assert ledger.total_buy_value_cents == int(buy_value.sum())
+    assert ledger.total_buy_fee_cents == int(buy_fee.sum())
+
+
+@pytest.mark.parametrize("schedule", [None, TIERED])
+def test_totals_follow_every_kind_of_change(schedule):
+    generator = np.random.default_rng(3)
+    ledger = PurchaseLedger(schedule)
+    removed = []
+    for _ in range(300):
+        kind = generator.integers(6) if len(ledger) else 0
+        price = float(generator.integers(1, 500_000)) / 100
+        quantity = int(generator.integers(1, 5_000))
+        if kind == 0:
+            ledger.add(price, quantity)
+        elif kind == 1:
+            ledger.extend(generator.integers(1, 500_000, 5) / 100, generator.integers(1, 5_000, 5))
+        elif kind == 2:
+            ledger.remove(int(generator.integers(len(ledger))))
+        elif kind == 3:
+            ledger.update(int(generator.integers(len(ledger))), price, quantity)
+        elif kind == 4:
+            ids = np.unique(ledger.ids[generator.integers(len(ledger), size=2)])
+            price_removed, quantity_removed = ledger.remove_lots(ids)
+            removed.append((ids, price_removed.copy(), quantity_removed.copy()))
+        elif removed:
+            ledger.insert_lots(*removed.pop())
+        assert_totals_match_lots(ledger)
+    assert list(ledger.ids) == sorted(ledger.ids)
+
+
+def test_summary_metrics_use_the_original_formulas():
+    ledger = PurchaseLedger()
+    ledger.extend([100.0, 120.0, 90.0], [10, 20, 30])
+    total_buy_value = 100.0 * 10 + 120.0 * 20 + 90.0 * 30
+    total_cost = total_buy_value * (1 + FEE_RATE)
+    assert ledger.total_buy_value == pytest.approx(total_buy_value)
+    assert ledger.overall_avg_price == pytest.approx(total_cost / 60)
+    assert ledger.simple_weighted_avg == pytest.approx(total_buy_value / 60)
+    assert ledger.bes_price("Same Day Trading") == pytest.approx(total_cost / (60 * (1 - STL_RATE)))
+    assert ledger.bes_price("Swing Trading") == pytest.approx(total_cost / 60 * (1 + FEE_RATE))
+
+
+def test_emptied_ledger_has_exact_zero_totals():
+    ledger = PurchaseLedger()
+    ledger.extend([0.1, 0.2, 0.7], [3, 3, 3])
+    ledger.remove_lots(ledger.ids)
+    assert (ledger.total_quantity, ledger.total_cost, ledger.total_buy_fee_cents) == (0, 0.0, 0)
+    assert ledger.overall_avg_price == 0 and ledger.bes_price("Swing Trading") == 0
+
+
+def test_switching_schedule_rederives_totals():
+    ledger = PurchaseLedger()
+    ledger.extend([100.0, 2_000.0], [10, 100])
+    ledger.set_schedule(TIERED)
+    assert_totals_match_lots(ledger)
+    assert ledger.total_buy_fees == pytest.approx(30 + (100_000 * 0.0112 + 100_000 * 0.008))
@@ -0,0 +1,89 @@
+"""Realized P&L of each matching method on small hand-worked books."""
+import pytest
+
+from calqtrade.engine import sell_side
+from calqtrade.fees import FeeSchedule
+from calqtrade.matching import AVERAGE, FIFO, HIFO, LIFO, SPECIFIC, LotMatcher, LotMatchingError
+
+# No fees, so cost basis and proceeds can be worked by hand
+FREE = FeeSchedule("Free", buy={"rate": 0.0}, day_sell={"rate": 0.0}, swing_sell={"rate": 0.0})
+
+# Lots of 10 shares bought at 100, 120 and 90
+QUANTITY = [10, 10, 10]
+TOTAL_COST = [1_000.0, 1_200.0, 900.0]
+
+
+def matcher(method):
+    return LotMatcher(QUANTITY, TOTAL_COST, method, FREE)
+
+
+@pytest.mark.parametrize("method, lots, cost_basis, matched", [
+    # 15 sold at 110 = 1,650 proceeds
+    (FIFO, None, 1_000 + 600, ((0, 10), (1, 5))),
+    (LIFO, None, 900 + 600, ((2, 10), (1, 5))),
+    (HIFO, None, 1_200 + 500, ((1, 10), (0, 5))),
+    (AVERAGE, None, 3_100 / 30 * 15, ()),
+    (SPECIFIC, {2: 10, 0: 5}, 900 + 500, ((2, 10), (0, 5))),
+])
+def test_first_sell(method, lots, cost_basis, matched):
+    book = matcher(method)
+    sell = book.sell(15, 110.0, "Swing Trading", lots)
+    assert sell.proceeds == 1_650
+    assert sell.cost_basis == pytest.approx(cost_basis)
+    assert sell.realized_gain == pytest.approx(1_650 - cost_basis)
+    assert tuple((lot, quantity) for lot, quantity, _ in sell.lots) == matched
+    assert book.open_quantity == 15
+    assert book.open_cost == pytest.approx(3_100 - cost_basis)
+
+
+@pytest.mark.parametrize("method", [FIFO, LIFO, HIFO, AVERAGE])
+def test_closing_the_position_realizes_everything(method):
+    book = matcher(method)
+    book.sell(15, 110.0, "Swing Trading")
+    book.sell(15, 100.0, "Swing Trading")
+    # 1,650 + 1,500 proceeds against 3,100 of cost, whatever the order
+    assert book.realized_gain == pytest.approx(50)
+    assert book.open_quantity == 0
+    assert book.open_cost == 0.0
+
+
+def test_fifo_open_lots_after_a_partial_sell():
+    book = matcher(FIFO)
+    book.sell(15, 110.0, "Swing Trading")
+    lots, remaining, remaining_cost = book.open_lots()
+    assert lots.tolist() == [1, 2]
+    assert remaining.tolist() == [5, 10]
+    assert remaining_cost.tolist() == [600.0, 900.0]
+    assert book.open_avg_price == pytest.approx(100)
+
+
+def test_fees_come_out_of_proceeds():
+    book = LotMatcher(QUANTITY, TOTAL_COST, FIFO)
+    sell = book.sell(10, 110.0, "Day Trading")
+    _, sell_fee, proceeds = sell_side(110.0, 10, True)
+    assert sell.sell_fee == pytest.approx(sell_fee)
+    assert sell.realized_gain == pytest.approx(proceeds - 1_000)
+
+
+def test_specific_lots_are_validated():
+    book = matcher(SPECIFIC)
+    with pytest.raises(LotMatchingError):
+        book.sell(0, 110.0, "Swing Trading")
+    with pytest.raises(LotMatchingError):
+        book.sell(0, 110.0, "Swing Trading", {0: 11})
+    with pytest.raises(LotMatchingError):
+        book.sell(0, 110.0, "Swing Trading", {3: 1})
+    # A negative quantity must not put shares back into a lot
+    with pytest.raises(LotMatchingError):
+        book.sell(0, 110.0, "Swing Trading", {0: 10, 1: -5})
+    assert book.open_quantity == 30
+    assert book.remaining.tolist() == QUANTITY
+    # Lots listed with no shares are skipped
+    assert book.sell(0, 110.0, "Swing Trading", {0: 5, 1: 0}).quantity == 5
+
+
+def test_oversized_sells_are_rejected():
+    book = matcher(FIFO)
+    with pytest.raises(LotMatchingError):
+        book.sell(31, 110.0, "Swing Trading")
+    assert book.sells == []
@@ -0,0 +1,20 @@
+"""The metrics server configured from the environment."""
+import pytest
+
+from calqtrade.metrics import METRICS_PORT_ENV, serve_metrics_from_env
+
+
+@pytest.mark.parametrize("port", ["abc", "9100x", "-1", "0", "70000"])
+def test_bad_metrics_ports_are_value_errors(monkeypatch, port):
+    monkeypatch.setenv(METRICS_PORT_ENV, port)
+    with pytest.raises(ValueError, match=METRICS_PORT_ENV):
+        serve_metrics_from_env()
+
+
+@pytest.mark.parametrize("port", [None, "", "  "])
+def test_unset_metrics_port_starts_nothing(monkeypatch, port):
+    if port is None:
+        monkeypatch.delenv(METRICS_PORT_ENV, raising=False)
+    else:
+        monkeypatch.setenv(METRICS_PORT_ENV, port)
+    assert serve_metrics_from_env() is None
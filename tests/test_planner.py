@@ -0,0 +1,106 @@
+"""Planned buys against a brute-force search over whole-share quantities."""
+import numpy as np
+import pytest
+
+from calqtrade.engine import buy_side
+from calqtrade.fees import FeeSchedule
+from calqtrade.planner import AVG_PRICE, BES_PRICE, PlanningError, plan_ladder, position_metric, shares_to_target
+
+# Tiers and a minimum that matter at a few thousand shares
+TIERED = FeeSchedule.from_dict({
+    "name": "Small tiers",
+    "buy": {"tiers": [[0, 1.12], [50_000, 0.5]], "minimum": 25},
+    "day_sell": {"rate": 0.30},
+    "swing_sell": {"tiers": [[0, 1.12], [50_000, 0.5]], "minimum": 25},
+})
+QUANTITY = 100
+PRICES = [30.0, 40.0, 43.0, 44.0]
+SEARCH = 20_000
+
+
+def position(schedule):
+    return QUANTITY, float(buy_side(50.0, QUANTITY, schedule)[3])
+
+
+def brute_force(quantity, total_cost, price, target, metric, day_trade, schedule):
+    # Fewest shares from 1 to SEARCH that reach the target, or 0
+    shares = np.arange(1, SEARCH + 1)
+    new_cost = total_cost + buy_side(price, shares, schedule)[3]
+    reached = position_metric(new_cost, quantity + shares, metric, day_trade, schedule) <= target
+    return int(shares[reached][0]) if reached.any() else 0
+
+
+@pytest.mark.parametrize("schedule", [None, TIERED])
+@pytest.mark.parametrize("metric, day_trade, target", [
+    (AVG_PRICE, False, 45.0),
+    (BES_PRICE, False, 46.0),
+    (BES_PRICE, True, 45.5),
+])
+def test_fewest_shares_match_brute_force(schedule, metric, day_trade, target):
+    quantity, total_cost = position(schedule)
+    plan = shares_to_target(quantity, total_cost, PRICES, target, metric, day_trade, schedule)
+    for price, shares in zip(PRICES, plan["quantity"].tolist()):
+        assert shares == brute_force(quantity, total_cost, price, target, metric, day_trade, schedule)
+    assert plan["reachable"].all()
+    np.testing.assert_array_equal(plan["new_quantity"], quantity + plan["quantity"])
+
+
+@pytest.mark.parametrize("schedule", [None, TIERED])
+def test_prices_above_the_target_are_unreachable(schedule):
+    quantity, total_cost = position(schedule)
+    plan = shares_to_target(quantity, total_cost, [45.0, 48.0, 10.0], 45.0, schedule=schedule)
+    assert plan["reachable"].tolist() == [False, False, True]
+    assert plan["quantity"].tolist()[:2] == [0, 0]
+    assert plan["cost"].tolist()[:2] == [0.0, 0.0]
+
+
+def test_positions_that_cannot_be_planned_are_rejected():
+    quantity, total_cost = position(None)
+    with pytest.raises(PlanningError):
+        shares_to_target(quantity, total_cost, PRICES, 60.0)
+    with pytest.raises(PlanningError):
+        shares_to_target(0, 0.0, PRICES, 45.0)
+    with pytest.raises(PlanningError):
+        shares_to_target(quantity, total_cost, PRICES, 45.0, metric="last_price")
+    with pytest.raises(PlanningError):
+        plan_ladder(quantity, total_cost, 45.0, high=40.0, low=42.0)
+
+
+@pytest.mark.parametrize("schedule", [None, TIERED])
+def test_single_rung_ladder_is_the_single_buy(schedule):
+    quantity, total_cost = position(schedule)
+    ladder = plan_ladder(quantity, total_cost, 45.0, high=40.0, low=40.0, schedule=schedule,
+                         max_rungs=1, skews=(1.0,))
+    shares = brute_force(quantity, total_cost, 40.0, 45.0, AVG_PRICE, False, schedule)
+    assert ladder.quantities.tolist() == [shares]
+    assert ladder.cash == pytest.approx(float(buy_side(40.0, shares, schedule)[3]))
+
+
+@pytest.mark.parametrize("schedule", [None, TIERED])
+def test_ladder_reaches_the_target_and_is_the_cheapest_candidate(schedule):
+    quantity, total_cost = position(schedule)
+    ladder = plan_ladder(quantity, total_cost, 45.0, high=44.0, low=35.0, schedule=schedule,
+                         max_rungs=4, skews=(1.0, 1.5, 2.0))
+    assert ladder.avg_after[-1] <= 45.0 * (1 + 1e-12)
+    assert ladder.cash == pytest.approx(float(ladder.costs.sum()))
+    assert ladder.costs.tolist() == pytest.approx(buy_side(ladder.prices, ladder.quantities, schedule)[3].tolist())
+    # Every other candidate costs at least as much
+    for rungs in range(1, 5):
+        for skew in (1.0, 1.5, 2.0):
+            other = plan_ladder(quantity, total_cost, 45.0, high=44.0, low=35.0, schedule=schedule,
+                                max_rungs=rungs, skews=(skew,))
+            assert other is None or other.cash >= ladder.cash - 1e-6
+
+
+def test_ladder_respects_the_budget_and_order_cap():
+    quantity, total_cost = position(None)
+    ladder = plan_ladder(quantity, total_cost, 45.0, high=44.0, low=35.0)
+    assert plan_ladder(quantity, total_cost, 45.0, high=44.0, low=35.0, budget=ladder.cash * 0.5) is None
+    within = plan_ladder(quantity, total_cost, 45.0, high=44.0, low=35.0, budget=ladder.cash)
+    assert within.quantities.tolist() == ladder.quantities.tolist()
+    cap = int(ladder.quantities.max()) - 1
+    capped = plan_ladder(quantity, total_cost, 45.0, high=44.0, low=35.0, max_order_quantity=cap)
+    assert capped.quantities.max() <= cap
+    assert capped.cash >= ladder.cash
+    # Every rung above the target's average with fees cannot help
+    assert plan_ladder(quantity, total_cost, 45.0, high=48.0, low=46.0) is None
@@ -0,0 +1,77 @@
+"""The per-symbol portfolio summary against each symbol's lots."""
+import numpy as np
+import pytest
+
+from calqtrade.engine import FEE_RATE, STL_RATE
+from calqtrade.fees import FeeSchedule
+from calqtrade.portfolio import SUMMARY_FIELDS, Portfolio
+from calqtrade.store import LedgerStore
+
+SYMBOLS = ["XYZ", "ABC", "XYZ", "QRS", "ABC", "ABC"]
+PRICES = [10.0, 100.0, 12.0, 55.5, 110.0, 90.0]
+QUANTITIES = [1_000, 10, 500, 40, 20, 30]
+TIERED = FeeSchedule.from_dict({
+    "name": "Tiered",
+    "buy": {"tiers": [[0, 1.12], [10_000, 0.8]], "minimum": 30},
+    "day_sell": {"rate": 0.30},
+    "swing_sell": {"rate": 1.12},
+})
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LedgerStore(str(tmp_path / "ledger.sqlite3"))
+    Portfolio.load(store).extend(SYMBOLS, PRICES, QUANTITIES)
+    yield store
+    store.close()
+
+
+def expected_row(symbol, day_trade):
+    # Tab 3's original summary row, summed from the symbol's lots
+    rows = [row for row, name in enumerate(SYMBOLS) if name == symbol]
+    quantity = sum(QUANTITIES[row] for row in rows)
+    total_cost = sum(PRICES[row] * QUANTITIES[row] for row in rows) * (1 + FEE_RATE)
+    avg_price = total_cost / quantity
+    bes = total_cost / (quantity * (1 - STL_RATE)) if day_trade else avg_price * (1 + FEE_RATE)
+    return len(rows), quantity, total_cost, avg_price, bes
+
+
+def assert_summary_matches(summary, trading_type):
+    assert summary["symbol"].tolist() == ["ABC", "QRS", "XYZ"]
+    for row, symbol in enumerate(summary["symbol"]):
+        values = tuple(summary[field][row] for field in SUMMARY_FIELDS[1:])
+        assert values == pytest.approx(expected_row(symbol, trading_type == "Day Trading"))
+
+
+@pytest.mark.parametrize("trading_type", ["Day Trading", "Swing Trading"])
+def test_summary_matches_the_original_tab(store, trading_type):
+    portfolio = Portfolio()
+    portfolio.extend(SYMBOLS, PRICES, QUANTITIES)
+    summary = portfolio.summary(trading_type)
+    assert_summary_matches(summary, trading_type)
+    assert summary["total_quantity"].sum() == portfolio.total_quantity
+    assert summary["total_cost"].sum() == pytest.approx(portfolio.total_cost)
+    # Symbols still summarized from their stored aggregate rows, then partly read in
+    saved = Portfolio.load(store)
+    assert_summary_matches(saved.summary(trading_type), trading_type)
+    saved["ABC"]
+    assert_summary_matches(saved.summary(trading_type), trading_type)
+
+
+@pytest.mark.parametrize("trading_type", ["Day Trading", "Swing Trading"])
+def test_schedule_summary_follows_each_ledger(store, trading_type):
+    loaded = Portfolio.load(store, TIERED)
+    switched = Portfolio.load(store)
+    switched.set_schedule(TIERED)
+    for portfolio in (loaded, switched):
+        summary = portfolio.summary(trading_type)
+        for row, symbol in enumerate(summary["symbol"]):
+            ledger = portfolio[symbol]
+            assert summary["lots"][row] == len(ledger)
+            assert summary["total_quantity"][row] == ledger.total_quantity
+            assert summary["total_cost"][row] == pytest.approx(ledger.total_cost)
+            assert summary["overall_avg_price"][row] == pytest.approx(ledger.total_cost / ledger.total_quantity)
+            assert summary["bes_price"][row] == pytest.approx(ledger.bes_price(trading_type))
+        # The 30 minimum lifts QRS's cost above the flat-fee one
+        assert summary["total_cost"][1] > expected_row("QRS", False)[2]
+        np.testing.assert_allclose(summary["total_cost"].sum(), portfolio.total_cost, rtol=1e-12)
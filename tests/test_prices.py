@@ -0,0 +1,48 @@
+"""Configured price paths and the memoized mark-to-market of a position."""
+import os
+
+import pytest
+
+from calqtrade.prices import (
+    PRICE_PATH_ENV,
+    PRICE_SOURCES,
+    build_price_directory,
+    cached_mark_to_market,
+    configured_price_paths,
+)
+
+
+def write_prices(tmp_path, closes):
+    csv = tmp_path / "prices.csv"
+    rows = [f"ABC,2024-01-{day:02d},{close}" for day, close in enumerate(closes, 1)]
+    csv.write_text("Symbol,Date,Close\n" + "\n".join(rows) + "\n")
+    build_price_directory(str(csv), str(tmp_path / "prices"))
+    return str(tmp_path / "prices")
+
+
+def test_only_listed_paths_are_offered(monkeypatch):
+    monkeypatch.setenv(PRICE_PATH_ENV, os.pathsep.join(["/data/a", "", "/data/b.parquet"]))
+    assert configured_price_paths() == ["/data/a", "/data/b.parquet"]
+    monkeypatch.delenv(PRICE_PATH_ENV)
+    assert configured_price_paths() == []
+
+
+def test_mark_to_market_follows_new_price_data(tmp_path):
+    path = write_prices(tmp_path, [100.0, 110.0, 90.0])
+    summary, timestamps, curve = cached_mark_to_market(path, "ABC", 10, 1_000.0, True)
+    assert summary["bars"] == len(timestamps) == 3
+    assert curve["close"].tolist() == [100.0, 110.0, 90.0]
+    with pytest.raises(ValueError):
+        curve["close"][0] = 0.0
+    # A shared result: callers get their own summary dict
+    summary["bars"] = 0
+    assert cached_mark_to_market(path, "ABC", 10, 1_000.0, True)[0]["bars"] == 3
+    index = os.path.join(path, "index.json")
+    stat = os.stat(index)
+    write_prices(tmp_path, [100.0, 120.0])
+    os.utime(index, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    # Until the shared source is rechecked, its old bars are still served
+    assert cached_mark_to_market(path, "ABC", 10, 1_000.0, True)[0]["bars"] == 3
+    PRICE_SOURCES.invalidate(path)
+    assert cached_mark_to_market(path, "ABC", 10, 1_000.0, True)[2]["close"].tolist() == [100.0, 120.0]
+    assert cached_mark_to_market(path, "ABC", 10, 1_000.0, True, start="2024-02-01") == (None, None, None)
@@ -0,0 +1,32 @@
+"""Shared file caches keep serving the last good value of a broken file."""
+import pytest
+
+from calqtrade.resources import SHARED_CACHES, SharedFileCache
+
+
+@pytest.fixture
+def cache():
+    cache = SharedFileCache("test_lines", lambda path: open(path).read().split(), ttl=0)
+    yield cache
+    del SHARED_CACHES[cache.name]
+
+
+def test_deleted_file_serves_the_last_value(cache, tmp_path):
+    path = tmp_path / "lines.txt"
+    path.write_text("a b")
+    assert cache.get(str(path)) == ["a", "b"]
+    path.unlink()
+    assert cache.get(str(path)) == ["a", "b"]
+    assert isinstance(cache.errors()[str(path)], OSError)
+    with pytest.raises(OSError):
+        cache.get(str(tmp_path / "missing.txt"))
+
+
+def test_changed_file_is_reloaded(cache, tmp_path):
+    path = tmp_path / "lines.txt"
+    path.write_text("a b")
+    value, signature = cache.get_versioned(str(path))
+    path.write_text("a b c")
+    assert cache.get_versioned(str(path)) != (value, signature)
+    assert cache.get(str(path)) == ["a", "b", "c"]
+    assert cache.stats()["reloads"] == 1
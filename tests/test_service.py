@@ -0,0 +1,60 @@
+"""The headless service: /trade micro-batching and request validation."""
+import asyncio
+import json
+from http import HTTPStatus
+
+import pytest
+
+from calqtrade.engine import calculate_trades
+from calqtrade.service import CalculationService, TradeBatcher
+
+
+def trade(buy_price, sell_price=None, quantity=100, exact=False):
+    return {"buy_price": buy_price, "sell_price": buy_price if sell_price is None else sell_price,
+            "quantity": quantity, "trading_type": "Swing Trading", "exact": exact}
+
+
+def post(payloads, path="/trade"):
+    """Dispatch the payloads concurrently, as one batch, and return (status, body) for each."""
+    async def run():
+        service = CalculationService(batch_window=0.01)
+        service.batcher = TradeBatcher(window=0.01)
+        service.batcher.start()
+        try:
+            return await asyncio.gather(*(service.dispatch("POST", path, json.dumps(payload).encode())
+                                          for payload in payloads)), service.batcher
+        finally:
+            await service.batcher.stop()
+    return asyncio.run(run())
+
+
+def test_concurrent_trades_share_one_batch():
+    responses, batcher = post([trade(10.0 + i, 12.0 + i) for i in range(5)])
+    assert batcher.batches == 1 and batcher.trades == 5
+    expected = calculate_trades([10.0 + i for i in range(5)], [12.0 + i for i in range(5)], [100] * 5, False)
+    for i, (status, body) in enumerate(responses):
+        assert status == HTTPStatus.OK
+        assert body["gain_loss"] == pytest.approx(float(expected["gain_loss"][i]))
+
+
+def test_one_overflowing_trade_does_not_fail_its_batch():
+    # Its buy value fits int64 cents but the fee product does not
+    responses, batcher = post([trade(10.0, exact=True), trade(1e13, quantity=1000, exact=True),
+                               trade(11.0, exact=True)])
+    assert batcher.batches == 1
+    assert [status for status, _ in responses] == [HTTPStatus.OK, HTTPStatus.BAD_REQUEST, HTTPStatus.OK]
+    assert "error" in responses[1][1]
+
+
+@pytest.mark.parametrize("payload", [
+    trade(float("nan")),
+    trade(10.0, float("inf")),
+    trade(-1.0),
+    trade(10.0, quantity=0),
+    {"buy_price": 10.0, "sell_price": 11.0, "quantity": 1},
+])
+def test_invalid_trades_are_bad_requests(payload):
+    # json.dumps writes NaN and Infinity, which json.loads reads back
+    (status, body), = post([payload])[0]
+    assert status == HTTPStatus.BAD_REQUEST
+    assert "error" in body
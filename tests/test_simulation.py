@@ -0,0 +1,20 @@
+"""Size limits of the Monte Carlo outcome simulator."""
+import pytest
+
+from calqtrade.simulation import MAX_DRAWS, SimulationError, simulate_log_returns, simulate_outcomes
+
+
+def test_oversized_runs_are_rejected_before_any_work():
+    with pytest.raises(SimulationError):
+        simulate_outcomes(100.0, 1_000, False, [101.0], 30.0, horizon_days=1_000, steps_per_day=78,
+                          paths=1_000_000)
+    with pytest.raises(SimulationError):
+        simulate_log_returns(MAX_DRAWS // 10 + 1, 10, 30.0)
+    with pytest.raises(SimulationError):
+        simulate_log_returns(0, 10, 30.0)
+
+
+def test_small_runs_are_accepted():
+    path_max, final = simulate_log_returns(1_000, 5, 30.0, steps_per_day=6, seed=0)
+    assert len(path_max) == len(final) == 1_000
+    assert (path_max >= 0).all() and (path_max >= final).all()
@@ -0,0 +1,99 @@
+"""A SQLite book shared by several portfolios (sessions) at once."""
+import numpy as np
+import pytest
+
+from calqtrade.portfolio import Portfolio
+from calqtrade.store import LedgerConflictError, LedgerStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LedgerStore(str(tmp_path / "ledger.sqlite3"))
+    yield store
+    store.close()
+
+
+def stored(store, symbol):
+    ids, price, quantity, _ = store.load_lots(symbol)
+    return ids.tolist(), price.tolist(), quantity.tolist()
+
+
+def test_sessions_edit_their_own_lots(store):
+    first, second = Portfolio.load(store), Portfolio.load(store)
+    first.add("ABC", 100.0, 10)
+    second.add("ABC", 200.0, 20)
+    # The second session saw the first one's lot when it wrote its own
+    assert second["ABC"].price.tolist() == [100.0, 200.0]
+    second.remove("ABC", 1)
+    assert stored(store, "ABC") == ([1], [100.0], [10])
+    assert second["ABC"].price.tolist() == [100.0]
+    assert first.refresh() == ["ABC"]
+    assert first["ABC"].ids.tolist() == [1]
+
+
+def test_removed_lot_is_a_conflict_not_another_lot(store):
+    first, second = Portfolio.load(store), Portfolio.load(store)
+    first.extend("ABC", [100.0, 101.0], [10, 11])
+    second.refresh()
+    second.remove("ABC", 0)
+    with pytest.raises(LedgerConflictError):
+        first.update("ABC", 0, 99.0, 5)
+    # The conflict reread the symbol, so memory and store agree again
+    assert first["ABC"].ids.tolist() == [2]
+    assert stored(store, "ABC") == ([2], [101.0], [11])
+    first.update("ABC", 0, 99.0, 5)
+    assert stored(store, "ABC") == ([2], [99.0], [5])
+
+
+def test_ids_are_never_reused(store):
+    portfolio = Portfolio.load(store)
+    portfolio.extend("ABC", [1.0, 2.0, 3.0], [1, 1, 1])
+    portfolio.remove("ABC", -1)
+    portfolio.add("ABC", 4.0, 1)
+    assert portfolio["ABC"].ids.tolist() == [1, 2, 4]
+    assert stored(store, "ABC")[0] == [1, 2, 4]
+
+
+def test_restored_lots_keep_their_place(store):
+    portfolio = Portfolio.load(store)
+    portfolio.extend("ABC", [1.0, 2.0, 3.0], [1, 2, 3])
+    portfolio.remove_lots("ABC", [2])
+    portfolio.restore_lots("ABC", [2], [2.0], [2])
+    assert stored(store, "ABC") == ([1, 2, 3], [1.0, 2.0, 3.0], [1, 2, 3])
+    assert portfolio["ABC"].price.tolist() == [1.0, 2.0, 3.0]
+    with pytest.raises(LedgerConflictError):
+        portfolio.restore_lots("ABC", [2], [2.0], [2])
+
+
+def test_totals_follow_other_sessions(store):
+    first = Portfolio.load(store)
+    first.extend(["ABC", "XYZ"], [10.0, 20.0], [100, 200])
+    second = Portfolio.load(store)
+    first.add("XYZ", 30.0, 300)
+    first.clear_symbol("ABC")
+    # XYZ was never read by the second session: only its aggregate row is swapped
+    assert second.refresh() == ["ABC", "XYZ"]
+    assert second.symbols() == ["XYZ"]
+    assert second.total_quantity == first.total_quantity == 500
+    assert second.total_cost == pytest.approx(first.total_cost)
+    assert second["XYZ"].price.tolist() == [20.0, 30.0]
+
+
+def test_adding_to_an_unread_symbol_reads_it_once(store):
+    Portfolio.load(store).extend("ABC", [10.0, 11.0], [1, 2])
+    portfolio = Portfolio.load(store)
+    portfolio.add("ABC", 12.0, 3)
+    assert portfolio["ABC"].price.tolist() == [10.0, 11.0, 12.0]
+    assert portfolio.total_quantity == 6
+
+
+def test_memory_portfolio_numbers_its_lots():
+    portfolio = Portfolio()
+    portfolio.extend(["A", "B", "A"], [1.0, 2.0, 3.0], [1, 1, 1])
+    portfolio.add("A", 4.0, 1)
+    assert portfolio["A"].ids.tolist() == [1, 2, 4]
+    assert portfolio["B"].ids.tolist() == [3]
+    removed = portfolio["A"].ids[1]
+    portfolio.remove_lots("A", [removed])
+    portfolio.restore_lots("A", [removed], [3.0], [1])
+    np.testing.assert_array_equal(portfolio["A"].price, [1.0, 3.0, 4.0])